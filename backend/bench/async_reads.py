@@ -0,0 +1,86 @@
+"""Read latency under concurrent load: the async /trends/all against the same query on the sync engine.
+
+The sync variant is a plain ``def`` route, so it runs in the threadpool like
+the routes did before the async engine. ``--busy`` keeps that many threadpool
+slots occupied with blocking work (bulk loads and other sync routes share it).
+The response cache is off:
+
+    python bench/async_reads.py [--rows 20000] [--busy 32] [--dir /tmp/trends-bench]
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+from common import use_scratch_database, seed
+
+
+async def load(client, path, concurrency, requests):
+    samples = []
+
+    async def worker(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.get(path)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(requests // concurrency) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1], len(samples) / elapsed
+
+
+async def run(app, busy, requests):
+    import httpx
+    from starlette.concurrency import run_in_threadpool
+
+    stop = asyncio.Event()
+
+    async def blocking_work():
+        while not stop.is_set():
+            await run_in_threadpool(time.sleep, 0.05)
+
+    background = [asyncio.create_task(blocking_work()) for _ in range(busy)]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/trends/all?limit=10", "/bench/sync/trends/all?limit=10"):
+            await load(client, path, 4, 40)  # Warm up
+        print(f"{'concurrency':>11} {'route':>6} {'p50':>9} {'p95':>9} {'req/s':>7}")
+        for concurrency in (1, 16, 64):
+            for label, path in (("async", "/trends/all?limit=10"), ("sync", "/bench/sync/trends/all?limit=10")):
+                p50, p95, rate = await load(client, path, concurrency, max(requests, concurrency * 4))
+                print(f"{concurrency:>11} {label:>6} {p50:>7.1f}ms {p95:>7.1f}ms {rate:>7.0f}")
+    stop.set()
+    await asyncio.gather(*background)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--busy", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+
+    use_scratch_database(args.dir)
+    os.environ["TRENDS_CACHE_TTL"] = "0"
+    seed(args.rows)
+
+    from fastapi import Depends
+    from sqlalchemy.orm import Session
+    from database import get_db
+    import crud
+    import crud_async
+    import main
+
+    # The same query and response as /trends/all, on the sync engine in the threadpool
+    @main.app.get("/bench/sync/trends/all")
+    def sync_all_trends(limit: int = 10, offset: int = 0, db: Session = Depends(get_db)):
+        records = db.execute(crud_async._newest_first(crud_async.trend_history()).offset(offset).limit(limit)).all()
+        return {"status": "success", "total": crud.count_trends(db), "data": [r._asdict() for r in records]}
+
+    print(f"{args.busy} threadpool slots busy with blocking work")
+    asyncio.run(run(main.app, args.busy, args.requests))
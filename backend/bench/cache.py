@@ -0,0 +1,51 @@
+"""Latency of the trend read endpoints with the response cache on and off.
+
+Each mode runs in its own process (TRENDS_CACHE_TTL is read at import):
+
+    python bench/cache.py [--rows 20000] [--dir /tmp/trends-bench]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+from common import use_scratch_database, seed, median_ms
+
+PATHS = ["/trends", "/trends/all?limit=10", "/trends/all?limit=10&offset=5000", "/trends/{id}"]
+
+
+def run(directory):
+    use_scratch_database(directory)
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    trend_id = client.get("/trends").json()["data"]["id"]
+    results = []
+    for path in PATHS:
+        url = path.replace("{id}", trend_id)
+        results.append((path, median_ms(lambda: client.get(url), runs=300)))
+    response = client.get(PATHS[1])
+    etag = response.headers.get("etag")
+    revalidate = median_ms(lambda: client.get(PATHS[1], headers={"If-None-Match": etag}), runs=300) if etag else None
+    label = "cache on " if float(os.environ.get("TRENDS_CACHE_TTL", "30")) > 0 else "cache off"
+    print(label + "  " + "  ".join(f"{path} {ms:.2f} ms" for path, ms in results)
+          + (f"  304 revalidation {revalidate:.2f} ms" if revalidate else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dir")
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.dir)
+        sys.exit()
+
+    directory = use_scratch_database(args.dir)
+    seed(args.rows)
+    for ttl in ("0", "30"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--dir", directory],
+                       env={**os.environ, "TRENDS_CACHE_TTL": ttl}, check=True)
@@ -0,0 +1,124 @@
+"""TopicCanonicalizer: index memory, build time and per-lookup latency, plus how many variants it merges.
+
+The vocabulary is every lowercase word found in the Python standard library's
+source (~44k English words and identifiers); a topic is one to three of them,
+30% as a camelCase hashtag, 10% with a year. Lookups are timed for known
+topics, spelling variants (no spaces, upper case, a trailing "s", reversed
+words plus an emoji) and unseen topics:
+
+    python bench/canonical.py [--topics 300000] [--lookups 20000]
+
+"recall" is the share of variants that join their topic, out of those that
+share its key or reach CANONICAL_SIMILARITY. "other year" counts topics that
+wrongly joined the same topic with a different year (must be 0).
+"""
+import re
+import time
+import random
+import argparse
+import sysconfig
+from pathlib import Path
+
+from common import use_scratch_database
+
+YEARS = [str(year) for year in range(2016, 2031)]
+
+
+def vocabulary():
+    words = set()
+    for path in sorted(Path(sysconfig.get_paths()["stdlib"]).rglob("*.py")):
+        try:
+            words.update(re.findall(r"\b[a-z]{3,12}\b", path.read_text(encoding="utf-8", errors="ignore")))
+        except OSError:
+            continue
+    return sorted(words)
+
+
+def make_topics(words, count, rng):
+    topics, seen = [], set()
+    while len(topics) < count:
+        picked = [word.capitalize() for word in rng.sample(words, rng.randint(1, 3))]
+        if rng.random() < 0.1:
+            picked.append(rng.choice(YEARS))
+        topic = "#" + "".join(picked) if rng.random() < 0.3 else " ".join(picked)
+        if topic not in seen:
+            seen.add(topic)
+            topics.append(topic)
+    return topics
+
+
+def variant(topic, rng):
+    r = rng.random()
+    if r < 0.3:
+        return topic.lower().replace(" ", "")  # Same key
+    if r < 0.6:
+        return topic.upper() + "!"  # Same key
+    if r < 0.8:
+        return topic + "s"  # Plural: near duplicate
+    return " ".join(reversed(topic.split())) + " 🔥"  # Word order and emoji
+
+
+def other_year(topic, rng):
+    year = next(word for word in YEARS if topic.endswith(word))
+    return topic[:-4] + rng.choice([y for y in YEARS if y != year])
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 2 ** 20
+
+
+def per_lookup_us(canonicalizer, texts):
+    started = time.perf_counter()
+    for text in texts:
+        canonicalizer.canonicalize(text)
+    return (time.perf_counter() - started) / len(texts) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topics", type=int, default=300000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    use_scratch_database()
+    from database import engine, SessionLocal
+    from models import Topic
+    from canonical import TopicCanonicalizer, topic_key, normalize_topic, shingles, jaccard
+
+    Topic.__table__.create(bind=engine)
+    rng = random.Random(3)
+    words = vocabulary()
+    topics = make_topics(words, args.topics, rng)
+
+    canonicalizer = TopicCanonicalizer(session_factory=SessionLocal)
+    canonicalizer.load()  # Empty topics table: the index is built from the lookups below
+    before = rss_mb()
+    started = time.perf_counter()
+    for topic in topics:
+        canonicalizer.canonicalize(topic)
+    build = time.perf_counter() - started
+    index_mb = rss_mb() - before
+
+    known_us = per_lookup_us(canonicalizer, rng.sample(topics, args.lookups))
+    pairs = [(topic, variant(topic, rng)) for topic in rng.sample(topics, args.lookups)]
+    variant_us = per_lookup_us(canonicalizer, [v for _, v in pairs])
+    eligible = [(topic, v) for topic, v in pairs if topic_key(topic) == topic_key(v)
+                or jaccard(shingles(normalize_topic(topic)), shingles(normalize_topic(v))) >= canonicalizer.similarity]
+    merged = sum(canonicalizer.canonicalize(v)[1] == canonicalizer.canonicalize(topic)[1] for topic, v in eligible)
+
+    dated = [topic for topic in topics if topic[-4:] in YEARS]
+    year_pairs = [(topic, other_year(topic, rng)) for topic in rng.sample(dated, min(len(dated), args.lookups // 4))]
+    wrong = sum(canonicalizer.canonicalize(moved)[1] == canonicalizer.canonicalize(topic)[1]
+                for topic, moved in year_pairs)
+    new_us = per_lookup_us(canonicalizer, [" ".join(rng.sample(words, 2)) + " Zq" for _ in range(args.lookups)])
+
+    print(f"{len(words)} words, {args.topics} topics: index {index_mb:.0f} MB, "
+          f"build {build / args.topics * 1e6:.0f} us/topic")
+    print(f"  known {known_us:.1f} us | variant {variant_us:.1f} us | new {new_us:.1f} us")
+    print(f"  recall {merged / len(eligible):.1%} of {len(eligible)} variants | "
+          f"other year {wrong} of {len(year_pairs)}")
+
+
+if __name__ == "__main__":
+    main()
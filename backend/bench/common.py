@@ -0,0 +1,94 @@
+"""Shared setup for the benchmark scripts: a scratch SQLite database seeded with snapshots.
+
+Call ``use_scratch_database()`` before importing anything that opens the
+database (database, crud, main...). Pass a directory to reuse a database
+seeded by an earlier run.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORDS = ["World", "Cup", "Election", "Taylor", "Swift", "Bitcoin", "Lakers", "Oscars", "Monday", "Motivation",
+         "Champions", "League", "Formula", "Premier", "Album", "Summit", "Climate", "Budget", "Derby", "Launch"]
+
+
+def use_scratch_database(directory=None):
+    """Run from ``directory`` (a new temp dir by default) so the SQLite fallback database lives there"""
+    # Nothing listens on the discard port, so database.py always falls back to SQLite
+    os.environ["DATABASE_HOST"] = "127.0.0.1"
+    os.environ["DATABASE_PORT"] = "9"
+    directory = directory or tempfile.mkdtemp(prefix="trends-bench-")
+    os.makedirs(directory, exist_ok=True)
+    os.chdir(directory)
+    import logging
+    logging.disable(logging.WARNING)
+    return directory
+
+
+def topic_names(count, seed=7):
+    """``count`` distinct, plausible trend texts"""
+    rng = random.Random(seed)
+    names, seen = [], set()
+    while len(names) < count:
+        name = " ".join(rng.sample(WORDS, rng.randint(1, 3))) + f" {len(names)}"
+        if rng.random() < 0.3:
+            name = "#" + name.replace(" ", "")
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def seed(rows, vocabulary=5000, start=None, step=timedelta(minutes=15), streams=(("bench", "US"),), chunk=2000):
+    """Insert ``rows`` snapshots (with topic history) unless the database already has them"""
+    from database import Base, engine, SessionLocal
+    from migrations import run_migrations
+    from models import Trend
+    import crud
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    with SessionLocal() as db:
+        existing = db.query(Trend).count()
+    if existing >= rows:
+        return existing
+
+    names = topic_names(vocabulary)
+    rng = random.Random(rows)
+    start = start or datetime.utcnow() - step * rows
+    started = time.perf_counter()
+    batch = []
+    with SessionLocal() as db:
+        for i in range(existing, rows):
+            account, location = streams[i % len(streams)]
+            when = start + step * i
+            data = {f"trend{r}": names[rng.randrange(vocabulary)] for r in range(1, 6)}
+            batch.append(crud.trend_row({**data, "account": account, "location": location}, when))
+            if len(batch) >= chunk:
+                crud.insert_trends(db, batch)
+                db.commit()
+                batch = []
+        if batch:
+            crud.insert_trends(db, batch)
+            db.commit()
+    print(f"Seeded {rows - existing} snapshots in {time.perf_counter() - started:.1f}s")
+    return rows
+
+
+def median_ms(fn, runs=200, warmup=20):
+    """Median wall time of ``fn()`` in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
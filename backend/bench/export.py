@@ -0,0 +1,83 @@
+"""Full-history export: time, output size and peak memory per format.
+
+Rows are written straight into the trends table (export reads only that
+table), then every format runs in its own process so peak RSS is its own:
+
+    python bench/export.py [--rows 200000] [--dir /tmp/trends-bench-export]
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timedelta
+
+from common import use_scratch_database, topic_names
+
+RUNS = [("ndjson", None), ("csv", "gzip"), ("ndjson", "zstd"), ("parquet", "zstd")]
+
+
+def seed_raw(rows):
+    from database import Base, engine
+    import models  # noqa: F401 (registers the tables)
+    Base.metadata.create_all(bind=engine)
+    con = sqlite3.connect("trending.db")
+    if con.execute("SELECT count(*) FROM trends").fetchone()[0] >= rows:
+        return
+    names = topic_names(5000)
+    start = datetime(2023, 1, 1)
+    timings = json.dumps({"total_seconds": 12.5, "phases": {"driver": 2.1, "navigate": 1.4}})
+    con.execute("DELETE FROM trends")
+    con.executemany(
+        "INSERT INTO trends (id, trend1, trend2, trend3, trend4, trend5, datetime, ip, account, location, timings)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((f"{i:032x}", *(names[(i * 7 + r) % len(names)] for r in range(5)),
+          (start + timedelta(minutes=i)).isoformat(sep=" "), "203.0.113.1", f"account-{i % 4}", "US", timings)
+         for i in range(rows))
+    )
+    con.commit()
+    con.close()
+
+
+def run(fmt, compression):
+    import logging
+    logging.disable(logging.INFO)
+    from database import AsyncSessionLocal
+    from export import export_trends
+
+    async def export():
+        size = 0
+        async for chunk in export_trends(AsyncSessionLocal, fmt, compression):
+            size += len(chunk)
+        return size
+
+    started = time.perf_counter()
+    size = asyncio.run(export())
+    seconds = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    label = fmt + (f"+{compression}" if compression else "")
+    print(f"{label:>13} {seconds:6.1f}s {size / 1e6:7.1f} MB out  peak RSS {peak:4.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dir")
+    parser.add_argument("--child", nargs=2)
+    args = parser.parse_args()
+
+    directory = use_scratch_database(args.dir)
+    if args.child:
+        fmt, compression = args.child
+        run(fmt, None if compression == "none" else compression)
+        sys.exit()
+
+    seed_raw(args.rows)
+    print(f"{args.rows} rows")
+    for fmt, compression in RUNS:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--dir", directory,
+                        "--child", fmt, compression or "none"], check=True)
@@ -0,0 +1,138 @@
+"""WebDriver round trips and wall time of trend extraction, before and after single-pass collection.
+
+The driver answers from a saved page and sleeps ``--latency-ms`` per command,
+like a round trip to chromedriver (about 1 ms locally, more to a remote grid).
+"before" is the per-selector find_elements + element.text loop that
+extract_trending_topics used to run; "after" is collect_candidates + TrendExtractor.
+
+    python bench/extraction.py [--latency-ms 1.5] [--runs 20] [page.html ...]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+from extraction import (TREND_SELECTORS, MIN_TRENDS, TrendExtractor, candidates_from_html, collect_candidates)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "fixtures")
+
+
+class RoundTripDriver:
+    def __init__(self, page, latency):
+        groups, fallback = page
+        self.by_selector = dict(zip(TREND_SELECTORS, groups))
+        self.spans = fallback
+        self.latency = latency
+        self.calls = 0
+
+    def round_trip(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def find_elements(self, by, value):
+        self.round_trip()
+        texts = self.spans if value == "span" else self.by_selector.get(value, [])
+        return [RemoteElement(self, text) for text in texts]
+
+    def execute_script(self, script, *args):
+        self.round_trip()
+        return list(self.by_selector.values()) + [self.spans]
+
+
+class RemoteElement:
+    def __init__(self, driver, text):
+        self.driver = driver
+        self._text = text
+
+    @property
+    def text(self):
+        self.driver.round_trip()
+        return self._text
+
+
+def extract_before(driver):
+    """The extraction loop as it was before single-pass collection (one page)"""
+    trends = []
+    for selector in TREND_SELECTORS:
+        for element in driver.find_elements("css selector", selector):
+            text = element.text.strip()
+            unwanted_phrases = [
+                'sign up', 'log in', 'create account', 'new to x',
+                'don\'t miss', 'happening', 'first to know',
+                'terms of service', 'privacy policy', 'cookie',
+                'accessibility', 'ads info', 'Â© 20', 'corp',
+                'follow', 'tweet', 'retweet', 'like', 'reply',
+                'explore', 'notifications', 'messages', 'bookmarks',
+                'home', 'profile', 'more', 'trending', 'for you',
+                'what\'s happening', 'show more'
+            ]
+            if (text and 2 < len(text) < 100 and
+                    text.lower() not in [t.lower() for t in trends] and
+                    not any(phrase in text.lower() for phrase in unwanted_phrases) and
+                    not text.startswith('http') and
+                    not text.isdigit() and
+                    not text.lower().endswith(' posts') and
+                    not text.lower().endswith('k posts') and
+                    not text.lower().endswith(' tweets') and
+                    'k post' not in text.lower()):
+                trends.append(text)
+                if len(trends) >= 5:
+                    break
+        if len(trends) >= 5:
+            break
+
+    if len(trends) < 3:
+        for span in driver.find_elements("tag name", "span"):
+            text = span.text.strip()
+            if (text and 3 <= len(text) <= 50 and
+                    text.lower() not in [t.lower() for t in trends] and
+                    not any(phrase in text.lower() for phrase in [
+                        'sign', 'log', 'account', 'x', 'twitter', 'home',
+                        'explore', 'notification', 'message', 'bookmark'
+                    ]) and
+                    any(c.isalpha() for c in text)):
+                trends.append(text)
+                if len(trends) >= 5:
+                    break
+    return trends
+
+
+def extract_after(driver):
+    extractor = TrendExtractor()
+    groups, fallback = collect_candidates(driver)
+    extractor.add_candidates(groups)
+    if len(extractor.trends) < MIN_TRENDS:
+        extractor.add_fallback(fallback)
+    return extractor.trends
+
+
+def measure(extract, page, latency, runs):
+    calls, started = 0, time.perf_counter()
+    for _ in range(runs):
+        driver = RoundTripDriver(page, latency)
+        trends = extract(driver)
+        calls = driver.calls
+    return trends, calls, (time.perf_counter() - started) / runs * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pages", nargs="*")
+    parser.add_argument("--latency-ms", type=float, default=1.5)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    pages = args.pages or [os.path.join(FIXTURES, name) for name in sorted(os.listdir(FIXTURES)) if name.endswith(".html")]
+    for path in pages:
+        with open(path, encoding="utf-8") as f:
+            page = candidates_from_html(f.read())  # Parsed once: only the extraction is timed
+        print(os.path.basename(path))
+        for label, extract in (("before", extract_before), ("after", extract_after)):
+            trends, calls, ms = measure(extract, page, args.latency_ms / 1000, args.runs)
+            _, _, cpu_ms = measure(extract, page, 0, args.runs * 50)
+            print(f"  {label:>6}: {calls:4d} round trips, {ms:7.1f} ms per page ({cpu_ms:.2f} ms without latency)  {trends}")
@@ -0,0 +1,138 @@
+"""HTTP fetcher vs browser fetcher for one account with a saved login, offline.
+
+Both paths run the real code with the same saved session. HttpTrendFetcher
+calls a local stub serving the saved guide.json response (over loopback, one
+kept-alive connection). The browser path is TwitterTrendingScraper.fetch_with_browser
+on a warm pooled driver: a FakeDriver that shows the saved explore page and
+answers the collection script from its HTML. Chrome's own rendering is not
+included; bench/resources.py measures page loads in a real browser. The
+requests and WebDriver commands per fetch are what network latency multiplies:
+
+    python bench/fetchers.py [--runs 200]
+"""
+import os
+import argparse
+import tracemalloc
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from common import BACKEND_DIR, use_scratch_database, median_ms
+
+FIXTURES = os.path.join(BACKEND_DIR, "tests", "fixtures")
+ACCOUNT = "trendwatcher"
+COOKIES = [{"name": "auth_token", "value": "a1", "domain": "127.0.0.1"},
+           {"name": "ct0", "value": "c1", "domain": "127.0.0.1"}]
+
+
+def serve_guide():
+    with open(os.path.join(FIXTURES, "guide_trending.json"), "rb") as f:
+        body = f.read()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                             % (len(body), body))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/guide.json"
+
+
+def explore_driver():
+    from driver_pool import FakeDriver
+    from extraction import candidates_from_html, COLLECT_SCRIPT
+    from scraper import LOGGED_IN_SELECTOR, TREND_READY_SELECTOR
+
+    with open(os.path.join(FIXTURES, "explore_trending.html"), encoding="utf-8") as f:
+        page = f.read()
+
+    class ExploreDriver(FakeDriver):
+        """Logged in, every page is the saved explore page; counts WebDriver commands"""
+
+        commands = 0
+
+        def get(self, url):
+            self.commands += 1
+            super().get(url)
+
+        def find_elements(self, by=None, value=None):
+            self.commands += 1
+            return super().find_elements(by, value)
+
+        def find_element(self, by=None, value=None):
+            self.commands += 1
+            return super().find_element(by, value)
+
+        def execute_script(self, script, *args):
+            self.commands += 1
+            if script == COLLECT_SCRIPT:
+                groups, fallback = candidates_from_html(page)
+                return groups + [fallback]
+            return super().execute_script(script, *args)
+
+    driver = ExploreDriver(elements={LOGGED_IN_SELECTOR: [object()], TREND_READY_SELECTOR: [object()],
+                                     '[data-testid="trend"]': [object()] * 5})
+    driver.cookies = list(COOKIES)
+    return driver
+
+
+def peak_mb(fetch, runs):
+    tracemalloc.start()
+    for _ in range(runs):
+        fetch()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    use_scratch_database()
+    from driver_pool import SessionStore
+    from fetchers import HttpTrendFetcher
+    from scraper import TwitterTrendingScraper
+    from timing import TimingProfile
+
+    # The login a browser scrape would have saved, shared by both paths
+    driver = explore_driver()
+    SessionStore().save(ACCOUNT, driver)
+
+    http = HttpTrendFetcher(ACCOUNT, lambda: (None, "198.51.100.7"), url=serve_guide(), timeout=5)
+    scraper = TwitterTrendingScraper(username=ACCOUNT, password="x", proxy="direct", backend="browser")
+    scraper.setup_driver = lambda proxy=None: driver
+    scraper.get_current_ip = lambda proxy=None: "198.51.100.7"
+    # Warm fetches only: the pool would otherwise quit and relaunch the driver every DRIVER_MAX_USES
+    scraper.driver_pool.max_uses = args.runs * 10
+
+    paths = {
+        "http": lambda: http.fetch(TimingProfile(), {}),
+        "browser": lambda: scraper.fetch_with_browser(TimingProfile(), {}),
+    }
+    for name, fetch in paths.items():
+        print(f"{name}: {fetch()}")  # Opens the HTTP session / starts the pooled driver and restores the login
+
+    for name, fetch in paths.items():
+        loads, commands = len(driver.visited), driver.commands
+        ms = median_ms(fetch, runs=args.runs, warmup=10)
+        calls = args.runs + 10
+        if name == "http":
+            per_fetch = "1 HTTP request"
+        else:
+            per_fetch = (f"{(len(driver.visited) - loads) / calls:g} page loads, "
+                         f"{(driver.commands - commands) / calls:g} WebDriver commands")
+        print(f"{name:8} {ms:6.2f} ms per fetch, peak Python memory {peak_mb(fetch, 20):.2f} MB, {per_fetch}")
+    # Every timed browser fetch ran on the driver started above
+    assert scraper.driver_pool.stats()["cold_starts"] == 1
+
+
+if __name__ == "__main__":
+    main()
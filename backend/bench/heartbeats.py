@@ -0,0 +1,118 @@
+"""Storage and read cost of change detection: replays the same scrape sequence with CHANGE_DETECTION off and on.
+
+Four locations scrape every 5 minutes; about a quarter of the scrapes change
+the top 5 (a new entrant or two neighbours swapping). Each mode runs in its
+own process on a fresh SQLite database, with a simulated clock:
+
+    python bench/heartbeats.py [--days 7]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+
+from common import use_scratch_database
+
+STREAMS = ["US", "UK", "JP", "BR"]
+START = datetime(2026, 1, 1)
+
+
+class Clock(datetime):
+    """datetime whose utcnow() is the replay's current time"""
+    now = START
+
+    @classmethod
+    def utcnow(cls):
+        return cls.now
+
+
+def replay(days):
+    import crud
+    from database import SessionLocal
+
+    crud.datetime = Clock
+    rng = random.Random(7)
+    vocabulary = [f"Topic {i} {rng.choice(['Cup', 'News', 'Live', 'Day', 'Final'])}" for i in range(20000)]
+    current = {stream: rng.sample(vocabulary, 5) for stream in STREAMS}
+    scrapes = 0
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        for step in range(days * 24 * 12):
+            Clock.now = START + timedelta(minutes=5 * step)
+            for stream in STREAMS:
+                trends = current[stream]
+                roll = rng.random()
+                if roll < 0.12:
+                    trends.insert(rng.randrange(5), rng.choice(vocabulary))
+                    trends.pop()
+                elif roll < 0.25:
+                    i = rng.randrange(4)
+                    trends[i], trends[i + 1] = trends[i + 1], trends[i]
+                crud.create_trend(db, {**{f"trend{r}": t for r, t in enumerate(trends, 1)}, "location": stream})
+                scrapes += 1
+    return scrapes, time.perf_counter() - started
+
+
+def read_ms(fn, runs):
+    from database import AsyncSessionLocal
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await fn(db)
+            started = time.perf_counter()
+            for _ in range(runs):
+                await fn(db)
+            return (time.perf_counter() - started) / runs * 1000
+    return asyncio.run(run())
+
+
+def run(mode, days):
+    from sqlalchemy import text
+    from database import Base, engine
+    from migrations import run_migrations
+    from changes import change_detector
+    import crud_async
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    change_detector.enabled = mode == "on"
+    scrapes, seconds = replay(days)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT count(*) FROM trends")).scalar()
+        entries = conn.execute(text("SELECT count(*) FROM trend_entries")).scalar()
+    size = os.path.getsize("trending.db") / 2 ** 20
+
+    rng = random.Random(1)
+    points = iter([Clock.now - timedelta(minutes=rng.randrange(days * 1440)) for _ in range(51)])
+    reads = {
+        "latest": read_ms(crud_async.get_latest_trend, 50),
+        "page 0": read_ms(lambda db: crud_async.get_all_trends(db, 10, 0), 50),
+        "mid page": read_ms(lambda db: crud_async.get_all_trends(db, 10, rows // 2), 10),
+        "point-in-time": read_ms(lambda db: crud_async.get_trend_at(db, next(points), None, "US"), 50),
+    }
+    print(f"change detection {mode:>3}: {scrapes} scrapes -> {rows} rows, {entries} trend_entries, {size:.1f} MB, "
+          f"{seconds / scrapes * 1000:.2f} ms/scrape | " + ", ".join(f"{k} {v:.2f} ms" for k, v in reads.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--child")
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+
+    if args.child:
+        use_scratch_database(args.dir)
+        run(args.child, args.days)
+        sys.exit()
+
+    root = tempfile.mkdtemp(prefix="trends-bench-heartbeats-")
+    for mode in ("off", "on"):
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, "--days", str(args.days),
+                        "--dir", os.path.join(root, mode)], check=True)
@@ -0,0 +1,62 @@
+"""Bulk ingest throughput: snapshots/s through ingest_file, as JSON Lines and as CSV.
+
+Each format loads into a fresh scratch SQLite database; a second pass re-sends
+the same file (every snapshot is a duplicate):
+
+    python bench/ingest.py [--rows 50000] [--chunk-size 5000]
+"""
+import os
+import csv
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from common import use_scratch_database, topic_names
+
+COLUMNS = ["datetime", "trend1", "trend2", "trend3", "trend4", "trend5", "account", "location"]
+
+
+def write_snapshots(directory, rows):
+    names = topic_names(5000)
+    rng = random.Random(1)
+    start = datetime(2024, 1, 1)
+    snapshots = [
+        {"datetime": (start + timedelta(minutes=15 * i)).isoformat() + "Z",
+         **{f"trend{r}": rng.choice(names) for r in range(1, 6)},
+         "account": f"account-{i % 4}", "location": "US"}
+        for i in range(rows)
+    ]
+    ndjson, csv_path = os.path.join(directory, "snapshots.ndjson"), os.path.join(directory, "snapshots.csv")
+    with open(ndjson, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps(snapshot) + "\n" for snapshot in snapshots)
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, COLUMNS)
+        writer.writeheader()
+        writer.writerows(snapshots)
+    return ndjson, csv_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = use_scratch_database()
+    from database import Base, engine, SessionLocal
+    from migrations import run_migrations
+    from ingest import ingest_file
+
+    files = write_snapshots(directory, args.rows)
+    for path in files:
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
+        for label in ("load", "re-send"):
+            started = time.perf_counter()
+            summary = ingest_file(path, SessionLocal, chunk_size=args.chunk_size)
+            seconds = time.perf_counter() - started
+            print(f"{os.path.basename(path):>17} {label:>8}: {summary['inserted']:>6} inserted, "
+                  f"{summary['duplicates']:>6} duplicates in {seconds:5.1f}s = {args.rows / seconds:,.0f} snapshots/s")
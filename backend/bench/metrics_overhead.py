@@ -0,0 +1,91 @@
+"""Cost of the Prometheus metrics: request latency with METRICS_ENABLED off and on.
+
+Each mode runs in its own process (METRICS_ENABLED is read at import), and
+the modes alternate so drift on the machine hits both. Requests go through
+the ASGI app in-process, so the middleware is a visible share of each one:
+
+    python bench/metrics_overhead.py [--rounds 3] [--requests 2000] [--dir /tmp/trends-bench]
+"""
+import os
+import sys
+import time
+import timeit
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+from common import use_scratch_database, seed
+
+PATHS = ["/", "/trends", "/health"]
+
+
+async def request_us(app, path, count):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(200):
+            await client.get(path)
+        runs = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(count):
+                await client.get(path)
+            runs.append((time.perf_counter() - started) / count * 1e6)
+        return statistics.median(runs)
+
+
+def select_us(engine, count=20000):
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        for _ in range(500):
+            conn.execute(text("SELECT 1"))
+        started = time.perf_counter()
+        for _ in range(count):
+            conn.execute(text("SELECT 1"))
+        return (time.perf_counter() - started) / count * 1e6
+
+
+def run(directory, count):
+    use_scratch_database(directory)
+    from sqlalchemy import event
+    from database import engine
+    import main
+
+    results = {path: asyncio.run(request_us(main.app, path, count)) for path in PATHS}
+    line = " ".join(f"{path} {us:.0f} us" for path, us in results.items()) + f" | SELECT 1 {select_us(engine):.1f} us"
+    if os.environ["METRICS_ENABLED"] == "false":
+        # An empty listener pair: what SQLAlchemy's event dispatch costs before the hooks do anything
+        event.listen(engine, "before_cursor_execute", lambda *args: None)
+        event.listen(engine, "after_cursor_execute", lambda *args: None)
+        line += f", with empty listeners {select_us(engine):.1f} us"
+    print(f"metrics {'on ' if os.environ['METRICS_ENABLED'] == 'true' else 'off'}  {line}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--dir")
+    parser.add_argument("--child", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.dir, args.requests)
+        sys.exit()
+
+    directory = use_scratch_database(args.dir)
+    seed(1000)
+    for _ in range(args.rounds):
+        for enabled in ("false", "true"):
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--dir", directory,
+                            "--requests", str(args.requests)], env={**os.environ, "METRICS_ENABLED": enabled}, check=True)
+
+    from metrics import Counter, Histogram
+
+    histogram = Histogram("bench_seconds", "Benchmark histogram", ("route",)).labels("/trends")
+    counter = Counter("bench_total", "Benchmark counter", ("method", "route", "status"))
+    count = 1_000_000
+    print(f"histogram observe {timeit.timeit(lambda: histogram.observe(0.004), number=count) / count * 1e6:.2f} us, "
+          f"labelled counter {timeit.timeit(lambda: counter.labels('GET', '/trends', '200').inc(), number=count) / count * 1e6:.2f} us")
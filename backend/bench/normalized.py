@@ -0,0 +1,86 @@
+"""The pre-normalization schema (trend1..trend5 on each row, primary key only) against
+topics/trend_entries and the indexes and aggregates added with them.
+
+Both sides read the same snapshots: the legacy table is a copy of trends in
+its old shape. Queries run as plain SQL on one connection, so only the
+schema differs:
+
+    python bench/normalized.py [--rows 100000] [--dir /tmp/trends-bench]
+"""
+import argparse
+from datetime import timedelta
+
+from common import use_scratch_database, seed, median_ms
+
+LEGACY_COLUMNS = "id, trend1, trend2, trend3, trend4, trend5, datetime, ip, timings"
+
+
+def legacy_topics(where=""):
+    """Every ranked text of the legacy table as one column, the way topic counts had to read it"""
+    return " UNION ALL ".join(f"SELECT lower(trend{r}) AS topic FROM legacy_trends {where}" for r in range(1, 6))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+
+    use_scratch_database(args.dir)
+    seed(args.rows)
+
+    from sqlalchemy import text
+    from database import engine
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS legacy_trends"))
+        conn.execute(text(f"CREATE TABLE legacy_trends AS SELECT {LEGACY_COLUMNS} FROM trends"))
+        conn.execute(text("CREATE UNIQUE INDEX ix_legacy_trends_id ON legacy_trends (id)"))
+        conn.execute(text("ANALYZE"))
+
+    with engine.connect() as conn:
+        middle = conn.execute(text("SELECT datetime || '|' || id FROM trends ORDER BY datetime DESC, id DESC "
+                                   "LIMIT 1 OFFSET :half"), {"half": args.rows // 2}).scalar()
+        cursor_at, cursor_id = middle.split("|", 1)
+        since = str(conn.execute(text("SELECT datetime(max(datetime), '-1 day') FROM trends")).scalar())
+        hour = conn.execute(text("SELECT strftime('%Y-%m-%d %H:00:00.000000', :since)"), {"since": since}).scalar()
+        topic_id, normalized = conn.execute(text(
+            "SELECT topic_id, normalized FROM trend_entries GROUP BY topic_id ORDER BY count(*) DESC LIMIT 1")).one()
+
+        page = {"at": cursor_at, "id": cursor_id}
+        queries = [
+            ("latest snapshot",
+             "SELECT * FROM legacy_trends ORDER BY datetime DESC, id DESC LIMIT 1",
+             "SELECT * FROM trends ORDER BY datetime DESC, id DESC LIMIT 1", {}),
+            (f"keyset page at row {args.rows // 2}",
+             "SELECT * FROM legacy_trends WHERE (datetime, id) < (:at, :id) ORDER BY datetime DESC, id DESC LIMIT 10",
+             "SELECT * FROM trends WHERE (datetime, id) < (:at, :id) ORDER BY datetime DESC, id DESC LIMIT 10", page),
+            ("top 10 topics, last 24h",
+             f"SELECT topic, count(*) AS n FROM ({legacy_topics('WHERE datetime >= :since')}) "
+             "GROUP BY topic ORDER BY n DESC LIMIT 10",
+             # As crud_async.get_top_topics runs it, so the hour index is range-scanned
+             "WITH recent AS MATERIALIZED (SELECT topic_id, appearances FROM topic_hourly WHERE hour >= :hour) "
+             "SELECT topic_id, sum(appearances) AS n FROM recent GROUP BY topic_id ORDER BY n DESC, topic_id LIMIT 10",
+             {"since": since, "hour": hour}),
+            ("top 10 topics, all time",
+             f"SELECT topic, count(*) AS n FROM ({legacy_topics()}) GROUP BY topic ORDER BY n DESC LIMIT 10",
+             "SELECT topic_id, appearances FROM topic_stats ORDER BY appearances DESC LIMIT 10", {}),
+            ("history of one topic (50 newest)",
+             "SELECT datetime FROM legacy_trends WHERE " + " OR ".join(f"lower(trend{r}) = :text" for r in range(1, 6))
+             + " ORDER BY datetime DESC LIMIT 50",
+             "SELECT datetime, rank FROM trend_entries WHERE topic_id = :topic ORDER BY datetime DESC LIMIT 50",
+             {"text": normalized, "topic": topic_id}),
+        ]
+
+        print(f"{args.rows} snapshots, median of {args.runs} runs")
+        print(f"{'query':<36} {'legacy':>10} {'normalized':>11}")
+        for label, legacy, current, params in queries:
+            legacy_ms = median_ms(lambda: conn.execute(text(legacy), params).all(), runs=args.runs, warmup=2)
+            current_ms = median_ms(lambda: conn.execute(text(current), params).all(), runs=args.runs, warmup=2)
+            print(f"{label:<36} {legacy_ms:8.2f} ms {current_ms:8.2f} ms")
+        # The raw entries table, for windows the hourly buckets cannot answer
+        raw_ms = median_ms(lambda: conn.execute(text(
+            "SELECT topic_id, count(*) AS n FROM trend_entries WHERE datetime >= :since "
+            "GROUP BY topic_id ORDER BY n DESC LIMIT 10"), {"since": since}).all(), runs=args.runs, warmup=2)
+        print(f"{'top 10 topics, 24h from trend_entries':<36} {'':>10} {raw_ms:8.2f} ms")
@@ -0,0 +1,46 @@
+"""Cost of deep pages of /trends/all: ?offset= against the keyset ?cursor=.
+
+The response cache is off so every request reaches the database:
+
+    python bench/pagination.py [--rows 50000] [--dir /tmp/trends-bench]
+"""
+import os
+import argparse
+
+from common import use_scratch_database, seed, median_ms
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+
+    use_scratch_database(args.dir)
+    os.environ["TRENDS_CACHE_TTL"] = "0"
+    seed(args.rows)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import select
+    from database import SessionLocal
+    from models import Trend
+    import crud
+    import main
+
+    client = TestClient(main.app)
+    print(f"{'page starts at':>15} {'offset':>10} {'cursor':>10}")
+    for position in (0, 1000, args.rows // 10, args.rows // 2, args.rows - args.limit):
+        cursor = ""
+        if position:
+            # The cursor a client holds after walking to this position
+            with SessionLocal() as db:
+                last = db.execute(
+                    select(Trend.id, Trend.datetime).order_by(Trend.datetime.desc(), Trend.id.desc())
+                    .offset(position - 1).limit(1)
+                ).one()
+            cursor = f"&cursor={crud.encode_cursor(last)}"
+        by_offset = f"/trends/all?limit={args.limit}&offset={position}"
+        by_cursor = f"/trends/all?limit={args.limit}{cursor}"
+        assert client.get(by_offset).json()["data"] == client.get(by_cursor).json()["data"]
+        print(f"{position:>15} {median_ms(lambda: client.get(by_offset), runs=50, warmup=5):>8.2f}ms"
+              f" {median_ms(lambda: client.get(by_cursor), runs=50, warmup=5):>8.2f}ms")
@@ -0,0 +1,71 @@
+"""Cost of on-demand profiling: request latency with profiling off, on but idle, and per profiled request.
+
+Each mode runs in its own process (the PROFILING_* settings are read at
+import). Profiled requests are far slower, so they run fewer times:
+
+    python bench/profiling_overhead.py [--requests 2000] [--profiled 100] [--dir /tmp/trends-bench]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+from common import use_scratch_database, seed
+
+PATHS = ["/", "/trends/all?limit=10"]
+MODES = {
+    "off": {"PROFILING_ENABLED": "false"},
+    "on, rate 0": {"PROFILING_ENABLED": "true", "PROFILE_SAMPLE_RATE": "0"},
+    "sampling": {"PROFILING_ENABLED": "true", "PROFILE_SAMPLE_RATE": "0"},
+    "cprofile": {"PROFILING_ENABLED": "true", "PROFILE_SAMPLE_RATE": "0"},
+}
+
+
+async def request_us(app, path, count, headers):
+    import httpx
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for _ in range(50):
+            await client.get(path, headers=headers)
+        runs = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(count):
+                await client.get(path, headers=headers)
+            runs.append((time.perf_counter() - started) / count * 1e6)
+        return statistics.median(runs)
+
+
+def run(directory, mode, count):
+    use_scratch_database(directory)
+    import main
+    import profiling
+
+    headers = {"X-Profile": mode} if mode in profiling.MODES else None
+    line = " ".join(f"{path} {asyncio.run(request_us(main.app, path, count, headers)):.0f} us" for path in PATHS)
+    if headers:
+        line += f" | {len(profiling.profiler.store.list())} profiles kept (PROFILE_KEEP {profiling.PROFILE_KEEP})"
+    print(f"{mode:<11} {line}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--profiled", type=int, default=100)
+    parser.add_argument("--dir")
+    parser.add_argument("--child")
+    args = parser.parse_args()
+
+    if args.child:
+        run(args.dir, args.child, args.requests)
+        sys.exit()
+
+    directory = use_scratch_database(args.dir)
+    seed(1000)
+    for mode, env in MODES.items():
+        count = args.profiled if mode in ("sampling", "cprofile") else args.requests
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, "--dir", directory,
+                        "--requests", str(count)], env={**os.environ, **env}, check=True)
@@ -0,0 +1,104 @@
+"""Bytes, requests and load time of the scraper's browser with the resource policy off and on.
+
+By default a replay site is generated and served locally: the explore fixture
+page plus images, a web font, a video and an analytics beacon, the kinds of
+resource x.com pages pull in. Pass URLs to load pages from another replay
+server instead (e.g. `python -m http.server` over pages saved from x.com).
+Needs Chrome:
+
+    python bench/resources.py [--runs 3] [URL ...]
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from common import BACKEND_DIR
+
+ASSETS = """
+<link rel="preload" href="/fonts/chirp-regular.woff2" as="font" crossorigin>
+<style>@font-face {{ font-family: Chirp; src: url(/fonts/chirp-regular.woff2) format("woff2"); }}
+body {{ font-family: Chirp, sans-serif; }}</style>
+{images}
+<video src="/media/clip.mp4" autoplay muted></video>
+<script>fetch("/i/api/1.1/jot/client_event.json", {{method: "POST", body: "{{}}"}}).catch(() => {{}});</script>
+"""
+
+
+def build_site(directory):
+    """The fixture explore page with the heavy resources a real one references"""
+    with open(os.path.join(BACKEND_DIR, "tests", "fixtures", "explore_trending.html"), encoding="utf-8") as f:
+        page = f.read()
+    images = "\n".join(f'<img src="/media/card-{i}.jpg" width="600" height="335">' for i in range(12))
+    page = page.replace("</body>", ASSETS.format(images=images) + "</body>")
+
+    files = {"explore.html": page.encode(), "fonts/chirp-regular.woff2": os.urandom(90_000),
+             "media/clip.mp4": os.urandom(1_500_000), "i/api/1.1/jot/client_event.json": b"{}"}
+    files.update({f"media/card-{i}.jpg": os.urandom(120_000) for i in range(12)})
+    for name, body in files.items():
+        path = os.path.join(directory, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(body)
+
+
+def serve(directory):
+    class Quiet(SimpleHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.do_GET()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(Quiet, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def measure(urls, runs):
+    from resources import ResourcePolicy, PAGE_LOAD_STRATEGY
+    from scraper import TwitterTrendingScraper
+
+    for blocking in (False, True):
+        policy = ResourcePolicy(enabled=blocking, accounting=True,
+                                page_load_strategy=PAGE_LOAD_STRATEGY if blocking else "normal")
+        driver = TwitterTrendingScraper(resource_policy=policy).setup_driver()
+        if driver is None:
+            sys.exit("Chrome could not be started")
+        try:
+            totals, seconds = {"requests": 0, "blocked": 0, "bytes": 0}, 0.0
+            for _ in range(runs):
+                driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+                policy.reset(driver)
+                started = time.perf_counter()
+                for url in urls:
+                    driver.get(url)
+                seconds += time.perf_counter() - started
+                usage = policy.usage(driver)
+                for key in totals:
+                    totals[key] += usage[key]
+            label = "blocking" if blocking else "everything"
+            print(f"{label:>10}: {totals['bytes'] / runs / 1024:.0f} KB, {totals['requests'] / runs:.0f} requests, "
+                  f"{totals['blocked'] / runs:.0f} blocked, {seconds / runs:.2f}s per load")
+        finally:
+            driver.quit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    urls = args.urls
+    if not urls:
+        site = tempfile.mkdtemp(prefix="trends-bench-replay-")
+        build_site(site)
+        urls = [serve(site) + "/explore.html"]
+    measure(urls, args.runs)
@@ -0,0 +1,88 @@
+"""Latency of /trends/search's two queries (topic matches, then their history) on a synthetic vocabulary.
+
+Snapshots are generated from random syllables, with a few popular topics
+(including "World Cup" variants) mixed in, and bulk loaded once:
+
+    python bench/search.py [--snapshots 100000] [--dir /tmp/trends-bench-search]
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+
+from common import use_scratch_database
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "ten", "su", "vo", "ber", "lin", "do", "qua", "zi", "pe", "mar", "tos",
+             "ul", "gen", "fa", "ri", "no", "cup", "world", "sha", "ve", "ox"]
+QUERIES = [("World Cup", True, None), ("world cup", False, None), ("wrold cup", True, None),
+           ("#worldc", True, None), ("lin", True, None), ("wo", True, None), ("World Cup", True, 7),
+           ("zzzzqqq", True, None)]
+
+
+def snapshots(count):
+    rng = random.Random(7)
+    words = sorted({"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(60000)})
+
+    def topic():
+        if rng.random() < 0.3:
+            return "#" + "".join(word.capitalize() for word in rng.sample(words, 2))
+        return " ".join(word.capitalize() for word in rng.sample(words, rng.randint(1, 3)))
+
+    popular = [topic() for _ in range(50)] + ["World Cup", "World Cup Final", "#WorldCup2026", "Copa do Mundo"]
+    start = datetime.utcnow() - timedelta(minutes=count)
+    for i in range(count):
+        trends = [rng.choice(popular) if rng.random() < 0.1 else topic() for _ in range(5)]
+        yield json.dumps({**{f"trend{r}": t for r, t in enumerate(trends, 1)},
+                          "datetime": (start + timedelta(minutes=i)).isoformat()}) + "\n"
+
+
+async def timed(query, fuzzy, since, runs=20):
+    from database import AsyncSessionLocal
+    import search
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        async with AsyncSessionLocal() as db:
+            matches = await search.search_topics(db, query, fuzzy, since, None, 20)
+            hits = await search.search_trend_entries(db, [m["topic_id"] for m in matches], since, None, 50)
+    return (time.perf_counter() - started) / runs * 1000, len(matches), len(hits)
+
+
+async def run():
+    from sqlalchemy import select, func
+    from database import AsyncSessionLocal
+    from models import Topic, TrendEntry
+
+    async with AsyncSessionLocal() as db:
+        topics = (await db.execute(select(func.count(Topic.id)))).scalar()
+        entries = (await db.execute(select(func.count(TrendEntry.id)))).scalar()
+    print(f"{topics} topics, {entries} trend strings; mean of 20, both queries")
+    for query, fuzzy, days in QUERIES:
+        since = datetime.utcnow() - timedelta(days=days) if days else None
+        ms, matched, hits = await timed(query, fuzzy, since)
+        window = f"last {days}d" if days else "all time"
+        print(f"{query!r:12} fuzzy={fuzzy!s:5} {window:9} {ms:7.2f} ms ({matched} topics, {hits} hits)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshots", type=int, default=100000)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+
+    use_scratch_database(args.dir)
+    from database import Base, engine, SessionLocal
+    from migrations import run_migrations
+    from models import Trend
+    from ingest import BulkIngester
+
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    with SessionLocal() as db:
+        loaded = db.query(Trend).count()
+    if loaded < args.snapshots:
+        summary = BulkIngester(SessionLocal).ingest(snapshots(args.snapshots))
+        print(f"Loaded {summary['inserted']} snapshots in {summary['seconds']}s")
+    asyncio.run(run())
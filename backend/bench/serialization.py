@@ -0,0 +1,58 @@
+"""Response encoding cost of /trends/all: FastAPI's default JSON path against encode_json (orjson).
+
+Times building and encoding one page of rows both ways, then the endpoint's
+throughput with the response cache off:
+
+    python bench/serialization.py [--rows 20000] [--limit 100] [--dir /tmp/trends-bench]
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+
+from common import use_scratch_database, seed, median_ms
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+
+    use_scratch_database(args.dir)
+    os.environ["TRENDS_CACHE_TTL"] = "0"
+    seed(args.rows)
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.testclient import TestClient
+    from database import AsyncSessionLocal
+    from cache import encode_json
+    import crud_async
+    import main
+
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await crud_async.get_all_trends(db, args.limit, 0)
+
+    records = asyncio.run(load())
+
+    def payload():
+        return {"status": "success", "total": args.rows, "next_cursor": None,
+                "data": [record._asdict() for record in records]}
+
+    # What a plain JSONResponse does with the same payload
+    def stdlib():
+        return json.dumps(jsonable_encoder(payload()), ensure_ascii=False, separators=(",", ":")).encode()
+
+    assert json.loads(stdlib()) == json.loads(encode_json(payload()))
+    print(f"encode {args.limit} rows: jsonable_encoder + json {median_ms(stdlib):.2f} ms, "
+          f"encode_json {median_ms(lambda: encode_json(payload())):.2f} ms")
+
+    client = TestClient(main.app)
+    client.get(f"/trends/all?limit={args.limit}")
+    started = time.perf_counter()
+    for i in range(args.requests):
+        assert client.get(f"/trends/all?limit={args.limit}&offset={i}").status_code == 200
+    print(f"/trends/all?limit={args.limit}, cache off: {args.requests / (time.perf_counter() - started):.0f} req/s")
@@ -0,0 +1,107 @@
+"""Bare requests.get against the shared Transport: time per call and TCP/TLS connections opened.
+
+Local stub servers stand in for an IP service (plain HTTP and TLS, with a
+throwaway self-signed certificate made with openssl) and for 20 proxies;
+connections are counted server-side:
+
+    python bench/transport.py [--calls 200]
+"""
+import os
+import ssl
+import json
+import time
+import argparse
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from common import use_scratch_database
+
+connections = {"count": 0}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Answers every GET like httpbin.org/ip, directly or as an HTTP proxy"""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        connections["count"] += 1
+        super().setup()
+
+    def do_GET(self):
+        body = json.dumps({"origin": "203.0.113.9"}).encode()
+        self.wfile.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                         % (len(body), body))
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(tls=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    if tls:
+        server.socket = tls.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_port
+
+
+def certificate(directory):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    return cert, key
+
+
+def run(label, fn, calls):
+    connections["count"] = 0
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    seconds = time.perf_counter() - started
+    print(f"{label:<44} {seconds / calls * 1000:7.2f} ms/call, {connections['count']:4d} connections")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    directory = use_scratch_database()
+    cert, key = certificate(directory)
+    # Both bare requests and the Transport's sessions trust the throwaway certificate
+    os.environ["REQUESTS_CA_BUNDLE"] = cert
+    tls = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    tls.load_cert_chain(cert, key)
+
+    import requests
+    import transport as transport_module
+    from transport import Transport
+
+    http_port, https_port = serve(), serve(tls)
+    proxies = [f"127.0.0.1:{serve()}" for _ in range(20)]
+
+    for scheme, port in (("http", http_port), ("https", https_port)):
+        url = f"{scheme}://127.0.0.1:{port}/ip"
+        shared = Transport()
+        run(f"{scheme} bare requests.get", lambda: requests.get(url, timeout=10), args.calls)
+        run(f"{scheme} transport.get", lambda: shared.get(url, timeout=10), args.calls)
+
+    # Proxy validation: 5 rounds over 20 proxies, the check URL reached through each proxy
+    shared = Transport()
+    run("validation round, 20 proxies, bare", lambda: [
+        requests.get("http://httpbin.invalid/ip", proxies={"http": f"http://{p}", "https": f"http://{p}"}, timeout=5)
+        for p in proxies], 5)
+    run("validation round, 20 proxies, transport", lambda: [
+        shared.get("http://httpbin.invalid/ip", proxy=p, retries=0, timeout=5) for p in proxies], 5)
+
+    # IP detection as a scrape does it: once to pick the proxy, once after the driver starts
+    ip_url = f"https://127.0.0.1:{https_port}/ip"
+    transport_module.IP_SERVICES[:] = [ip_url]
+    shared = Transport()
+    run("IP lookups per scrape (x2), bare", lambda: [requests.get(ip_url, timeout=10).json() for _ in range(2)], 50)
+    run("IP lookups per scrape (x2), transport+TTL", lambda: [shared.egress_ip(None) for _ in range(2)], 50)
+    stats = shared.stats()
+    print({key: stats[key] for key in ("requests", "connections", "retries", "egress_ips")})
@@ -0,0 +1,120 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from dotenv import load_dotenv
+from cache import encode_json
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before the oldest ones are dropped
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+# Seconds between keep-alive pings on idle connections
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+
+
+class Subscriber:
+    """One connected client: a bounded queue of encoded events"""
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, message):
+        # Slow consumer: drop its oldest event instead of growing without bound
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(message)
+
+    def take_dropped(self):
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class Broadcaster:
+    """Single in-process fan-out of trend and scrape-job events.
+
+    Events are encoded once and pushed onto every subscriber's queue on the
+    event loop, so idle connections cost a queue each rather than a thread.
+    ``publish`` may be called from any thread (scrape workers, crud writes).
+    """
+
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._loop = None
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def bind(self, loop):
+        self._loop = loop
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        """Queue an event for every subscriber; a no-op until bound to a loop"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        message = (event, encode_json(data).decode())
+        with self._lock:
+            self.published += 1
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fanout(message)
+        else:
+            loop.call_soon_threadsafe(self._fanout, message)
+
+    def _fanout(self, message):
+        for subscriber in list(self._subscribers):
+            subscriber.offer(message)
+
+    def stats(self):
+        return {"subscribers": self.subscriber_count, "published": self.published, "queue_size": self.queue_size}
+
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def sse_events(request, subscriber, keepalive=STREAM_KEEPALIVE):
+    """Server-sent events for one subscriber until the client disconnects"""
+    yield "retry: 3000\n\n"
+    while True:
+        try:
+            event, data = await asyncio.wait_for(subscriber.queue.get(), timeout=keepalive)
+        except asyncio.TimeoutError:
+            if await request.is_disconnected():
+                break
+            yield ": ping\n\n"
+            continue
+
+        dropped = subscriber.take_dropped()
+        if dropped:
+            # Tell the client it missed events so it can refetch /trends
+            yield format_sse("lagged", json.dumps({"dropped": dropped}))
+        yield format_sse(event, data)
+
+
+# Shared broadcaster for the API process
+broadcaster = Broadcaster()
@@ -0,0 +1,175 @@
+import os
+import time
+import hashlib
+import threading
+import orjson
+from collections import OrderedDict
+from email.utils import formatdate
+from fastapi.encoders import jsonable_encoder
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRENDS_CACHE_TTL = float(os.getenv("TRENDS_CACHE_TTL", "30"))
+TRENDS_CACHE_SIZE = int(os.getenv("TRENDS_CACHE_SIZE", "256"))
+
+
+def encode_json(payload):
+    """Compact JSON bytes; orjson handles dicts, lists and datetimes natively"""
+    return orjson.dumps(payload, default=jsonable_encoder)
+
+
+class CacheEntry:
+    """An encoded response body with its validators"""
+
+    __slots__ = ("body", "etag", "last_modified", "expires_at")
+
+    def __init__(self, body, last_modified, expires_at):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.last_modified = last_modified
+        self.expires_at = expires_at
+
+    @property
+    def last_modified_header(self):
+        return formatdate(self.last_modified, usegmt=True)
+
+
+class ResponseCache:
+    """In-process TTL + LRU cache of encoded JSON responses.
+
+    Keys are tuples whose first item is the endpoint name, so writes can drop
+    exactly the entries they affect. Each process has its own cache; the TTL
+    bounds staleness for writes made by other processes.
+    """
+
+    def __init__(self, maxsize=TRENDS_CACHE_SIZE, ttl=TRENDS_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.last_modified = time.time()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get_or_load(self, key, loader):
+        """Return the cached entry for key, calling loader() on a miss.
+
+        loader returns the payload to encode, or None for "not found" (which is
+        not cached).
+        """
+        entry, miss = self._lookup(key)
+        if entry is not None:
+            return entry
+        return self._store(key, loader(), *miss)
+
+    async def aget_or_load(self, key, loader):
+        """Same as get_or_load for an async loader"""
+        entry, miss = self._lookup(key)
+        if entry is not None:
+            return entry
+        return self._store(key, await loader(), *miss)
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return entry, None
+                del self._entries[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+            return None, (now, self._generation, self.last_modified)
+
+    def _store(self, key, payload, now, generation, last_modified):
+        if payload is None:
+            return None
+
+        body = encode_json(payload)
+        entry = CacheEntry(body, last_modified, now + self.ttl)
+
+        with self._lock:
+            # A write landed while we were loading: serve this result but don't cache it
+            if generation == self._generation:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return entry
+
+    def invalidate(self, *endpoints, keys=()):
+        """Drop every entry of the given endpoints plus any exact keys"""
+        with self._lock:
+            self._generation += 1
+            self.last_modified = time.time()
+            doomed = [k for k in self._entries if k[0] in endpoints]
+            doomed.extend(k for k in keys if k in self._entries and k not in doomed)
+            for key in doomed:
+                del self._entries[key]
+            self._stats["invalidations"] += len(doomed)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else None,
+            }
+
+
+class CachedCounter:
+    """A row count loaded once, kept current by writes and reloaded after ttl"""
+
+    def __init__(self, ttl=TRENDS_CACHE_TTL * 10):
+        self.ttl = ttl
+        self._value = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def peek(self):
+        """Current value, or None when it needs (re)loading"""
+        with self._lock:
+            if self._value is not None and time.time() - self._loaded_at < self.ttl:
+                return self._value
+            return None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._loaded_at = time.time()
+
+    def get(self, loader):
+        value = self.peek()
+        if value is None:
+            value = loader()
+            self.set(value)
+        return value
+
+    def add(self, delta):
+        with self._lock:
+            if self._value is not None:
+                self._value = max(0, self._value + delta)
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+
+
+# Shared cache for the trend read endpoints, invalidated by crud writes
+trend_cache = ResponseCache()
+# Total number of trend rows, so /trends/all doesn't COUNT(*) per request
+trend_count = CachedCounter()
+# Total number of rollup rows; only retention runs change it
+rollup_count = CachedCounter()
@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Word-trigram Jaccard similarity above which a new topic joins a known one
+CANONICAL_SIMILARITY = float(os.getenv("CANONICAL_SIMILARITY", "0.75"))
+# Near-duplicate candidates verified per lookup (crowded LSH buckets are cut off)
+CANONICAL_MAX_CANDIDATES = int(os.getenv("CANONICAL_MAX_CANDIDATES", "50"))
+
+# MinHash signature = LSH_BANDS bands of LSH_ROWS values. Two topics become
+# candidates when a whole band matches, which happens for ~95% of pairs at
+# 0.75 similarity and under 20% at 0.4.
+LSH_BANDS = 8
+LSH_ROWS = 4
+SIGNATURE_SIZE = LSH_BANDS * LSH_ROWS
+
+_MASK = (1 << 64) - 1
+
+HASHTAG_RE = re.compile(r"#(\w+)")
+# Boundaries inside a hashtag: camelCase, acronym followed by a word, letters/digits
+CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])|(?<=[A-Za-z])(?=\d)|(?<=\d)(?=[A-Za-z])")
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+# ✅ Normalize topic text: Unicode (NFKC), hashtags split into words, case, punctuation and whitespace
+def normalize_topic(text: str):
+    text = unicodedata.normalize("NFKC", text)
+    text = HASHTAG_RE.sub(lambda m: " " + CAMEL_RE.sub(" ", m.group(1)) + " ", text)
+    return " ".join(WORD_RE.findall(text.casefold()))
+
+
+def topic_key(text: str):
+    """Spacing-insensitive form: "#WorldCup", "World Cup" and "worldcup" share one key"""
+    return normalize_topic(text).replace(" ", "")
+
+
+def topic_id_for(key: str):
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def shingles(normalized: str):
+    """Trigrams of each word, padded like pg_trgm, so word order does not matter"""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def numbers(normalized: str):
+    """Digit-bearing words: "Election 2020" and "Election 2024" are different events"""
+    return sorted(word for word in normalized.split() if any(c.isdigit() for c in word))
+
+
+def jaccard(a: set, b: set):
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def minhash(grams: set):
+    """One-permutation MinHash: each trigram is hashed once into one of the bins.
+
+    Hashing every trigram once per signature value costs ~30x more in Python.
+    Empty bins borrow the next filled bin's value, offset by the distance
+    (densification), so short topics still get a full signature. str hashes
+    are salted per process, which is fine for an index that lives in one.
+    """
+    bins = [None] * SIGNATURE_SIZE
+    for gram in grams:
+        h = hash(gram) & _MASK
+        i, value = h % SIGNATURE_SIZE, h // SIGNATURE_SIZE
+        if bins[i] is None or value < bins[i]:
+            bins[i] = value
+    if not grams or None not in bins:
+        return bins if grams else [0] * SIGNATURE_SIZE
+    signature = list(bins)
+    for i in range(SIGNATURE_SIZE):
+        if bins[i] is None:
+            distance = 1
+            while bins[(i + distance) % SIGNATURE_SIZE] is None:
+                distance += 1
+            signature[i] = bins[(i + distance) % SIGNATURE_SIZE] + (distance << 64)
+    return signature
+
+
+def band_keys(signature: list):
+    # Bands take every LSH_BANDS-th bin: neighbouring bins often hold the same borrowed
+    # value, and a band made of them would match on a single common trigram
+    return [hash((band, *signature[band::LSH_BANDS])) for band in range(LSH_BANDS)]
+
+
+class TopicCanonicalizer:
+    """Maps trend text to a canonical topic id.
+
+    Text is normalized first; topics whose normalized text only differs in
+    spacing share an exact key. Anything else is looked up as a near duplicate
+    of a known topic with MinHash/LSH over word trigrams and joins it when the
+    verified similarity is at least ``similarity`` and both have the same
+    numbers (years, versions, scores); otherwise it becomes a new
+    topic with an id derived from its key (the same in every process).
+
+    The index is loaded from the topics table on first use. Near-duplicate
+    decisions are made per process, against the topics it has loaded or seen.
+    """
+
+    def __init__(self, session_factory=None, similarity=CANONICAL_SIMILARITY, max_candidates=CANONICAL_MAX_CANDIDATES):
+        self.session_factory = session_factory
+        self.similarity = similarity
+        self.max_candidates = max_candidates
+        self._ids = []  # Topic id per index slot
+        self._normalized = []  # Canonical normalized text per slot
+        self._by_key = {}  # Exact key -> slot
+        self._buckets = {}  # Band key -> slot, or list of slots
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._stats = {"exact": 0, "near_duplicate": 0, "new": 0, "load_seconds": None}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def stats(self):
+        return {**self._stats, "topics": len(self._ids), "similarity": self.similarity}
+
+    def load(self):
+        """Index every known topic (existing ids are kept as they are)"""
+        with self._lock:
+            if self._loaded:
+                return
+            from sqlalchemy import select
+            from models import Topic
+            if self.session_factory is None:
+                from database import SessionLocal
+                self.session_factory = SessionLocal
+
+            started = time.perf_counter()
+            db = self.session_factory()
+            try:
+                rows = db.execute(select(Topic.id, Topic.normalized).execution_options(yield_per=10000))
+                for topic_id, stored in rows:
+                    # Topics saved before canonicalization keep their id under the new normalization
+                    normalized = normalize_topic(stored)
+                    key = normalized.replace(" ", "")
+                    if key and key not in self._by_key:
+                        self._add(topic_id, normalized, key)
+            finally:
+                db.close()
+            self._loaded = True
+            self._stats["load_seconds"] = round(time.perf_counter() - started, 3)
+            logger.info(f"Indexed {len(self._ids)} topics for canonicalization in {self._stats['load_seconds']}s")
+
+    def canonicalize(self, text: str):
+        """Returns (normalized, topic_id, canonical normalized), or None for text without words"""
+        normalized = normalize_topic(text)
+        if not normalized:
+            return None
+        key = normalized.replace(" ", "")
+        if not self._loaded:
+            self.load()
+
+        with self._lock:
+            slot = self._by_key.get(key)
+            if slot is not None:
+                self._stats["exact"] += 1
+                return normalized, self._ids[slot], self._normalized[slot]
+
+            grams = shingles(normalized)
+            bands = band_keys(minhash(grams))
+            slot = self._nearest(grams, bands, numbers(normalized))
+            if slot is not None:
+                # Later spellings of this variant are exact hits
+                self._by_key[key] = slot
+                self._stats["near_duplicate"] += 1
+                return normalized, self._ids[slot], self._normalized[slot]
+
+            topic_id = topic_id_for(key)
+            self._add(topic_id, normalized, key, bands)
+            self._stats["new"] += 1
+            return normalized, topic_id, normalized
+
+    def _nearest(self, grams, bands, digits):
+        best, best_score, checked = None, self.similarity, set()
+        for band in bands:
+            found = self._buckets.get(band)
+            if found is None:
+                continue
+            for slot in (found if isinstance(found, list) else (found,)):
+                if slot in checked:
+                    continue
+                checked.add(slot)
+                score = jaccard(grams, shingles(self._normalized[slot]))
+                if score >= best_score and numbers(self._normalized[slot]) == digits:
+                    best, best_score = slot, score
+                if len(checked) >= self.max_candidates:
+                    return best
+        return best
+
+    def _add(self, topic_id, normalized, key, bands=None):
+        slot = len(self._ids)
+        self._ids.append(topic_id)
+        self._normalized.append(normalized)
+        self._by_key[key] = slot
+        for band in bands or band_keys(minhash(shingles(normalized))):
+            found = self._buckets.get(band)
+            if found is None:
+                self._buckets[band] = slot  # Most buckets hold one topic; skip the list for those
+            elif isinstance(found, list):
+                found.append(slot)
+            else:
+                self._buckets[band] = [found, slot]
+
+
+# Shared by every writer in the process
+canonicalizer = TopicCanonicalizer()
@@ -0,0 +1,126 @@
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+from sqlalchemy import select
+from models import Trend, TREND_COLUMNS, EMPTY_TREND
+from canonical import topic_key
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Store a scrape that matches the previous snapshot of its stream as a heartbeat on that row
+CHANGE_DETECTION = os.getenv("CHANGE_DETECTION", "true").lower() == "true"
+
+
+def stream_of(data: dict):
+    """Snapshots are compared within one (account, location) stream"""
+    return data.get("account"), data.get("location")
+
+
+# Failed scrapes store their error text in the trend columns, behind this prefix
+ERROR_PREFIX = "Error:"
+
+
+def is_error(data: dict):
+    return bool(data.get("error")) or (data.get("trend1") or "").startswith(ERROR_PREFIX)
+
+
+def is_error_row():
+    """SQL counterpart of is_error for stored trends rows"""
+    return Trend.trend1.like(f"{ERROR_PREFIX}%")
+
+
+def snapshot_keys(values: list):
+    """Canonical key per rank, so "#WorldCup" and "World Cup" count as the same topic"""
+    return tuple(topic_key(value) if value and value != EMPTY_TREND else None for value in values)
+
+
+def diff_snapshots(previous: list, values: list):
+    """Topics that entered, left or moved between two snapshots (ranks start at 1)"""
+    before = {key: rank for rank, key in enumerate(snapshot_keys(previous), start=1) if key}
+    after = {key: rank for rank, key in enumerate(snapshot_keys(values), start=1) if key}
+    return {
+        "entered": [{"topic": values[rank - 1], "rank": rank} for key, rank in after.items() if key not in before],
+        "left": [{"topic": previous[rank - 1], "rank": rank} for key, rank in before.items() if key not in after],
+        "moved": [
+            {"topic": values[rank - 1], "from": before[key], "to": rank}
+            for key, rank in after.items() if key in before and before[key] != rank
+        ],
+    }
+
+
+def snapshot(trend_id, data: dict):
+    values = [data.get(c) for c in TREND_COLUMNS]
+    return {"id": trend_id, "values": values, "keys": snapshot_keys(values), "error": is_error(data)}
+
+
+class ChangeDetector:
+    """Latest stored snapshot per stream, to tell changed scrapes from repeats.
+
+    The latest row of each stream is kept in memory (read from the trends table
+    on a miss), so comparing a scrape costs no query. Error rows never match:
+    the first good scrape after a failure always stores a full row.
+    """
+
+    def __init__(self, enabled=CHANGE_DETECTION):
+        self.enabled = enabled
+        self._latest = {}  # (account, location) -> {"id", "values", "keys", "error"}
+        self._lock = threading.Lock()
+
+    def _load(self, db, stream):
+        account, location = stream
+        query = select(Trend.id, *[getattr(Trend, c) for c in TREND_COLUMNS])
+        # "= NULL" never matches, and IS NOT DISTINCT FROM cannot use the location index
+        query = query.where(Trend.account.is_(None) if account is None else Trend.account == account)
+        query = query.where(Trend.location.is_(None) if location is None else Trend.location == location)
+        row = db.execute(query.order_by(Trend.datetime.desc(), Trend.id.desc()).limit(1)).first()
+        if row is None:
+            return None
+        return snapshot(row.id, dict(zip(TREND_COLUMNS, row[1:])))
+
+    def latest(self, db, stream):
+        """Latest stored snapshot of a stream, or None (always None when disabled)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            found = self._latest.get(stream)
+        if found is None:
+            found = self._load(db, stream)
+            if found is not None:
+                with self._lock:
+                    found = self._latest.setdefault(stream, found)
+        return found
+
+    @staticmethod
+    def unchanged(previous, data: dict):
+        """True when a scrape ranks the same topics as the previous snapshot"""
+        return (
+            previous is not None and not previous["error"] and not is_error(data)
+            and previous["keys"] == snapshot_keys([data.get(c) for c in TREND_COLUMNS])
+        )
+
+    def remember(self, row: dict):
+        """Call once a new row is committed; it becomes its stream's latest"""
+        if self.enabled:
+            with self._lock:
+                self._latest[stream_of(row)] = snapshot(row["id"], row)
+
+    def forget(self, trend_id=None, streams=None):
+        """Drop cached snapshots (of one deleted row, of some streams, or all) so they are read again"""
+        with self._lock:
+            if streams is not None:
+                for stream in streams:
+                    self._latest.pop(stream, None)
+            elif trend_id is None:
+                self._latest.clear()
+            else:
+                self._latest = {s: snap for s, snap in self._latest.items() if snap["id"] != trend_id}
+
+    def stats(self):
+        return {"enabled": self.enabled, "streams": len(self._latest)}
+
+
+# Shared by every writer in the process
+change_detector = ChangeDetector()
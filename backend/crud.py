@@ -1,32 +1,347 @@
+from sqlalchemy import func, tuple_, select, delete, bindparam
 from sqlalchemy.orm import Session
-from models import Trend
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Trend, Topic, TrendEntry, TopicStats, TopicHourly, TREND_COLUMNS, EMPTY_TREND
+from cache import trend_cache, trend_count
+from broadcast import broadcaster
+from canonical import canonicalizer
+from changes import change_detector, diff_snapshots, snapshot, stream_of, is_error
+import io
+import csv
+import base64
 import uuid
+import logging
 from datetime import datetime
 
-# ✅ Create a new trend record
-def create_trend(db: Session, data: dict):
-    trend = Trend(
-        id=str(uuid.uuid4()),
-        trend1=data.get("trend1"),
-        trend2=data.get("trend2"),
-        trend3=data.get("trend3"),
-        trend4=data.get("trend4"),
-        trend5=data.get("trend5"),
-        datetime=datetime.utcnow(),
-        ip=data.get("ip", "127.0.0.1")
+logger = logging.getLogger(__name__)
+
+# ✅ Insert rows, skipping ones that collide with an existing primary/unique key
+# (with returning=<column>, returns the set of that column for the rows actually inserted)
+def insert_ignore(db: Session, table, rows: list, returning=None):
+    if not rows:
+        return set() if returning is not None else None
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).on_conflict_do_nothing()
+    else:
+        stmt = table.insert().prefix_with("IGNORE")
+    if returning is None:
+        db.execute(stmt, rows)
+        return None
+    return set(db.execute(stmt.returning(returning), rows).scalars())
+
+# ✅ Insert rows, or add their counters onto the existing row with the same key
+# (columns in `replace` are overwritten with the new values instead)
+def upsert_add(db: Session, table, rows: list, keys: list, add=(), least=(), greatest=(), replace=()):
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table)
+        smaller, larger = func.least, func.greatest
+    else:
+        stmt = sqlite.insert(table)
+        smaller, larger = func.min, func.max  # SQLite's scalar min()/max() take several arguments
+    excluded = stmt.excluded
+    values = {c: table.c[c] + excluded[c] for c in add}
+    values.update({c: smaller(table.c[c], excluded[c]) for c in least})
+    values.update({c: larger(table.c[c], excluded[c]) for c in greatest})
+    values.update({c: excluded[c] for c in replace})
+    # Sorted so concurrent writers lock rows in the same order
+    rows = sorted(rows, key=lambda row: tuple(row[k] for k in keys))
+    db.execute(stmt.on_conflict_do_update(index_elements=keys, set_=values), rows)
+
+# ✅ Fold new trend_entries rows into the topic_stats / topic_hourly aggregates
+# (an entry may stand for several scrapes: optional "count" and "last_seen")
+def update_topic_aggregates(db: Session, entries: list):
+    totals, hourly = {}, {}
+    for entry in entries:
+        when, rank = entry["datetime"], entry["rank"]
+        count, last = entry.get("count", 1), entry.get("last_seen") or when
+        hour = when.replace(minute=0, second=0, microsecond=0)
+        stats = totals.get(entry["topic_id"])
+        if stats is None:
+            totals[entry["topic_id"]] = {
+                "topic_id": entry["topic_id"], "appearances": count, "rank_sum": rank * count,
+                "best_rank": rank, "first_seen": when, "last_seen": last
+            }
+        else:
+            stats["appearances"] += count
+            stats["rank_sum"] += rank * count
+            stats["best_rank"] = min(stats["best_rank"], rank)
+            stats["first_seen"] = min(stats["first_seen"], when)
+            stats["last_seen"] = max(stats["last_seen"], last)
+        bucket = hourly.get((entry["topic_id"], hour))
+        if bucket is None:
+            hourly[(entry["topic_id"], hour)] = {
+                "topic_id": entry["topic_id"], "hour": hour, "appearances": count, "rank_sum": rank * count,
+                "best_rank": rank
+            }
+        else:
+            bucket["appearances"] += count
+            bucket["rank_sum"] += rank * count
+            bucket["best_rank"] = min(bucket["best_rank"], rank)
+
+    upsert_add(db, TopicStats.__table__, list(totals.values()), ["topic_id"],
+               add=("appearances", "rank_sum"), least=("best_rank", "first_seen"), greatest=("last_seen",))
+    upsert_add(db, TopicHourly.__table__, list(hourly.values()), ["topic_id", "hour"],
+               add=("appearances", "rank_sum"), least=("best_rank",))
+
+# ✅ Take a snapshot's entries back out of topic_stats / topic_hourly (call before deleting it).
+# Counts and rank sums are exact; best_rank, first_seen and last_seen keep their old values.
+# Repeats of an unchanged snapshot were counted in the hours they were seen, which are only
+# known when they all fell in the hour it was stored.
+def subtract_topic_aggregates(db: Session, trend_id: str):
+    rows = db.execute(
+        select(TrendEntry.topic_id, TrendEntry.rank, TrendEntry.datetime,
+               func.coalesce(Trend.seen_count, 1).label("count"), Trend.last_seen_at)
+        .join(Trend, Trend.id == TrendEntry.trend_id)
+        .where(TrendEntry.trend_id == trend_id)
+    ).all()
+    if not rows:
+        return
+    hour = rows[0].datetime.replace(minute=0, second=0, microsecond=0)
+    last_hour = (rows[0].last_seen_at or rows[0].datetime).replace(minute=0, second=0, microsecond=0)
+    in_bucket = rows[0].count if last_hour == hour else 1
+
+    stats, hourly = TopicStats.__table__, TopicHourly.__table__
+    db.execute(
+        stats.update().where(stats.c.topic_id == bindparam("topic"))
+        .values(appearances=stats.c.appearances - bindparam("count"), rank_sum=stats.c.rank_sum - bindparam("ranks")),
+        [{"topic": row.topic_id, "count": row.count, "ranks": row.rank * row.count} for row in rows]
+    )
+    db.execute(
+        hourly.update().where(hourly.c.topic_id == bindparam("topic"), hourly.c.hour == hour)
+        .values(appearances=hourly.c.appearances - in_bucket, rank_sum=hourly.c.rank_sum - bindparam("ranks")),
+        [{"topic": row.topic_id, "ranks": row.rank * in_bucket} for row in rows]
     )
+    topic_ids = {row.topic_id for row in rows}
+    db.execute(delete(TopicStats).where(TopicStats.topic_id.in_(topic_ids), TopicStats.appearances <= 0))
+    db.execute(delete(TopicHourly).where(TopicHourly.topic_id.in_(topic_ids), TopicHourly.appearances <= 0))
+    if in_bucket < rows[0].count:
+        logger.warning(f"Deleted snapshot {trend_id} was seen {rows[0].count} times up to {rows[0].last_seen_at}; "
+                       f"hourly topic buckets keep its repeats until migrations.rebuild_topic_aggregates runs")
+
+# ✅ Append rows: COPY on PostgreSQL (psycopg2), a multi-row INSERT elsewhere
+def copy_rows(db: Session, table, rows: list):
+    if not rows:
+        return
+    bind = db.get_bind()
+    if bind.dialect.name != "postgresql" or bind.dialect.driver != "psycopg2":
+        db.execute(table.insert(), rows)
+        return
+
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Unquoted empty fields load as NULL
+        writer.writerow([None if row[c] is None else str(row[c]) for c in columns])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+# ✅ Build trend_entries / topics rows for a snapshot; each text is mapped to its canonical topic
+# (near-duplicate spellings share one topic, see canonical.TopicCanonicalizer)
+def build_entries(trend_id: str, values: list, when: datetime):
+    entries, topics = [], {}
+    for rank, text in enumerate(values, start=1):
+        if not text or text == EMPTY_TREND:
+            continue
+        canonical = canonicalizer.canonicalize(text)
+        if canonical is None:
+            continue
+        normalized, topic_id, topic_normalized = canonical
+        # Inserted with "ignore": a no-op unless the topic is new (or its first insert was rolled back)
+        topics.setdefault(topic_id, {"id": topic_id, "name": text, "normalized": topic_normalized, "first_seen": when})
+        entries.append({
+            "trend_id": trend_id,
+            "rank": rank,
+            "text": text,
+            "normalized": normalized,
+            "topic_id": topic_id,
+            "datetime": when
+        })
+    return entries, list(topics.values())
+
+# ✅ Trend column values for one scrape result
+def trend_row(data: dict, when: datetime):
+    return {
+        "id": str(uuid.uuid4()),
+        **{c: data.get(c) for c in TREND_COLUMNS},
+        "datetime": when,
+        "ip": data.get("ip", "127.0.0.1"),
+        "account": data.get("account"),
+        "location": data.get("location"),
+        "timings": data.get("timings")
+    }
+
+# ✅ Record scrapes that repeat their stream's latest snapshot on that row (no commit).
+# The topics still count as seen again, so the aggregates are updated as for a new row.
+# Returns {trend_id: repeats} for the rows that still exist.
+def record_unchanged(db: Session, previous: list, when: datetime):
+    seen = {}
+    for repeated in previous:
+        seen[repeated["id"]] = seen.get(repeated["id"], 0) + 1
+    for trend_id, count in list(seen.items()):
+        updated = db.execute(
+            Trend.__table__.update().where(Trend.id == trend_id)
+            .values(last_seen_at=when, seen_count=func.coalesce(Trend.seen_count, 1) + count)
+        ).rowcount
+        if not updated:
+            # Deleted by another process since it was cached
+            change_detector.forget(trend_id)
+            del seen[trend_id]
+    entries = []
+    for repeated in previous:
+        if repeated["id"] in seen:
+            entries.extend(build_entries(repeated["id"], repeated["values"], when)[0])
+    update_topic_aggregates(db, entries)
+    return seen
+
+# ✅ Publish heartbeats and drop the cached pages that show them
+def publish_unchanged(seen: dict, when: datetime):
+    trend_cache.invalidate("latest", "all", "analytics", keys=[("by_id", None, None, trend_id) for trend_id in seen])
+    for trend_id in seen:
+        broadcaster.publish("trend_unchanged", {"id": trend_id, "last_seen_at": when})
+
+# ✅ Create a new trend record (or a heartbeat on the latest one when nothing changed)
+def create_trend(db: Session, data: dict):
+    when = datetime.utcnow()
+    previous = change_detector.latest(db, stream_of(data))
+    if change_detector.unchanged(previous, data):
+        seen = record_unchanged(db, [previous], when)
+        db.commit()
+        if seen:
+            publish_unchanged(seen, when)
+            return db.get(Trend, previous["id"], populate_existing=True)
+        previous = change_detector.latest(db, stream_of(data))
+
+    trend = Trend(**trend_row(data, when))
+    if previous and not previous["error"] and not data.get("error"):
+        trend.diff = diff_snapshots(previous["values"], [data.get(c) for c in TREND_COLUMNS])
     db.add(trend)
+
+    # Failed scrapes store their error text in the trend columns; keep them out of topic history
+    if not data.get("error"):
+        entries, topics = build_entries(trend.id, [data.get(c) for c in TREND_COLUMNS], trend.datetime)
+        db.flush()
+        insert_ignore(db, Topic.__table__, topics)
+        if entries:
+            db.execute(TrendEntry.__table__.insert(), entries)
+            update_topic_aggregates(db, entries)
+
     db.commit()
     db.refresh(trend)
+    change_detector.remember(trend.to_dict())
+    # A new row changes the latest trend, shifts every page and moves the analytics
+    trend_count.add(1)
+    trend_cache.invalidate("latest", "all", "analytics")
+    broadcaster.publish("trend", trend.to_dict())
     return trend
 
+# ✅ Insert prepared trend rows with one multi-row INSERT per table (no commit).
+# Rows whose id already exists are skipped; returns the ids that were inserted.
+def insert_trends(db: Session, rows: list):
+    # Index the known topics before writing: the index reads them on its own connection,
+    # which on SQLite would wait for this transaction's lock once a big insert spills to disk
+    canonicalizer.load()
+    inserted = insert_ignore(db, Trend.__table__, rows, returning=Trend.__table__.c.id)
+
+    entries, topics = [], {}
+    pending = set(inserted)
+    for row in rows:
+        if row["id"] not in pending:
+            continue
+        pending.discard(row["id"])
+        # Keep failed scrapes out of topic history
+        if is_error(row):
+            continue
+        row_entries, row_topics = build_entries(row["id"], [row.get(c) for c in TREND_COLUMNS], row["datetime"])
+        entries.extend(row_entries)
+        for topic in row_topics:
+            topics.setdefault(topic["id"], topic)
+
+    insert_ignore(db, Topic.__table__, list(topics.values()))
+    # Entries only belong to rows inserted just now, so they never conflict and can be COPYed
+    copy_rows(db, TrendEntry.__table__, entries)
+    update_topic_aggregates(db, entries)
+    return inserted
+
+# ✅ Create several trend records (one fan-out cycle) in one transaction.
+# Targets whose snapshot did not change get a heartbeat instead of a row; the
+# result lists the stored row, or {"id", "unchanged", "last_seen_at"}, per item.
+def create_trends(db: Session, items: list):
+    when = datetime.utcnow()
+    if not items:
+        return []
+
+    rows, repeats, results, batch_latest = [], [], [], {}
+    for data in items:
+        stream = stream_of(data)
+        # Targets sharing a stream compare against the ones before them in this batch
+        previous = batch_latest.get(stream) or change_detector.latest(db, stream)
+        if change_detector.unchanged(previous, data):
+            repeats.append(previous)
+            results.append({"id": previous["id"], "unchanged": True, "last_seen_at": when})
+            continue
+        row = trend_row(data, when)
+        if previous and not previous["error"] and not data.get("error"):
+            row["diff"] = diff_snapshots(previous["values"], [data.get(c) for c in TREND_COLUMNS])
+        rows.append(row)
+        results.append(row)
+        if change_detector.enabled:
+            batch_latest[stream] = snapshot(row["id"], row)
+
+    insert_trends(db, rows)
+    seen = record_unchanged(db, repeats, when) if repeats else {}
+    db.commit()
+
+    for row in rows:
+        change_detector.remember(row)
+    if rows:
+        trend_count.add(len(rows))
+        trend_cache.invalidate("latest", "all", "analytics")
+        for row in rows:
+            broadcaster.publish("trend", row)
+    if seen:
+        publish_unchanged(seen, when)
+    return results
+
 # ✅ Get latest trend
 def get_latest_trend(db: Session):
-    return db.query(Trend).order_by(Trend.datetime.desc()).first()
+    return db.query(Trend).order_by(Trend.datetime.desc(), Trend.id.desc()).first()
 
 # ✅ Get all trends (with pagination)
 def get_all_trends(db: Session, limit: int = 10, offset: int = 0):
-    return db.query(Trend).order_by(Trend.datetime.desc()).offset(offset).limit(limit).all()
+    return db.query(Trend).order_by(Trend.datetime.desc(), Trend.id.desc()).offset(offset).limit(limit).all()
+
+# ✅ Keyset cursors: an opaque token for the (datetime, id) of the last row on a page
+def encode_cursor(trend: Trend):
+    raw = f"{trend.datetime.isoformat()}|{trend.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Returns (datetime, id), raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        when, trend_id = raw.split("|", 1)
+        return datetime.fromisoformat(when), trend_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+# ✅ Get the page of trends after a cursor (newest first), without OFFSET scans
+def get_trends_after(db: Session, limit: int = 10, cursor: str = None):
+    query = db.query(Trend)
+    if cursor:
+        query = query.filter(tuple_(Trend.datetime, Trend.id) < tuple_(*decode_cursor(cursor)))
+    return query.order_by(Trend.datetime.desc(), Trend.id.desc()).limit(limit).all()
+
+# ✅ Total number of trends (maintained in memory, recounted occasionally)
+def count_trends(db: Session):
+    return trend_count.get(lambda: db.query(func.count(Trend.id)).scalar())
 
 # ✅ Get trend by ID
 def get_trend_by_id(db: Session, trend_id: str):
@@ -36,7 +351,12 @@ def get_trend_by_id(db: Session, trend_id: str):
 def delete_trend(db: Session, trend_id: str):
     trend = db.query(Trend).filter(Trend.id == trend_id).first()
     if trend:
+        subtract_topic_aggregates(db, trend_id)
         db.delete(trend)
         db.commit()
+        trend_count.add(-1)
+        change_detector.forget(trend_id)
+        trend_cache.invalidate("latest", "all", "analytics", keys=[("by_id", None, None, trend_id)])
+        broadcaster.publish("trend_deleted", {"id": trend_id})
         return True
     return False
@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, func, tuple_, union_all, literal, cast, null, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Trend, Topic, TrendEntry, TopicStats, TopicHourly, TrendRollup
+from cache import trend_cache, trend_count, rollup_count
+from broadcast import broadcaster
+from crud import decode_cursor, subtract_topic_aggregates
+from canonical import normalize_topic, topic_key, topic_id_for
+from changes import change_detector
+
+# Async versions of the crud read/delete functions, used by the API routes.
+# Scrape jobs run in worker threads and keep using the sync functions in crud.
+# Reads select plain columns and return Row tuples (use row._asdict()) instead of
+# hydrating ORM objects, which is most of the cost of a page of trends.
+
+# ✅ Raw snapshots and their rollups (see retention.py) as one row set in the trends shape,
+# plus `resolution` ("raw", "hour" or "day"). Each condition is a function of a table,
+# applied to both sides. Tiers cover different time ranges, so reads ordered by datetime
+# pick up whichever tier holds the time they reach.
+def trend_history(*conditions):
+    rollups = TrendRollup.__table__
+    raw = select(*Trend.__table__.columns, literal("raw", String).label("resolution"))
+    rolled = select(
+        *[rollups.c[c.name] if c.name in rollups.c else cast(null(), c.type).label(c.name) for c in Trend.__table__.columns],
+        rollups.c.resolution
+    )
+    for condition in conditions:
+        raw = raw.where(condition(Trend.__table__))
+        rolled = rolled.where(condition(rollups))
+    return union_all(raw, rolled)
+
+def _newest_first(history):
+    return history.order_by(history.selected_columns.datetime.desc(), history.selected_columns.id.desc())
+
+def _stream(account: str = None, location: str = None):
+    conditions = []
+    if account is not None:
+        conditions.append(lambda t: t.c.account == account)
+    if location is not None:
+        conditions.append(lambda t: t.c.location == location)
+    return conditions
+
+# ✅ Get latest trend
+async def get_latest_trend(db: AsyncSession):
+    result = await db.execute(_newest_first(trend_history()).limit(1))
+    return result.first()
+
+# ✅ Get all trends (with pagination)
+async def get_all_trends(db: AsyncSession, limit: int = 10, offset: int = 0):
+    result = await db.execute(_newest_first(trend_history()).offset(offset).limit(limit))
+    return result.all()
+
+# ✅ Get the page of trends after a cursor (newest first)
+async def get_trends_after(db: AsyncSession, limit: int = 10, cursor: str = None):
+    conditions = []
+    if cursor:
+        key = tuple_(*decode_cursor(cursor))
+        conditions.append(lambda t: tuple_(t.c.datetime, t.c.id) < key)
+    result = await db.execute(_newest_first(trend_history(*conditions)).limit(limit))
+    return result.all()
+
+# ✅ Total number of trends, rollups included (both counted in memory, recounted occasionally)
+async def count_trends(db: AsyncSession):
+    total = trend_count.peek()
+    if total is None:
+        total = (await db.execute(select(func.count(Trend.id)))).scalar()
+        trend_count.set(total)
+    rollups = rollup_count.peek()
+    if rollups is None:
+        rollups = (await db.execute(select(func.count()).select_from(TrendRollup))).scalar()
+        rollup_count.set(rollups)
+    return total + rollups
+
+# ✅ Snapshot in effect at a point in time, and when it was replaced (None while it is the latest).
+# Every stored row holds the full ranking (unchanged scrapes only extend its last_seen_at),
+# so this is one index lookup each way rather than a replay of diffs; past the raw
+# retention window the answer comes from the hourly or daily rollup.
+async def get_trend_at(db: AsyncSession, when: datetime, account: str = None, location: str = None):
+    conditions = _stream(account, location)
+    history = trend_history(lambda t: t.c.datetime <= when, *conditions)
+    trend = (await db.execute(_newest_first(history).limit(1))).first()
+    if trend is None:
+        return None, None
+    key = tuple_(trend.datetime, trend.id)
+    later = trend_history(lambda t: tuple_(t.c.datetime, t.c.id) > key, *conditions)
+    later = later.order_by(later.selected_columns.datetime, later.selected_columns.id).limit(1)
+    replaced_at = (await db.execute(later)).first()
+    return trend, replaced_at.datetime if replaced_at else None
+
+# ✅ Get trend by ID (or rollup by ID)
+async def get_trend_by_id(db: AsyncSession, trend_id: str):
+    result = await db.execute(trend_history(lambda t: t.c.id == trend_id))
+    return result.first()
+
+# -------------------- Analytics (served from topic_stats / topic_hourly) --------------------
+
+def _hours_ago(hours: int):
+    since = datetime.utcnow() - timedelta(hours=hours)
+    return since.replace(minute=0, second=0, microsecond=0)
+
+def _with_avg_rank(row):
+    data = row._asdict()
+    data["avg_rank"] = round(data.pop("rank_sum") / data["appearances"], 2) if data["appearances"] else None
+    return data
+
+# ✅ Find a topic by id or by its text (any spelling that was canonicalized to it)
+async def resolve_topic(db: AsyncSession, topic: str):
+    query = select(Topic.id, Topic.name)
+    # An id, then the spacing-insensitive key ("worldcup" finds "#WorldCup"), then the text itself
+    by_id = query.where(Topic.id.in_([topic, topic_id_for(topic_key(topic))])).order_by((Topic.id == topic).desc())
+    found = (await db.execute(by_id)).first()
+    if found is None:
+        normalized = normalize_topic(topic)
+        found = (await db.execute(query.where(Topic.normalized == normalized))).first()
+        if found is None:
+            variant = select(TrendEntry.topic_id).where(TrendEntry.normalized == normalized).limit(1).scalar_subquery()
+            found = (await db.execute(query.where(Topic.id == variant))).first()
+    return found
+
+# ✅ Most frequent topics, all time or over the last `hours`
+async def get_top_topics(db: AsyncSession, hours: int = None, limit: int = 10):
+    if hours:
+        # Materialized so the planner range-scans the hour index instead of walking every topic's buckets
+        recent = (
+            select(TopicHourly.topic_id, TopicHourly.appearances, TopicHourly.rank_sum, TopicHourly.best_rank)
+            .where(TopicHourly.hour >= _hours_ago(hours))
+            .cte("recent")
+            .prefix_with("MATERIALIZED")
+        )
+        buckets = (
+            select(
+                recent.c.topic_id,
+                func.sum(recent.c.appearances).label("appearances"),
+                func.sum(recent.c.rank_sum).label("rank_sum"),
+                func.min(recent.c.best_rank).label("best_rank")
+            )
+            .group_by(recent.c.topic_id)
+            .order_by(func.sum(recent.c.appearances).desc(), recent.c.topic_id)
+            .limit(limit)
+            .subquery()
+        )
+        query = (
+            select(buckets.c.topic_id, Topic.name, buckets.c.appearances, buckets.c.rank_sum, buckets.c.best_rank,
+                   TopicStats.first_seen, TopicStats.last_seen)
+            .join(Topic, Topic.id == buckets.c.topic_id)
+            .join(TopicStats, TopicStats.topic_id == buckets.c.topic_id)
+            .order_by(buckets.c.appearances.desc(), buckets.c.topic_id)
+        )
+    else:
+        query = (
+            select(TopicStats.topic_id, Topic.name, TopicStats.appearances, TopicStats.rank_sum, TopicStats.best_rank,
+                   TopicStats.first_seen, TopicStats.last_seen)
+            .join(Topic, Topic.id == TopicStats.topic_id)
+            .order_by(TopicStats.appearances.desc(), TopicStats.topic_id)
+            .limit(limit)
+        )
+    return [_with_avg_rank(row) for row in (await db.execute(query)).all()]
+
+# ✅ First/last seen, appearances and rank summary of one topic
+async def get_topic_stats(db: AsyncSession, topic_id: str):
+    row = (await db.execute(
+        select(TopicStats.appearances, TopicStats.rank_sum, TopicStats.best_rank,
+               TopicStats.first_seen, TopicStats.last_seen)
+        .where(TopicStats.topic_id == topic_id)
+    )).first()
+    if row is None:
+        return None
+    stats = _with_avg_rank(row)
+    stats["seen_for_seconds"] = (stats["last_seen"] - stats["first_seen"]).total_seconds()
+    return stats
+
+# ✅ Hourly rank history of one topic over the last `hours`
+async def get_topic_ranks(db: AsyncSession, topic_id: str, hours: int = 168):
+    result = await db.execute(
+        select(TopicHourly.hour, TopicHourly.appearances, TopicHourly.rank_sum, TopicHourly.best_rank)
+        .where(TopicHourly.topic_id == topic_id, TopicHourly.hour >= _hours_ago(hours))
+        .order_by(TopicHourly.hour)
+    )
+    return [_with_avg_rank(row) for row in result.all()]
+
+# ✅ Delete trend by ID
+async def delete_trend(db: AsyncSession, trend_id: str):
+    trend = await db.get(Trend, trend_id)
+    if trend:
+        await db.run_sync(subtract_topic_aggregates, trend_id)
+        await db.delete(trend)
+        await db.commit()
+        trend_count.add(-1)
+        change_detector.forget(trend_id)
+        trend_cache.invalidate("latest", "all", "analytics", keys=[("by_id", None, None, trend_id)])
+        broadcaster.publish("trend_deleted", {"id": trend_id})
+        return True
+    return False
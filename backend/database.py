@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 import os
 from dotenv import load_dotenv
@@ -17,12 +18,25 @@ DB_HOST = os.getenv("DATABASE_HOST", "localhost")  # Default for local
 if os.getenv("DOCKER", "false").lower() == "true":
     DB_HOST = "db"
 
+# Connection pool settings (PostgreSQL)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+    "pool_recycle": DB_POOL_RECYCLE,
+}
+
 # Build database URL
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # Create engine with fallback to SQLite if PostgreSQL fails
 try:
-    engine = create_engine(DATABASE_URL, echo=False)
+    engine = create_engine(DATABASE_URL, echo=False, **POOL_OPTIONS)
     with engine.connect() as conn:
         print(f"✅ Connected to PostgreSQL at {DB_HOST}:{DB_PORT}")
 except Exception as e:
@@ -34,6 +48,16 @@ except Exception as e:
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine on the same database (asyncpg for PostgreSQL, aiosqlite for the fallback)
+if engine.dialect.name == "postgresql":
+    ASYNC_DATABASE_URL = make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False, **POOL_OPTIONS)
+else:
+    ASYNC_DATABASE_URL = make_url(DATABASE_URL).set(drivername="sqlite+aiosqlite")
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, echo=False)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
@@ -44,3 +68,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dependency to get an async DB session in FastAPI
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,323 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool settings
+DRIVER_POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "1"))
+DRIVER_MAX_AGE_SECONDS = int(os.getenv("DRIVER_MAX_AGE_SECONDS", "1800"))
+DRIVER_MAX_USES = int(os.getenv("DRIVER_MAX_USES", "20"))
+DRIVER_ACQUIRE_TIMEOUT = int(os.getenv("DRIVER_ACQUIRE_TIMEOUT", "300"))
+
+# Where logged-in sessions (cookies + localStorage) are persisted per account
+SESSION_DIR = os.getenv("SESSION_DIR", "./sessions")
+SESSION_ORIGIN = os.getenv("X_BASE_URL", "https://x.com").rstrip("/") + "/"
+
+
+class SessionStore:
+    """Saves and restores browser login state per account"""
+
+    def __init__(self, directory=SESSION_DIR):
+        self.directory = directory
+
+    def _path(self, account):
+        # Hash the account name so it is always a safe file name
+        digest = hashlib.sha1((account or "anonymous").encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def save(self, account, driver):
+        """Persist cookies and localStorage of the current x.com page"""
+        try:
+            state = {
+                "account": account,
+                "saved_at": time.time(),
+                "cookies": driver.get_cookies(),
+                "local_storage": driver.execute_script("return Object.assign({}, window.localStorage);") or {},
+            }
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(account)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.chmod(tmp_path, 0o600)  # Cookies are credentials
+            os.replace(tmp_path, path)
+            logger.info(f"Saved session for {account} ({len(state['cookies'])} cookies)")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to save session for {account}: {e}")
+            return False
+
+    def load(self, account):
+        """Saved state of an account (cookies, local_storage, saved_at), or None"""
+        try:
+            with open(self._path(account)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Failed to read session for {account}: {e}")
+            return None
+
+    def restore(self, account, driver):
+        """Load a saved session into the driver, returns False if none was found"""
+        state = self.load(account)
+        if state is None:
+            return False
+
+        try:
+            # Cookies can only be set for the domain that is currently open
+            driver.get(SESSION_ORIGIN)
+            driver.delete_all_cookies()
+            for cookie in state.get("cookies", []):
+                cookie = {k: v for k, v in cookie.items() if k in ("name", "value", "domain", "path", "secure", "httpOnly", "expiry")}
+                try:
+                    driver.add_cookie(cookie)
+                except Exception as e:
+                    logger.debug(f"Skipping cookie {cookie.get('name')}: {e}")
+
+            local_storage = state.get("local_storage") or {}
+            if local_storage:
+                driver.execute_script(
+                    "for (const [k, v] of Object.entries(arguments[0])) { window.localStorage.setItem(k, v); }",
+                    local_storage,
+                )
+
+            logger.info(f"Restored session for {account}")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to restore session for {account}: {e}")
+            return False
+
+    def clear(self, account):
+        try:
+            os.remove(self._path(account))
+        except FileNotFoundError:
+            pass
+
+
+class PooledDriver:
+    """A driver owned by the pool plus the bookkeeping needed to recycle it"""
+
+    def __init__(self, driver, meta=None, key=None):
+        self.driver = driver
+        self.meta = meta or {}
+        self.key = key
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.logged_in_as = None
+        self.fresh = True
+        self.discard = False
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+
+class DriverPool:
+    """Keeps up to ``size`` browser sessions alive between scrapes.
+
+    ``factory`` is called for cold starts and returns ``(driver, meta)``; the
+    pool never needs to know whether the driver is Chrome or a ``FakeDriver``.
+    Drivers are tagged with the ``key`` they were launched for (e.g. a proxy
+    policy) and only reused for the same key.
+    """
+
+    def __init__(self, factory, size=DRIVER_POOL_SIZE, max_age=DRIVER_MAX_AGE_SECONDS,
+                 max_uses=DRIVER_MAX_USES, acquire_timeout=DRIVER_ACQUIRE_TIMEOUT):
+        self.factory = factory
+        self.size = size
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._stats = {"hits": 0, "cold_starts": 0, "recycles": 0, "evictions": 0, "health_check_failures": 0}
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self.size,
+                "idle": len(self._idle),
+                "busy": self._busy,
+            }
+
+    @contextmanager
+    def acquire(self, key=None, factory=None):
+        """Borrow a driver for key, discarding it if the caller raises"""
+        entry = self._checkout(key, factory or self.factory)
+        try:
+            yield entry
+        except BaseException:
+            entry.discard = True
+            raise
+        finally:
+            self._checkin(entry)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._quit(entry)
+
+    def _expired(self, entry):
+        return entry.age >= self.max_age or entry.uses >= self.max_uses
+
+    def _healthy(self, entry):
+        try:
+            entry.driver.execute_script("return document.readyState")
+            return True
+        except Exception as e:
+            logger.info(f"Pooled driver failed health check: {e}")
+            return False
+
+    def _take_idle(self, key):
+        """Pick an idle driver to use or evict; (None, False) means a cold start fits"""
+        for i in range(len(self._idle) - 1, -1, -1):
+            if self._idle[i].key == key:
+                return self._idle.pop(i), False
+        if self._busy + len(self._idle) < self.size:
+            return None, False
+        if self._idle:
+            # Pool is full of drivers for other keys: make room for this one
+            return self._idle.pop(0), True
+        return None, None
+
+    def _checkout(self, key, factory):
+        deadline = time.monotonic() + self.acquire_timeout
+
+        while True:
+            with self._cond:
+                entry, evict = self._take_idle(key)
+                while evict is None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a browser driver")
+                    self._cond.wait(remaining)
+                    entry, evict = self._take_idle(key)
+                self._busy += 1
+
+            if entry is None:
+                break
+
+            # Recycle stale drivers and drop dead ones, then look again
+            if evict:
+                with self._cond:
+                    self._stats["evictions"] += 1
+            elif self._expired(entry):
+                with self._cond:
+                    self._stats["recycles"] += 1
+            elif self._healthy(entry):
+                with self._cond:
+                    self._stats["hits"] += 1
+                entry.fresh = False
+                return entry
+            else:
+                with self._cond:
+                    self._stats["health_check_failures"] += 1
+
+            self._quit(entry)
+            with self._cond:
+                self._busy -= 1
+
+        try:
+            driver, meta = factory()
+            if not driver:
+                raise RuntimeError("Driver factory returned no driver")
+        except BaseException:
+            with self._cond:
+                self._busy -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats["cold_starts"] += 1
+        return PooledDriver(driver, meta, key)
+
+    def _checkin(self, entry):
+        entry.uses += 1
+        keep = not entry.discard and not self._expired(entry)
+
+        if not keep:
+            if not entry.discard:
+                with self._cond:
+                    self._stats["recycles"] += 1
+            self._quit(entry)
+
+        with self._cond:
+            self._busy -= 1
+            if keep:
+                self._idle.append(entry)
+            self._cond.notify()
+
+    def _quit(self, entry):
+        try:
+            entry.driver.quit()
+            logger.info("Chrome driver closed")
+        except Exception:
+            pass
+
+
+class FakeDriver:
+    """Minimal stand-in for a WebDriver so pool logic can run without Chrome.
+
+    ``elements`` maps a CSS selector / XPath to the elements the page has for
+    it, which is enough for explicit waits (WebDriverWait) to resolve or time out.
+    """
+
+    def __init__(self, healthy=True, elements=None):
+        self.healthy = healthy
+        self.elements = elements if elements is not None else {}
+        self.current_url = "about:blank"
+        self.title = ""
+        self.cookies = []
+        self.local_storage = {}
+        self.visited = []
+        self.quit_called = False
+
+    def get(self, url):
+        self.current_url = url
+        self.visited.append(url)
+
+    def refresh(self):
+        pass
+
+    def execute_script(self, script, *args):
+        if not self.healthy or self.quit_called:
+            raise RuntimeError("Fake driver is not responding")
+        if "localStorage.setItem" in script and args:
+            self.local_storage.update(args[0])
+        if "localStorage" in script and script.startswith("return"):
+            return dict(self.local_storage)
+        return "complete"
+
+    def get_cookies(self):
+        return list(self.cookies)
+
+    def add_cookie(self, cookie):
+        self.cookies.append(cookie)
+
+    def delete_all_cookies(self):
+        self.cookies = []
+
+    def find_elements(self, by=None, value=None):
+        return list(self.elements.get(value, []))
+
+    def find_element(self, by=None, value=None):
+        found = self.elements.get(value)
+        if not found:
+            from selenium.common.exceptions import NoSuchElementException
+            raise NoSuchElementException(f"No element matches {value}")
+        return found[0]
+
+    def quit(self):
+        self.quit_called = True
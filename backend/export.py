@@ -0,0 +1,211 @@
+import io
+import os
+import csv
+import json
+import zlib
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import DateTime, Integer, JSON
+from dotenv import load_dotenv
+from crud_async import trend_history
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet export is optional
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor (and encoded) per batch
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+# Raw snapshots and rollups of older history, told apart by `resolution`
+HISTORY_COLUMNS = list(trend_history().selected_columns)
+EXPORT_COLUMNS = [column.name for column in HISTORY_COLUMNS]
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+COMPRESSIONS = {
+    "gzip": ("application/gzip", "gz"),
+    "zstd": ("application/zstd", "zst"),
+}
+
+
+class ExportError(ValueError):
+    """Bad export options (unknown format, missing optional dependency)"""
+
+
+def check_options(fmt, compression=None):
+    if fmt not in FORMATS:
+        raise ExportError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+    if compression and compression not in COMPRESSIONS:
+        raise ExportError(f"Unsupported compression '{compression}', expected one of {', '.join(COMPRESSIONS)}")
+    if fmt == "parquet" and pyarrow is None:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow)")
+    if compression == "zstd" and zstandard is None and fmt != "parquet":
+        raise ExportError("zstd compression needs zstandard (pip install zstandard)")
+
+
+def media_type_and_filename(fmt, compression=None):
+    """Parquet compresses its own pages, every other format gets an outer gzip/zstd file"""
+    media_type, extension = FORMATS[fmt]
+    filename = f"trends.{extension}"
+    if compression and fmt != "parquet":
+        media_type, suffix = COMPRESSIONS[compression]
+        filename = f"{filename}.{suffix}"
+    return media_type, filename
+
+
+def to_utc_naive(value):
+    # The trends table stores naive UTC datetimes
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def export_query(since=None, until=None):
+    conditions = []
+    if since:
+        since = to_utc_naive(since)
+        conditions.append(lambda t: t.c.datetime >= since)
+    if until:
+        until = to_utc_naive(until)
+        conditions.append(lambda t: t.c.datetime < until)
+    history = trend_history(*conditions)
+    return history.order_by(history.selected_columns.datetime, history.selected_columns.id)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def encode_ndjson(rows):
+    return "".join(
+        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_json_default, separators=(",", ":")) + "\n"
+        for row in rows
+    ).encode()
+
+
+class CsvEncoder:
+    def __init__(self):
+        self.wrote_header = False
+
+    def __call__(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not self.wrote_header:
+            writer.writerow(EXPORT_COLUMNS)
+            self.wrote_header = True
+        for row in rows:
+            writer.writerow([
+                json.dumps(value) if isinstance(value, dict) else value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ])
+        return buffer.getvalue().encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _arrow_type(column):
+    if isinstance(column.type, DateTime):
+        return pyarrow.timestamp("us")
+    if isinstance(column.type, Integer):
+        return pyarrow.int64()
+    return pyarrow.string()
+
+
+class ParquetEncoder:
+    """One Parquet row group per batch, streamed as each group is written"""
+
+    def __init__(self, compression=None):
+        self.compression = compression or "snappy"
+        self.sink = _Sink()
+        # JSON columns (timings, diff) are stored as JSON text since their shape varies per row
+        self.schema = pyarrow.schema([(column.name, _arrow_type(column)) for column in HISTORY_COLUMNS])
+        self.json_columns = [i for i, column in enumerate(HISTORY_COLUMNS) if isinstance(column.type, JSON)]
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema, compression=self.compression)
+
+    def __call__(self, rows):
+        columns = [list(values) for values in zip(*rows)]
+        for i in self.json_columns:
+            columns[i] = [json.dumps(value) if value is not None else None for value in columns[i]]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+        return self.sink.drain()
+
+    def close(self):
+        self.writer.close()
+        return self.sink.drain()
+
+
+def _compressor(compression):
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    return None
+
+
+async def export_trends(session_factory, fmt="ndjson", compression=None, since=None, until=None,
+                        batch_size=EXPORT_BATCH_SIZE):
+    """Yield the encoded export chunk by chunk.
+
+    Rows come from a server-side cursor ``batch_size`` at a time and each batch
+    is encoded and (optionally) compressed before the next one is fetched, so
+    memory use does not grow with the table.
+    """
+    check_options(fmt, compression)
+    if fmt == "parquet":
+        encoder = ParquetEncoder(compression)
+    elif fmt == "csv":
+        encoder = CsvEncoder()
+    else:
+        encoder = encode_ndjson
+    compressor = None if fmt == "parquet" else _compressor(compression)
+
+    rows_written = 0
+    async with session_factory() as db:
+        result = await db.stream(export_query(since, until).execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            data = encoder(rows)
+            rows_written += len(rows)
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+    tail = encoder.close() if fmt == "parquet" else b""
+    if fmt == "csv" and not rows_written:
+        tail = encoder([])  # Header only
+    if compressor:
+        tail = compressor.compress(tail) + compressor.flush()
+    if tail:
+        yield tail
+    logger.info(f"Exported {rows_written} trends as {fmt}{f' ({compression})' if compression else ''}")
@@ -0,0 +1,266 @@
+import re
+import logging
+from html.parser import HTMLParser
+from canonical import topic_key
+
+logger = logging.getLogger(__name__)
+
+# Candidate selectors in priority order
+TREND_SELECTORS = [
+    # New X.com selectors
+    '[data-testid="trend"]',
+    '[data-testid="trendItem"]',
+    '.css-1dbjc4n[role="button"] span[dir="ltr"]',
+    'div[data-testid="cellInnerDiv"] span',
+
+    # Legacy selectors
+    '.trend-item span',
+    '.trending-topic',
+    'span.css-901oao.css-16my406',
+
+    # Generic text selectors
+    'span[dir="ltr"]',
+    'div[role="button"] span'
+]
+
+# Last-resort selector used when the ones above yield fewer than MIN_TRENDS
+FALLBACK_SELECTOR = 'span'
+
+MAX_TRENDS = 5
+MIN_TRENDS = 3
+MAX_TEXTS_PER_SELECTOR = 200
+MAX_FALLBACK_TEXTS = 2000
+
+UNWANTED_PHRASES = [
+    'sign up', 'log in', 'create account', 'new to x',
+    'don\'t miss', 'happening', 'first to know',
+    'terms of service', 'privacy policy', 'cookie',
+    'accessibility', 'ads info', 'Â© 20', 'corp',
+    'follow', 'tweet', 'retweet', 'like', 'reply',
+    'explore', 'notifications', 'messages', 'bookmarks',
+    'home', 'profile', 'more', 'trending', 'for you',
+    'what\'s happening', 'show more'
+]
+
+FALLBACK_UNWANTED_PHRASES = [
+    'sign', 'log', 'account', 'x', 'twitter', 'home',
+    'explore', 'notification', 'message', 'bookmark'
+]
+
+# One alternation per phrase list instead of a Python loop per element
+UNWANTED_RE = re.compile("|".join(re.escape(p) for p in UNWANTED_PHRASES))
+FALLBACK_UNWANTED_RE = re.compile("|".join(re.escape(p) for p in FALLBACK_UNWANTED_PHRASES))
+POST_COUNT_RE = re.compile(r"( posts| tweets)$|k post")
+
+# Collects the text of every candidate node for all selectors in a single WebDriver call
+COLLECT_SCRIPT = """
+const selectors = arguments[0];
+const limits = arguments[1];
+return selectors.map((selector, i) => {
+    const texts = [];
+    let nodes;
+    try { nodes = document.querySelectorAll(selector); } catch (e) { return texts; }
+    for (const node of nodes) {
+        if (texts.length >= limits[i]) break;
+        const text = (node.innerText || '').trim();
+        if (text) texts.push(text);
+    }
+    return texts;
+});
+"""
+
+
+def is_trend_text(text, seen):
+    """Main filter applied to text from TREND_SELECTORS"""
+    if not text or not 2 < len(text) < 100:
+        return False
+    lower = text.lower()
+    return (not UNWANTED_RE.search(lower) and
+            not text.startswith('http') and
+            not text.isdigit() and
+            not POST_COUNT_RE.search(lower) and
+            topic_key(text) not in seen)
+
+
+def is_fallback_trend_text(text, seen):
+    """Looser filter applied to arbitrary spans when the selectors came up short"""
+    if not text or not 3 <= len(text) <= 50:
+        return False
+    lower = text.lower()
+    return (not FALLBACK_UNWANTED_RE.search(lower) and
+            any(c.isalpha() for c in text) and  # Contains at least one letter
+            topic_key(text) not in seen)
+
+
+class TrendExtractor:
+    """Accumulates trends across pages from pre-collected candidate texts"""
+
+    def __init__(self, max_trends=MAX_TRENDS):
+        self.max_trends = max_trends
+        self.trends = []
+        self._seen = set()
+
+    @property
+    def full(self):
+        return len(self.trends) >= self.max_trends
+
+    def _add(self, text):
+        self.trends.append(text)
+        # "#WorldCup" and "World Cup" on the same page are one trend
+        self._seen.add(topic_key(text))
+        logger.info(f"Added trend: {text}")
+
+    def add_candidates(self, groups):
+        """Take texts selector by selector until enough trends are found"""
+        for texts in groups:
+            for text in texts:
+                if self.full:
+                    return
+                text = text.strip()
+                if is_trend_text(text, self._seen):
+                    self._add(text)
+
+    def add_fallback(self, texts):
+        for text in texts:
+            if self.full:
+                return
+            text = text.strip()
+            if is_fallback_trend_text(text, self._seen):
+                self._add(text)
+
+
+def collect_candidates(driver):
+    """Return (selector groups, fallback texts) for the current page in one round trip"""
+    selectors = TREND_SELECTORS + [FALLBACK_SELECTOR]
+    limits = [MAX_TEXTS_PER_SELECTOR] * len(TREND_SELECTORS) + [MAX_FALLBACK_TEXTS]
+    groups = driver.execute_script(COLLECT_SCRIPT, selectors, limits) or []
+    groups = [g or [] for g in groups] + [[]] * (len(selectors) - len(groups))
+    logger.info(f"Collected {sum(len(g) for g in groups)} candidate texts in one WebDriver call")
+    return groups[:-1], groups[-1]
+
+
+# -------------------- Offline extraction from saved HTML --------------------
+
+SIMPLE_SELECTOR_RE = re.compile(r'^(?P<tag>[a-z0-9]+)?(?P<rest>(?:\.[\w-]+|\[[\w-]+="[^"]*"\])*)$')
+SELECTOR_PART_RE = re.compile(r'\.([\w-]+)|\[([\w-]+)="([^"]*)"\]')
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+BLOCK_TAGS = {"div", "p", "li", "section", "article", "br", "h1", "h2", "h3", "h4", "h5", "h6"}
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "classes", "parent", "parts")
+
+    def __init__(self, tag, attrs, parent):
+        self.tag = tag
+        self.attrs = attrs
+        self.classes = set((attrs.get("class") or "").split())
+        self.parent = parent
+        self.parts = []
+
+    def text(self):
+        pieces = []
+        for part in self.parts:
+            pieces.append(part.text() if isinstance(part, _Node) else part)
+        joined = "".join(pieces)
+        return f"\n{joined}\n" if self.tag in BLOCK_TAGS else joined
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("#root", {}, None)
+        self.current = self.root
+        self.nodes = []
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, {k: v or "" for k, v in attrs}, self.current)
+        self.current.parts.append(node)
+        self.nodes.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_endtag(self, tag):
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        if self.current.tag not in ("script", "style"):
+            self.current.parts.append(data)
+
+
+def _compile_selector(selector):
+    """Compile the small CSS subset used in TREND_SELECTORS (tag, .class, [attr="v"], descendant)"""
+    compounds = []
+    for compound in selector.split():
+        match = SIMPLE_SELECTOR_RE.match(compound)
+        if not match:
+            raise ValueError(f"Unsupported selector: {selector}")
+        classes, attrs = set(), {}
+        for cls, attr, value in SELECTOR_PART_RE.findall(match.group("rest")):
+            if cls:
+                classes.add(cls)
+            else:
+                attrs[attr] = value
+        compounds.append((match.group("tag"), classes, attrs))
+    return compounds
+
+
+def _matches_compound(node, compound):
+    tag, classes, attrs = compound
+    return ((tag is None or node.tag == tag) and
+            classes <= node.classes and
+            all(node.attrs.get(k) == v for k, v in attrs.items()))
+
+
+def _matches(node, compounds):
+    if not _matches_compound(node, compounds[-1]):
+        return False
+    ancestor = node.parent
+    for compound in reversed(compounds[:-1]):
+        while ancestor is not None and not _matches_compound(ancestor, compound):
+            ancestor = ancestor.parent
+        if ancestor is None:
+            return False
+        ancestor = ancestor.parent
+    return True
+
+
+def _inner_text(node):
+    lines = (" ".join(line.split()) for line in node.text().split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def candidates_from_html(html):
+    """Same output as collect_candidates, computed from a page_source snapshot"""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+
+    selectors = TREND_SELECTORS + [FALLBACK_SELECTOR]
+    limits = [MAX_TEXTS_PER_SELECTOR] * len(TREND_SELECTORS) + [MAX_FALLBACK_TEXTS]
+    groups = []
+    for selector, limit in zip(selectors, limits):
+        compounds = _compile_selector(selector)
+        texts = []
+        for node in builder.nodes:
+            if len(texts) >= limit:
+                break
+            if _matches(node, compounds):
+                text = _inner_text(node)
+                if text:
+                    texts.append(text)
+        groups.append(texts)
+    return groups[:-1], groups[-1]
+
+
+def extract_from_html(html, max_trends=MAX_TRENDS):
+    """Run the full filter pipeline over a saved explore/trending page"""
+    extractor = TrendExtractor(max_trends)
+    groups, fallback = candidates_from_html(html)
+    extractor.add_candidates(groups)
+    if len(extractor.trends) < MIN_TRENDS:
+        extractor.add_fallback(fallback)
+    return extractor.trends
@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import atexit
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# JSON list of scrape targets: [{"account", "password" | "password_env", "email", "location", "proxy"}]
+SCRAPE_TARGETS_FILE = os.getenv("SCRAPE_TARGETS_FILE", "")
+# Worker processes (each owns one browser) scraping targets at the same time
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "4"))
+# Minimum seconds between two scrapes started with the same account
+ACCOUNT_MIN_INTERVAL_SECONDS = float(os.getenv("ACCOUNT_MIN_INTERVAL_SECONDS", "30"))
+
+
+class ScrapeTarget:
+    """One (account, location, proxy policy) combination to scrape"""
+
+    def __init__(self, account=None, password=None, email=None, location=None, proxy="pool"):
+        self.account = account
+        self.password = password
+        self.email = email
+        self.location = location
+        self.proxy = proxy or "pool"
+
+    @property
+    def key(self):
+        return f"{self.account}|{self.location}|{self.proxy}"
+
+    @classmethod
+    def from_dict(cls, data):
+        password = data.get("password")
+        if not password and data.get("password_env"):
+            # Keep secrets out of the targets file
+            password = os.getenv(data["password_env"])
+        return cls(
+            account=data.get("account"),
+            password=password,
+            email=data.get("email"),
+            location=data.get("location"),
+            proxy=data.get("proxy", "pool"),
+        )
+
+    def to_dict(self):
+        return {
+            "account": self.account,
+            "password": self.password,
+            "email": self.email,
+            "location": self.location,
+            "proxy": self.proxy,
+        }
+
+    def describe(self):
+        return {"account": self.account, "location": self.location, "proxy": self.proxy}
+
+
+def load_targets(path=SCRAPE_TARGETS_FILE):
+    if not path:
+        return []
+    try:
+        with open(path) as f:
+            return [ScrapeTarget.from_dict(item) for item in json.load(f)]
+    except Exception as e:
+        logger.error(f"Failed to load scrape targets from {path}: {e}")
+        return []
+
+
+def error_result(target, error):
+    """Placeholder row for a target whose worker crashed, shaped like the scraper's"""
+    return {
+        "trend1": f"Error: {str(error)[:100]}",
+        "trend2": "Scraping failed - check credentials",
+        "trend3": "Verify Twitter login details",
+        "trend4": "Check Chrome driver installation",
+        "trend5": "Review server logs for details",
+        "ip": "Unknown",
+        "account": target.account,
+        "location": target.location,
+        "error": str(error),
+    }
+
+
+# -------------------- Worker process side --------------------
+
+# One driver per worker process, shared by every target the process scrapes
+_driver_pool = None
+_scrapers = {}
+
+
+def _worker_driver_pool():
+    global _driver_pool
+    if _driver_pool is None:
+        from driver_pool import DriverPool
+
+        def no_default_factory():
+            raise RuntimeError("Fan-out drivers are launched by the target's scraper")
+
+        _driver_pool = DriverPool(no_default_factory, size=1)
+        atexit.register(_driver_pool.close)
+    return _driver_pool
+
+
+def scrape_target(target_data):
+    """Scrape one target inside a worker process, returns the scraped data dict"""
+    from scraper import TwitterTrendingScraper, scraper_instance
+
+    target = ScrapeTarget.from_dict(target_data)
+    scraper = _scrapers.get(target.key)
+    if scraper is None:
+        scraper = TwitterTrendingScraper(
+            username=target.account,
+            password=target.password,
+            email=target.email,
+            location=target.location,
+            proxy=target.proxy,
+            driver_pool=_worker_driver_pool(),
+            proxy_manager=scraper_instance.proxy_manager,
+        )
+        _scrapers[target.key] = scraper
+    return scraper.scrape()
+
+
+# -------------------- Coordinator side --------------------
+
+class FanoutScraper:
+    """Scrapes a list of targets in parallel on a process pool.
+
+    At most ``max_workers`` targets run at once, an account never has two
+    scrapes in flight, and consecutive starts with the same account are at
+    least ``min_interval`` seconds apart (also across runs). Worker processes
+    stay up between runs so their browsers and logins are reused.
+    ``worker_fn`` must be a module-level function taking a target dict.
+    """
+
+    def __init__(self, targets=None, worker_fn=scrape_target, max_workers=FANOUT_CONCURRENCY,
+                 min_interval=ACCOUNT_MIN_INTERVAL_SECONDS):
+        self.targets = list(targets) if targets is not None else load_targets()
+        self.worker_fn = worker_fn
+        self.max_workers = max_workers
+        self.min_interval = min_interval
+        self._executor = None
+        self._last_started = {}
+        self.runs = 0
+        self.last_run_seconds = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: never fork a process that holds DB connections and event loop threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def run(self, targets=None):
+        """Scrape every target, returns one data dict per target in target order"""
+        targets = list(targets or self.targets)
+        if not targets:
+            raise RuntimeError("No scrape targets configured")
+
+        started = time.perf_counter()
+        results = [None] * len(targets)
+        pending = list(range(len(targets)))
+        running = {}
+        busy_accounts = set()
+
+        while pending or running:
+            now = time.monotonic()
+            next_start = None
+
+            for index in list(pending):
+                if len(running) >= self.max_workers:
+                    break
+                target = targets[index]
+                if target.account in busy_accounts:
+                    continue
+                ready_in = self._last_started.get(target.account, float("-inf")) + self.min_interval - now
+                if ready_in > 0:
+                    next_start = ready_in if next_start is None else min(next_start, ready_in)
+                    continue
+
+                try:
+                    future = self._get_executor().submit(self.worker_fn, target.to_dict())
+                except BrokenProcessPool as e:
+                    self._reset_executor()
+                    results[index] = error_result(target, e)
+                    pending.remove(index)
+                    continue
+                running[future] = index
+                busy_accounts.add(target.account)
+                self._last_started[target.account] = now
+                pending.remove(index)
+                logger.info(f"Fan-out scrape started for {target.describe()}")
+
+            if running:
+                done, _ = wait(running, timeout=next_start, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    target = targets[index]
+                    busy_accounts.discard(target.account)
+                    try:
+                        results[index] = future.result() or error_result(target, "no data returned")
+                    except Exception as e:
+                        logger.error(f"Fan-out worker failed for {target.describe()}: {e}")
+                        if isinstance(e, BrokenProcessPool):
+                            self._reset_executor()
+                        results[index] = error_result(target, e)
+            elif pending:
+                time.sleep(next_start or 0)
+
+        self.runs += 1
+        self.last_run_seconds = round(time.perf_counter() - started, 3)
+        failed = sum(1 for data in results if data.get("error"))
+        logger.info(f"Fan-out run finished: {len(results)} targets, {failed} failed, {self.last_run_seconds}s")
+        return results
+
+    def _reset_executor(self):
+        # A worker died (e.g. Chrome took it down); start fresh processes on the next submit
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            "targets": [target.describe() for target in self.targets],
+            "workers": self.max_workers,
+            "account_min_interval_seconds": self.min_interval,
+            "runs": self.runs,
+            "last_run_seconds": self.last_run_seconds,
+        }
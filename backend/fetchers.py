@@ -0,0 +1,206 @@
+import os
+import logging
+import threading
+import requests
+from dotenv import load_dotenv
+from transport import transport
+from driver_pool import SessionStore
+from canonical import topic_key
+from extraction import MAX_TRENDS, MIN_TRENDS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "browser" drives Chrome for every scrape; "http" calls X's JSON endpoints with the
+# account's saved login and only starts the browser when that login stops working
+SCRAPE_BACKEND = os.getenv("SCRAPE_BACKEND", "browser").lower()
+
+X_BASE_URL = os.getenv("X_BASE_URL", "https://x.com").rstrip("/")
+# Explore "trending" tab as the web client loads it (a GraphQL ExplorePage URL works too)
+HTTP_TRENDS_URL = os.getenv("HTTP_TRENDS_URL", f"{X_BASE_URL}/i/api/2/guide.json")
+HTTP_TRENDS_PARAMS = {"include_page_configuration": "false", "initial_tab_id": "trending", "count": "20"}
+HTTP_FETCH_TIMEOUT = int(os.getenv("HTTP_FETCH_TIMEOUT", "10"))
+# Token of X's own web client; it is public (shipped in the site's JavaScript) and
+# only identifies the app, the account comes from the session cookies
+HTTP_BEARER_TOKEN = os.getenv(
+    "HTTP_BEARER_TOKEN",
+    "AAAAAAAAAAAAAAAAAAAAANRILgAAAAAAnNwIzUejRCOuH5E6I8xnZz4puTs%3D1Zv7ttfk8LF81IUq16cHjhLTvJu4FA33AGWWjCpTnA",
+)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# API error codes meaning the login itself was rejected (bad/expired token, csrf mismatch, locked)
+AUTH_ERROR_CODES = {32, 89, 215, 239, 326, 353}
+
+
+class FetchUnavailable(Exception):
+    """This backend cannot fetch trends right now; the next one should try"""
+
+
+class SessionInvalid(FetchUnavailable):
+    """No saved login for the account, or X no longer accepts it"""
+
+
+class TrendFetcher:
+    """One way of getting an account's current trends.
+
+    ``fetch(profile, info)`` returns the trend texts in page order, records its
+    phases in the TimingProfile and fills ``info`` (``ip``, ``network``) as it
+    goes, so a failed fetch still reports them. Raising FetchUnavailable hands
+    the scrape to the next fetcher.
+    """
+
+    name = None
+
+    def fetch(self, profile, info):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"name": self.name}
+
+
+def parse_trends(payload, max_trends=MAX_TRENDS):
+    """Trend names in page order from an explore response.
+
+    Handles the v2 guide.json shape (``{"trend": {"name": ...}}`` items) and the
+    GraphQL one (``{"__typename": "TimelineTrend", "name": ...}``) by walking the
+    whole document, so where the module sits in the timeline does not matter.
+    Promoted trends are ads and are skipped.
+    """
+    trends, seen = [], set()
+
+    def visit(node):
+        if len(trends) >= max_trends:
+            return
+        if isinstance(node, dict):
+            trend = node.get("trend")
+            if not isinstance(trend, dict):
+                trend = node if node.get("__typename") == "TimelineTrend" else None
+            if trend is not None and isinstance(trend.get("name"), str):
+                name = trend["name"].strip()
+                key = topic_key(name)
+                if key and key not in seen and "promotedMetadata" not in trend and "promoted_metadata" not in trend:
+                    seen.add(key)
+                    trends.append(name)
+                return
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+
+    visit(payload)
+    return trends
+
+
+class HttpTrendFetcher(TrendFetcher):
+    """Fetches trends over HTTP with the cookies of a logged-in browser session.
+
+    The browser path saves each account's cookies (SessionStore); this reuses
+    them, sending ``ct0`` back as the CSRF token like the web client does. One
+    ``requests.Session`` per account is kept between scrapes so its connections
+    stay open, and is rebuilt when the saved session changes. ``resolve_proxy``
+    returns ``(proxy, ip)`` for the scraper's proxy policy and ``report_proxy(proxy, ok)``
+    gets the outcome of each request; a failed one drops the session (and so its
+    proxy) and hands the scrape to the browser.
+    """
+
+    name = "http"
+
+    def __init__(self, account, resolve_proxy, session_store=None, url=HTTP_TRENDS_URL, timeout=HTTP_FETCH_TIMEOUT,
+                 report_proxy=None):
+        self.account = account
+        self.resolve_proxy = resolve_proxy
+        self.report_proxy = report_proxy or (lambda proxy, ok: None)
+        self.session_store = session_store or SessionStore()
+        self.url = url
+        self.timeout = timeout
+        self._session = None
+        self._saved_at = None
+        self._meta = {}
+        self._lock = threading.Lock()
+        self._stats = {"fetches": 0, "session_invalid": 0, "unavailable": 0}
+
+    def stats(self):
+        return {"name": self.name, "url": self.url, **self._stats}
+
+    def _session_for_state(self, state):
+        cookies = {c.get("name"): c.get("value") for c in state.get("cookies", [])}
+        if not cookies.get("auth_token") or not cookies.get("ct0"):
+            raise SessionInvalid(f"Saved session for {self.account} has no auth_token/ct0 cookie")
+
+        proxy, ip = self.resolve_proxy()
+        session = transport.create_session(proxy)
+        for cookie in state.get("cookies", []):
+            session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+        session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Authorization": f"Bearer {HTTP_BEARER_TOKEN}",
+            "X-Csrf-Token": cookies["ct0"],
+            "X-Twitter-Auth-Type": "OAuth2Session",
+            "X-Twitter-Active-User": "yes",
+            "Referer": f"{X_BASE_URL}/explore/tabs/trending",
+        })
+        return session, {"proxy": proxy, "ip": ip}
+
+    def _current_session(self):
+        state = self.session_store.load(self.account)
+        if state is None:
+            raise SessionInvalid(f"No saved session for {self.account}")
+        with self._lock:
+            # The browser path saves a new session after logging in again
+            if self._session is None or state.get("saved_at") != self._saved_at:
+                if self._session is not None:
+                    self._session.close()
+                self._session, self._meta = self._session_for_state(state)
+                self._saved_at = state.get("saved_at")
+                logger.info(f"Opened HTTP session for {self.account} (proxy: {self._meta['proxy']})")
+            return self._session, self._meta
+
+    def invalidate(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session, self._saved_at = None, None
+
+    def fetch(self, profile, info):
+        self._stats["fetches"] += 1
+        try:
+            with profile.phase("http_fetch"):
+                session, meta = self._current_session()
+                info["ip"] = meta["ip"]
+                try:
+                    response = session.get(self.url, params=HTTP_TRENDS_PARAMS, timeout=self.timeout)
+                    info["network"] = {"requests": 1, "blocked": 0, "failed": 0, "bytes": len(response.content)}
+
+                    if response.status_code in (401, 403):
+                        raise SessionInvalid(f"HTTP {response.status_code} for {self.account}")
+                    response.raise_for_status()
+                    payload = response.json()
+                except (requests.RequestException, ValueError) as e:
+                    # Dead proxy, timeout, 5xx or a body that is not JSON (e.g. a proxy's error
+                    # page): the next fetch opens a new session through another proxy
+                    self.invalidate()
+                    self.report_proxy(meta["proxy"], False)
+                    raise FetchUnavailable(f"HTTP fetch failed for {self.account}: {e}") from e
+                self.report_proxy(meta["proxy"], True)
+
+            errors = payload.get("errors") if isinstance(payload, dict) else None
+            if errors and any(e.get("code") in AUTH_ERROR_CODES for e in errors if isinstance(e, dict)):
+                raise SessionInvalid(f"Session rejected for {self.account}: {errors[0].get('message')}")
+
+            with profile.phase("http_parse"):
+                trends = parse_trends(payload)
+            if len(trends) < MIN_TRENDS:
+                # The endpoint moved or changed shape; the browser still reads the rendered page
+                raise FetchUnavailable(f"Only {len(trends)} trends in the {self.url} response")
+            return trends
+        except SessionInvalid:
+            self._stats["session_invalid"] += 1
+            self.invalidate()
+            raise
+        except FetchUnavailable:
+            self._stats["unavailable"] += 1
+            raise
+
@@ -0,0 +1,290 @@
+import os
+import csv
+import sys
+import codecs
+import json
+import time
+import uuid
+import logging
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+import crud
+from cache import trend_cache, trend_count
+from broadcast import broadcaster
+from changes import change_detector, stream_of
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Snapshots written per transaction
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+# Validation errors reported back per request (the rest are only counted)
+INGEST_MAX_ERRORS = int(os.getenv("INGEST_MAX_ERRORS", "100"))
+
+# Namespace for ids derived from idempotency keys; never change it or re-sent data will duplicate
+INGEST_NAMESPACE = uuid.UUID("5b7c2f64-3f0e-4a8e-9d55-0f3c1f1f7a21")
+
+FORMATS = ("ndjson", "csv")
+TEXT_FIELDS = ("ip", "account", "location")
+
+
+def detect_format(content_type=None, filename=None):
+    """Pick ndjson or csv from a Content-Type or file name (ndjson by default)"""
+    hint = (content_type or "").lower() + " " + (filename or "").lower()
+    if "csv" in hint:
+        return "csv"
+    return "ndjson"
+
+
+def parse_datetime(value):
+    """ISO 8601 string or epoch seconds -> naive UTC datetime (how the trends table stores it)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+    if not isinstance(value, str):
+        raise ValueError("datetime must be an ISO 8601 string or epoch seconds")
+    try:
+        return parse_datetime(float(value))
+    except ValueError:
+        pass
+    when = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def validate_snapshot(raw, line_no, request_key=None):
+    """Check one snapshot and turn it into a trends row, raises ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError("snapshot must be an object")
+
+    row = {}
+    for column in crud.TREND_COLUMNS:
+        value = raw.get(column)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{column} must be a string")
+        row[column] = value[:200] if value else None
+    if not row["trend1"]:
+        raise ValueError("trend1 is required")
+
+    for field in TEXT_FIELDS:
+        value = raw.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        row[field] = value or None
+
+    timings = raw.get("timings")
+    if isinstance(timings, str):
+        timings = json.loads(timings)
+    if timings is not None and not isinstance(timings, dict):
+        raise ValueError("timings must be an object")
+    row["timings"] = timings
+
+    has_datetime = raw.get("datetime") not in (None, "")
+    row["datetime"] = parse_datetime(raw["datetime"]) if has_datetime else datetime.utcnow()
+    row["id"] = snapshot_id(raw, row, line_no, request_key, has_datetime)
+    return row
+
+
+def snapshot_id(raw, row, line_no, request_key, has_datetime):
+    """Stable id so re-sending the same snapshot inserts nothing.
+
+    Priority: explicit id, per-snapshot idempotency_key, request Idempotency-Key
+    plus line number, then the snapshot content itself (needs a datetime).
+    """
+    if raw.get("id"):
+        return str(raw["id"])
+    if raw.get("idempotency_key"):
+        return str(uuid.uuid5(INGEST_NAMESPACE, str(raw["idempotency_key"])))
+    if request_key:
+        return str(uuid.uuid5(INGEST_NAMESPACE, f"{request_key}:{line_no}"))
+    if has_datetime:
+        content = "|".join(str(row[c] or "") for c in ("datetime", "account", "location", *crud.TREND_COLUMNS))
+        return str(uuid.uuid5(INGEST_NAMESPACE, content))
+    return str(uuid.uuid4())
+
+
+class BulkIngester:
+    """Validates snapshots record by record and writes them in chunked transactions.
+
+    ``ingest`` consumes an iterable of text lines (blocking: it writes to the
+    database, so async callers run it in a thread) and returns the summary.
+    A failed chunk rolls back on its own; chunks already committed stay, and
+    re-sending the whole input is safe.
+    """
+
+    def __init__(self, session_factory, fmt="ndjson", chunk_size=INGEST_CHUNK_SIZE,
+                 request_key=None, max_errors=INGEST_MAX_ERRORS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+        self.session_factory = session_factory
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+        self.request_key = request_key
+        self.max_errors = max_errors
+        self._rows = []
+        self._chunk_ids = set()
+        self._started = time.perf_counter()
+        self.received = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.errors = []
+
+    @property
+    def ready(self):
+        return len(self._rows) >= self.chunk_size
+
+    def ingest(self, lines):
+        """Load every snapshot from ``lines`` (line ends kept, as files yield them), returns the summary"""
+        records = self._csv_records(lines) if self.fmt == "csv" else self._ndjson_records(lines)
+        for line_no, raw in records:
+            self.add(line_no, raw)
+            if self.ready:
+                self.flush()
+                logger.info(f"Ingested {self.inserted} snapshots so far")
+        return self.finish()
+
+    def _ndjson_records(self, lines):
+        for line_no, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                self._reject(line_no, e)
+
+    def _csv_records(self, lines):
+        # One reader over the whole input, so quoted fields may contain newlines
+        reader = csv.reader(lines)
+        header = None
+        while True:
+            line_no = reader.line_num + 1
+            try:
+                values = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                self._reject(line_no, e)
+                continue
+            if not any(value.strip() for value in values):
+                continue
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            yield line_no, {name: (value if value != "" else None) for name, value in zip(header, values)}
+
+    def _reject(self, line_no, error):
+        self.received += 1
+        self.invalid += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line_no, "error": str(error)})
+
+    def add(self, line_no, raw):
+        """Validate one parsed snapshot and buffer it for the next flush"""
+        try:
+            row = validate_snapshot(raw, line_no, self.request_key)
+        except Exception as e:
+            self._reject(line_no, e)
+            return
+
+        self.received += 1
+        if row["id"] in self._chunk_ids:
+            self.duplicates += 1
+            return
+        self._chunk_ids.add(row["id"])
+        self._rows.append(row)
+
+    def flush(self):
+        """Write the buffered snapshots in one transaction"""
+        rows, self._rows, self._chunk_ids = self._rows, [], set()
+        if not rows:
+            return 0
+
+        db = self.session_factory()
+        try:
+            inserted = len(crud.insert_trends(db, rows))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        self.inserted += inserted
+        self.duplicates += len(rows) - inserted
+        if inserted:
+            trend_count.add(inserted)
+            trend_cache.invalidate("latest", "all", "analytics")
+            # A loaded snapshot may be newer than the one a stream's next scrape would be compared with
+            change_detector.forget(streams={stream_of(row) for row in rows})
+        return inserted
+
+    def finish(self):
+        self.flush()
+        summary = self.summary()
+        if self.inserted:
+            broadcaster.publish("trends_ingested", {"inserted": self.inserted})
+        logger.info(
+            f"Ingested {self.inserted} snapshots ({self.duplicates} duplicates, {self.invalid} invalid) "
+            f"in {summary['seconds']}s, {summary['rows_per_second']} rows/s"
+        )
+        return summary
+
+    def summary(self):
+        seconds = time.perf_counter() - self._started
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.received / seconds) if seconds > 0 else None,
+        }
+
+
+def decode_lines(chunks):
+    """Turn an iterable of UTF-8 byte chunks into text lines, line ends kept"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        # Only \n ends a line: csv.reader treats the end of every item as the end of a row
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def ingest_file(path, session_factory, fmt=None, chunk_size=INGEST_CHUNK_SIZE, request_key=None):
+    """Ingest a JSON Lines / CSV file ("-" for stdin), returns the summary"""
+    fmt = fmt or detect_format(filename=path)
+    ingester = BulkIngester(session_factory, fmt=fmt, chunk_size=chunk_size, request_key=request_key)
+    stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        return ingester.ingest(stream)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import engine, Base, SessionLocal
+    from migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Bulk load trend snapshots from JSON Lines or CSV")
+    parser.add_argument("path", help="file to load, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the file name, else ndjson)")
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE, help="snapshots per transaction")
+    parser.add_argument("--idempotency-key", help="key for inputs without ids/datetimes, reuse it when re-sending")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    result = ingest_file(args.path, SessionLocal, args.format, args.chunk_size, args.idempotency_key)
+    result["errors"] = result["errors"][:10]
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,181 @@
+import os
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from dotenv import load_dotenv
+import crud
+from broadcast import broadcaster
+from timing import add_phase_listener
+from metrics import observe_scrape
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Number of scrapes allowed to run at the same time (each one owns a Chrome instance)
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "1"))
+# Finished jobs kept in memory so clients can still read their result
+SCRAPE_JOB_HISTORY = int(os.getenv("SCRAPE_JOB_HISTORY", "100"))
+
+# The job running on the current worker thread, for progress events
+_current = threading.local()
+
+
+def _on_phase(name):
+    job = getattr(_current, "job", None)
+    if job:
+        job.phase = name
+        broadcaster.publish("job", job.to_dict())
+
+
+add_phase_listener(_on_phase)
+
+
+class ScrapeJob:
+    """State of a single queued scrape"""
+
+    def __init__(self, key):
+        self.id = str(uuid.uuid4())
+        self.key = key
+        self.state = "queued"
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.phase = None
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+
+    @property
+    def done(self):
+        return self.state in ("succeeded", "failed")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "phase": self.phase,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class ScrapeJobQueue:
+    """Runs scrapes on a bounded worker pool and saves their results.
+
+    ``scrape_fn`` returns the scraped data dict (or a list of them for a fan-out
+    run, saved in one bulk insert) and ``session_factory`` returns a new DB
+    session, so both can be swapped for fakes when exercising the API.
+    Submitting while a job with the same key is queued or running returns that
+    job instead of starting another one.
+    """
+
+    def __init__(self, scrape_fn, session_factory, max_workers=SCRAPE_CONCURRENCY, history=SCRAPE_JOB_HISTORY):
+        self.scrape_fn = scrape_fn
+        self.session_factory = session_factory
+        self.max_workers = max_workers
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape-worker")
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+
+    def submit(self, key="default", scrape_fn=None):
+        """Queue a scrape (scrape_fn overrides the default scraper), returns (job, created)"""
+        with self._lock:
+            existing = self._in_flight.get(key)
+            if existing:
+                return existing, False
+
+            job = ScrapeJob(key)
+            job.scrape_fn = scrape_fn or self.scrape_fn
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+            self._trim()
+
+        self._executor.submit(self._run, job)
+        broadcaster.publish("job", job.to_dict())
+        logger.info(f"Queued scrape job {job.id}")
+        return job, True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {
+            "workers": self.max_workers,
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            "succeeded": states.count("succeeded"),
+            "failed": states.count("failed"),
+        }
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _trim(self):
+        # Drop the oldest finished jobs once history is full, never in-flight ones
+        overflow = len(self._jobs) - self.history
+        for job_id in list(self._jobs):
+            if overflow <= 0:
+                break
+            if self._jobs[job_id].done:
+                del self._jobs[job_id]
+                overflow -= 1
+
+    def _run(self, job):
+        job.state = "running"
+        job.started_at = datetime.utcnow()
+        _current.job = job
+        broadcaster.publish("job", job.to_dict())
+        logger.info(f"Scrape job {job.id} started")
+
+        try:
+            scraped_data = job.scrape_fn()
+            if not scraped_data:
+                raise RuntimeError("Scraping failed, no data returned")
+            for data in scraped_data if isinstance(scraped_data, list) else [scraped_data]:
+                observe_scrape(data)
+
+            db = self.session_factory()
+            try:
+                if isinstance(scraped_data, list):
+                    job.result = crud.create_trends(db, scraped_data)
+                else:
+                    job.result = crud.create_trend(db, scraped_data).to_dict()
+            finally:
+                db.close()
+
+            # The scraper saves a placeholder row on failure; keep its reason on the job
+            if isinstance(scraped_data, list):
+                errors = [data["error"] for data in scraped_data if data.get("error")]
+                if len(errors) == len(scraped_data):
+                    job.error = f"All {len(errors)} targets failed: {errors[0]}"
+                elif errors:
+                    logger.warning(f"Scrape job {job.id}: {len(errors)} of {len(scraped_data)} targets failed")
+            else:
+                job.error = scraped_data.get("error")
+
+            job.state = "succeeded"
+            logger.info(f"Scrape job {job.id} succeeded")
+        except Exception as e:
+            job.error = str(e)
+            job.state = "failed"
+            logger.error(f"Scrape job {job.id} failed: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            _current.job = None
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+            broadcaster.publish("job", job.to_dict())
+            job.finished.set()
@@ -1,20 +1,89 @@
-from fastapi import FastAPI, HTTPException, Depends
+import os
+import asyncio
+import threading
+import anyio
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, ORJSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text  # ✅ Add this import
-from database import engine, Base, get_db
-import models, crud
-from scraper import scrape_trending_topics
+from database import engine, async_engine, Base, get_async_db, SessionLocal, AsyncSessionLocal
+import models, crud, crud_async
+from schemas import TrendResponse, TrendPage
+from migrations import run_migrations
+from jobs import ScrapeJobQueue
+from scheduler import ScrapeScheduler
+from retention import RetentionManager
+from cache import trend_cache
+from broadcast import broadcaster, sse_events
+from scraper import scrape_trending_topics, scraper_instance
+from fanout import FanoutScraper
+from canonical import canonicalizer
+from transport import transport
+import metrics
+import profiling
+from profiling import profiler
+from ingest import BulkIngester, detect_format, decode_lines, INGEST_CHUNK_SIZE
+from export import export_trends, check_options, media_type_and_filename, to_utc_naive, ExportError
+import search
 from datetime import datetime
 
 # ✅ Create tables
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+# ✅ Query timing for /metrics (both engines share the same statements)
+metrics.instrument_engine(engine, "sync")
+metrics.instrument_engine(async_engine.sync_engine, "async")
+
+# ✅ Background scrape queue (scrapes never run inside a request thread)
+# (PROFILE_SAMPLE_RATE of them are profiled, see profiling.py)
+job_queue = ScrapeJobQueue(scrape_fn=profiler.wrap(scrape_trending_topics, "scrape"), session_factory=SessionLocal)
+
+# ✅ Multi-account / multi-location fan-out (targets from SCRAPE_TARGETS_FILE)
+fanout_scraper = FanoutScraper()
+
+# ✅ Periodic scrapes (SCRAPE_INTERVAL_SECONDS > 0), one leader across replicas
+scheduler = ScrapeScheduler(job_queue, SessionLocal,
+                            scrape_fn=profiler.wrap(fanout_scraper.run, "fanout") if fanout_scraper.targets else None)
+
+# ✅ Raw → hourly → daily history tiers (RETENTION_INTERVAL_SECONDS > 0), one runner across replicas
+retention = RetentionManager(SessionLocal)
+
+# ✅ Scrapes running right now, read when /metrics is scraped
+metrics.SCRAPES_IN_PROGRESS.set_function(lambda: job_queue.stats()["running"])
+
+# Dependency so tests can swap in a queue with a fake scraper / database
+def get_job_queue():
+    return job_queue
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    broadcaster.bind(asyncio.get_running_loop())
+    # Build the topic canonicalization index now rather than on the first save
+    threading.Thread(target=canonicalizer.load, name="canonical-load", daemon=True).start()
+    scraper_instance.proxy_manager.pool.start()
+    scheduler.start()
+    retention.start()
+    yield
+    await retention.stop()
+    await scheduler.stop()
+    scraper_instance.proxy_manager.pool.stop()
+    await async_engine.dispose()
+    job_queue.shutdown()
+    fanout_scraper.close()
+    scraper_instance.driver_pool.close()
 
 # ✅ FastAPI App
 app = FastAPI(
     title="X Trending Topics API",
     description="API for scraping and retrieving trending topics from X (Twitter)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # ✅ CORS Middleware
@@ -26,10 +95,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ✅ Per-route latency and status for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# ✅ Opt-in profiles of single requests (X-Profile header, ?profile=1 or PROFILE_SAMPLE_RATE)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# Serve a cached entry, answering 304 when the client's validators still match
+def cached_response(request: Request, entry):
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified_header,
+        "Cache-Control": "no-cache"
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        not_modified = entry.etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    else:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+            not_modified = int(entry.last_modified) <= since
+        except (KeyError, TypeError, ValueError):
+            not_modified = False
+
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 # -------------------- ROUTES --------------------
 
 @app.get("/", tags=["Health Check"])
-def root():
+async def root():
     return {
         "message": "X Trending Topics API is running!",
         "version": "1.0.0",
@@ -37,67 +134,309 @@ def root():
         "timestamp": datetime.utcnow()
     }
 
-# 🔹 Scrape and Save
-@app.post("/scrape", tags=["Scraping"])
-def scrape_and_save(db: Session = Depends(get_db)):
-    try:
-        # Call real Selenium scraper
-        scraped_data = scrape_trending_topics()
+# 🔹 Queue a scrape (returns immediately, poll the job for the result)
+@app.post("/scrape", tags=["Scraping"], status_code=202)
+def scrape_and_save(request: Request, queue: ScrapeJobQueue = Depends(get_job_queue)):
+    # A profiled request profiles the scrape itself, which runs on a job worker
+    claimed = profiling.claim(request)
+    scrape_fn = profiler.wrap(queue.scrape_fn, "scrape", "POST /scrape", *claimed) if claimed else None
+    job, created = queue.submit(scrape_fn=scrape_fn)
+    return {
+        "status": "success",
+        "message": "Scrape job queued" if created else "Scrape already in progress",
+        "job_id": job.id,
+        "job": job.to_dict(),
+        "profile_id": claimed[1] if claimed and created else None
+    }
+
+# 🔹 Queue a fan-out scrape of every configured target (one bulk insert for the whole run)
+@app.post("/scrape/fanout", tags=["Scraping"], status_code=202)
+def scrape_fanout(request: Request, queue: ScrapeJobQueue = Depends(get_job_queue)):
+    if not fanout_scraper.targets:
+        raise HTTPException(status_code=400, detail="No scrape targets configured (set SCRAPE_TARGETS_FILE)")
+    claimed = profiling.claim(request)
+    job, created = queue.submit("fanout", profiler.wrap(fanout_scraper.run, "fanout", "POST /scrape/fanout", *claimed)
+                                if claimed else fanout_scraper.run)
+    return {
+        "status": "success",
+        "message": f"Fan-out job queued for {len(fanout_scraper.targets)} targets" if created else "Fan-out already in progress",
+        "job_id": job.id,
+        "job": job.to_dict(),
+        "profile_id": claimed[1] if claimed and created else None
+    }
+
+# 🔹 Get scrape job status / result
+@app.get("/scrape/jobs/{job_id}", tags=["Scraping"])
+def get_scrape_job(job_id: str, queue: ScrapeJobQueue = Depends(get_job_queue)):
+    job = queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Scrape job '{job_id}' not found")
+    return {"status": "success", "job": job.to_dict()}
+
+# 🔹 Scrape queue, browser pool and proxy pool stats
+@app.get("/scrape/stats", tags=["Scraping"])
+def get_scrape_stats(queue: ScrapeJobQueue = Depends(get_job_queue)):
+    return {
+        "status": "success",
+        "jobs": queue.stats(),
+        "drivers": scraper_instance.driver_pool.stats(),
+        "proxies": scraper_instance.proxy_manager.pool.stats(),
+        "resources": scraper_instance.resource_policy.describe(),
+        "fetchers": [fetcher.stats() for fetcher in scraper_instance.fetchers],
+        "transport": transport.stats(),
+        "fanout": fanout_scraper.stats(),
+        "canonical": canonicalizer.stats()
+    }
+
+# 🔹 Scheduler state (next run, last duration, failure streak)
+@app.get("/scrape/schedule", tags=["Scraping"])
+async def get_scrape_schedule():
+    return {"status": "success", "scheduler": scheduler.status()}
+
+# 🔹 Retention tiers and the last retention run
+@app.get("/retention", tags=["Trends"])
+async def get_retention_status():
+    return {"status": "success", "retention": retention.status()}
 
-        if not scraped_data:
-            raise HTTPException(status_code=500, detail="Scraping failed, no data returned")
+# 🔹 Get latest trend
+@app.get("/trends", tags=["Trends"], response_model=TrendResponse)
+async def get_latest_trends(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        trend = await crud_async.get_latest_trend(db)
+        return {"status": "success", "data": trend._asdict()} if trend else None
+
+    entry = await trend_cache.aget_or_load(("latest", None, None, None), load)
+    if not entry:
+        raise HTTPException(status_code=404, detail="No trends found")
+    return cached_response(request, entry)
 
-        # Save to DB
-        trend = crud.create_trend(db, scraped_data)
+# 🔹 Get all trends with pagination (offset, or keyset via ?cursor=next_cursor)
+@app.get("/trends/all", tags=["Trends"], response_model=TrendPage)
+async def get_all_trends(request: Request, limit: int = 10, offset: int = 0, cursor: str = None, db: AsyncSession = Depends(get_async_db)):
+    if cursor:
+        try:
+            crud.decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
+    async def load():
+        if cursor:
+            records = await crud_async.get_trends_after(db, limit, cursor)
+        else:
+            records = await crud_async.get_all_trends(db, limit, offset)
         return {
             "status": "success",
-            "message": "Trends scraped and saved successfully",
-            "data": trend.__dict__
+            "total": await crud_async.count_trends(db),
+            "next_cursor": crud.encode_cursor(records[-1]) if len(records) == limit and records else None,
+            "data": [record._asdict() for record in records]
         }
+
+    entry = await trend_cache.aget_or_load(("all", limit, offset, cursor), load)
+    return cached_response(request, entry)
+
+# 🔹 Bulk load snapshots from a JSON Lines or CSV body (chunked transactions, idempotent re-sends)
+@app.post("/trends/bulk", tags=["Trends"])
+async def bulk_ingest_trends(request: Request, fmt: str = Query(None, alias="format"), chunk_size: int = INGEST_CHUNK_SIZE):
+    try:
+        ingester = BulkIngester(
+            SessionLocal,
+            fmt=fmt or detect_format(request.headers.get("content-type")),
+            chunk_size=max(1, chunk_size),
+            request_key=request.headers.get("idempotency-key")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Parse the body as it arrives (in a worker thread that pulls it from the event loop);
+    # only one chunk of rows is held in memory
+    body = request.stream()
+
+    def body_chunks():
+        while True:
+            try:
+                yield anyio.from_thread.run(body.__anext__)
+            except StopAsyncIteration:
+                return
+
+    try:
+        summary = await run_in_threadpool(ingester.ingest, decode_lines(body_chunks()))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Bulk ingest failed after {ingester.inserted} snapshots (re-sending is safe): {e}")
+    return {"status": "success", **summary}
 
-# 🔹 Get latest trend
-@app.get("/trends", tags=["Trends"])
-def get_latest_trends(db: Session = Depends(get_db)):
-    trend = crud.get_latest_trend(db)
+# 🔹 Stream the whole history (or a time range) as NDJSON, CSV or Parquet, optionally gzip/zstd compressed
+@app.get("/trends/export", tags=["Trends"])
+async def export_trend_history(fmt: str = Query("ndjson", alias="format"), compression: str = None,
+                               since: datetime = None, until: datetime = None):
+    try:
+        check_options(fmt, compression)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    media_type, filename = media_type_and_filename(fmt, compression)
+    return StreamingResponse(
+        export_trends(AsyncSessionLocal, fmt, compression, since, until),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+# 🔹 Search past trends: prefix/substring and fuzzy (trigram) matches, optionally within a time range
+@app.get("/trends/search", tags=["Trends"])
+async def search_trends(q: str = Query(..., min_length=1, max_length=200), fuzzy: bool = True,
+                        since: datetime = None, until: datetime = None,
+                        topics: int = Query(20, ge=1, le=100), limit: int = Query(50, ge=1, le=500),
+                        db: AsyncSession = Depends(get_async_db)):
+    since, until = to_utc_naive(since), to_utc_naive(until)
+    matches = await search.search_topics(db, q, fuzzy, since, until, topics)
+    hits = await search.search_trend_entries(db, [m["topic_id"] for m in matches], since, until, limit)
+    return {"status": "success", "query": q, "topics": matches, "data": hits}
+
+# 🔹 Snapshot as it was at ?time= (optionally for one account/location)
+@app.get("/trends/at", tags=["Trends"])
+async def get_trend_at(when: datetime = Query(..., alias="time"), account: str = None, location: str = None,
+                       db: AsyncSession = Depends(get_async_db)):
+    trend, replaced_at = await crud_async.get_trend_at(db, to_utc_naive(when), account, location)
     if not trend:
-        raise HTTPException(status_code=404, detail="No trends found")
-    return {"status": "success", "data": trend.__dict__}
+        raise HTTPException(status_code=404, detail=f"No trends found at {when.isoformat()}")
+    return {"status": "success", "data": trend._asdict(), "valid_until": replaced_at}
 
-# 🔹 Get all trends with pagination
-@app.get("/trends/all", tags=["Trends"])
-def get_all_trends(limit: int = 10, offset: int = 0, db: Session = Depends(get_db)):
-    records = crud.get_all_trends(db, limit, offset)
-    return {
-        "status": "success",
-        "total": len(records),
-        "data": [record.__dict__ for record in records]
-    }
+# 🔹 Live stream of new trends and scrape job progress (Server-Sent Events)
+@app.get("/trends/stream", tags=["Trends"])
+async def stream_trends(request: Request):
+    subscriber = broadcaster.subscribe()
+
+    async def events():
+        try:
+            async for chunk in sse_events(request, subscriber):
+                yield chunk
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 🔹 Same stream over a WebSocket ({"event": ..., "data": ...} messages)
+@app.websocket("/trends/ws")
+async def trends_websocket(websocket: WebSocket):
+    await websocket.accept()
+    subscriber = broadcaster.subscribe()
+
+    async def push():
+        while True:
+            event, data = await subscriber.queue.get()
+            dropped = subscriber.take_dropped()
+            if dropped:
+                await websocket.send_text(f'{{"event":"lagged","data":{{"dropped":{dropped}}}}}')
+            await websocket.send_text(f'{{"event":"{event}","data":{data}}}')
+
+    async def wait_for_close():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    # Stop pushing as soon as the client goes away, even if no event is pending
+    tasks = [asyncio.create_task(push()), asyncio.create_task(wait_for_close())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        broadcaster.unsubscribe(subscriber)
 
 # 🔹 Get trend by ID
-@app.get("/trends/{trend_id}", tags=["Trends"])
-def get_trend_by_id(trend_id: str, db: Session = Depends(get_db)):
-    record = crud.get_trend_by_id(db, trend_id)
-    if not record:
+@app.get("/trends/{trend_id}", tags=["Trends"], response_model=TrendResponse)
+async def get_trend_by_id(trend_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        record = await crud_async.get_trend_by_id(db, trend_id)
+        return {"status": "success", "data": record._asdict()} if record else None
+
+    entry = await trend_cache.aget_or_load(("by_id", None, None, trend_id), load)
+    if not entry:
         raise HTTPException(status_code=404, detail=f"Trend with ID '{trend_id}' not found")
-    return {"status": "success", "data": record.__dict__}
+    return cached_response(request, entry)
 
 # 🔹 Delete trend by ID
 @app.delete("/trends/{trend_id}", tags=["Trends"])
-def delete_trend(trend_id: str, db: Session = Depends(get_db)):
-    deleted = crud.delete_trend(db, trend_id)
+async def delete_trend(trend_id: str, db: AsyncSession = Depends(get_async_db)):
+    deleted = await crud_async.delete_trend(db, trend_id)
     if not deleted:
         raise HTTPException(status_code=404, detail=f"Trend with ID '{trend_id}' not found")
     return {"status": "success", "message": f"Trend with ID '{trend_id}' deleted successfully"}
 
+# 🔹 Most frequent topics, all time or over the last ?hours=
+@app.get("/analytics/topics/top", tags=["Analytics"])
+async def get_top_topics(request: Request, hours: int = Query(None, ge=1, le=24 * 3660), limit: int = Query(10, ge=1, le=100),
+                         db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        return {"status": "success", "hours": hours, "data": await crud_async.get_top_topics(db, hours, limit)}
+
+    entry = await trend_cache.aget_or_load(("analytics", "top", hours, limit), load)
+    return cached_response(request, entry)
+
+# 🔹 First/last seen and rank summary of a topic (by topic id or text)
+@app.get("/analytics/topics/{topic}", tags=["Analytics"])
+async def get_topic_stats(topic: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        found = await crud_async.resolve_topic(db, topic)
+        stats = await crud_async.get_topic_stats(db, found.id) if found else None
+        return {"status": "success", "data": {"topic_id": found.id, "name": found.name, **stats}} if stats else None
+
+    entry = await trend_cache.aget_or_load(("analytics", "topic", None, topic), load)
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"Topic '{topic}' not found")
+    return cached_response(request, entry)
+
+# 🔹 Hourly rank history of a topic over the last ?hours= (default one week)
+@app.get("/analytics/topics/{topic}/ranks", tags=["Analytics"])
+async def get_topic_ranks(topic: str, request: Request, hours: int = Query(168, ge=1, le=24 * 3660),
+                          db: AsyncSession = Depends(get_async_db)):
+    async def load():
+        found = await crud_async.resolve_topic(db, topic)
+        if not found:
+            return None
+        series = await crud_async.get_topic_ranks(db, found.id, hours)
+        return {"status": "success", "topic_id": found.id, "name": found.name, "hours": hours, "data": series}
+
+    entry = await trend_cache.aget_or_load(("analytics", "ranks", hours, topic), load)
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"Topic '{topic}' not found")
+    return cached_response(request, entry)
+
+# 🔹 Response cache counters
+@app.get("/cache/stats", tags=["Health Check"])
+async def get_cache_stats():
+    return {"status": "success", "cache": trend_cache.stats(), "stream": broadcaster.stats()}
+
+# 🔹 Prometheus metrics: route latency, query time, scrape phases, proxy outcomes
+@app.get("/metrics", tags=["Health Check"])
+async def get_metrics():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+# 🔹 Recent profiles, newest first, with the profiler settings
+@app.get("/profiles", tags=["Health Check"])
+async def list_profiles():
+    profiles = await asyncio.to_thread(profiler.store.list)
+    return {"status": "success", "profiler": profiler.stats(), "count": len(profiles), "profiles": profiles}
+
+# 🔹 Download one profile (.collapsed for flamegraph.pl / speedscope, .prof for pstats / snakeviz)
+@app.get("/profiles/{profile_id}", tags=["Health Check"])
+async def download_profile(profile_id: str):
+    meta = profiler.store.get(profile_id)
+    if not meta or not os.path.exists(profiler.store.path(meta)):
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found")
+    return FileResponse(profiler.store.path(meta), media_type=meta["media_type"],
+                        filename=profile_id + meta["extension"])
+
 # 🔹 Health Check with DB - FIXED VERSION
 @app.get("/health", tags=["Health Check"])
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     try:
         # ✅ Use text() wrapper for raw SQL
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         db_status = "connected"
     except Exception as e:
         db_status = f"error: {str(e)}"
@@ -0,0 +1,313 @@
+import os
+import math
+import time
+import logging
+import threading
+from bisect import bisect_left
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Record request, query and scrape metrics (/metrics stays up but stops changing when off)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Histogram buckets, in seconds
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+SCRAPE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# Statement verbs kept as the "operation" label; anything else is "OTHER"
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "CREATE", "DROP", "ALTER", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK"}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = []
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """A metric family: one child per combination of label values.
+
+    Children are created on first use and never removed, so labels must come
+    from small fixed sets (route templates, statement verbs, phase names).
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as e:
+                logger.debug(f"Metric {name} callback failed: {e}")
+                return []
+        return [f"{name}{_label_text(labelnames, values)} {_format_value(value)}"]
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)  # First bucket with value <= upper bound
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{name}_bucket{_label_text(labelnames, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_label_text(labelnames, values)} {_format_value(total)}")
+        lines.append(f"{name}_count{_label_text(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function, *values):
+        """Read the value from ``function()`` at export time instead of tracking it"""
+        self.labels(*values).function = function
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.buckets = tuple(float(b) for b in sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -------------------- Metrics --------------------
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route template", ("method", "route"), REQUEST_BUCKETS)
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served")
+
+DB_QUERIES = Histogram("db_query_duration_seconds", "Database statement execution time", ("engine", "operation"), QUERY_BUCKETS)
+DB_ERRORS = Counter("db_query_errors_total", "Database statements that raised", ("engine", "operation"))
+
+SCRAPES = Counter("scrapes_total", "Finished scrapes by fetch backend and result", ("backend", "result"))
+SCRAPE_DURATION = Histogram("scrape_duration_seconds", "Wall time of a whole scrape", ("backend",), SCRAPE_BUCKETS)
+SCRAPE_PHASES = Histogram("scrape_phase_duration_seconds", "Time spent in each scrape phase", ("phase",), SCRAPE_BUCKETS)
+SCRAPE_BYTES = Counter("scrape_network_bytes_total", "Bytes transferred by scrapes")
+SCRAPE_BLOCKED = Counter("scrape_blocked_requests_total", "Requests blocked by the resource policy")
+SCRAPES_IN_PROGRESS = Gauge("scrapes_in_progress", "Scrape jobs running now")
+
+PROXY_CHECKS = Counter("proxy_checks_total", "Proxy outcomes from validation rounds and real scrapes", ("source", "result"))
+
+
+# -------------------- Instrumentation --------------------
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and status per route template.
+
+    The route template (``/trends/{trend_id}``) is read from the scope after
+    routing, so ids never become labels; unmatched paths share one label.
+    Written as plain ASGI rather than BaseHTTPMiddleware, which adds a task
+    and a stream per request. ``excluded`` routes (long-lived streams and the
+    metrics endpoint itself) are not timed.
+    """
+
+    def __init__(self, app, excluded=("/metrics", "/trends/stream")):
+        self.app = app
+        self.excluded = set(excluded)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            if route not in self.excluded:
+                method = scope["method"]
+                HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+                HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
+
+def _operation(statement):
+    verb = statement.lstrip()[:8].split(None, 1)
+    verb = verb[0].upper() if verb else ""
+    return verb if verb in SQL_OPERATIONS else "OTHER"
+
+
+# Histogram child per statement text, so a repeated statement costs one dict lookup
+_STATEMENT_CACHE_SIZE = 2000
+
+
+def instrument_engine(engine, name):
+    """Time every statement run on a (sync) engine; pass ``async_engine.sync_engine`` for async ones"""
+    from sqlalchemy import event
+
+    children = {}
+
+    def child_for(statement):
+        child = children.get(statement)
+        if child is None:
+            child = DB_QUERIES.labels(name, _operation(statement))
+            if len(children) < _STATEMENT_CACHE_SIZE:
+                children[statement] = child
+        return child
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        child_for(statement).observe(time.perf_counter() - context._metrics_started)
+
+    def error(context):
+        DB_ERRORS.labels(name, _operation(context.statement or "")).inc()
+
+    if METRICS_ENABLED:
+        event.listen(engine, "before_cursor_execute", before)
+        event.listen(engine, "after_cursor_execute", after)
+        event.listen(engine, "handle_error", error)
+
+
+def observe_scrape(data):
+    """Count a finished scrape (one data dict) and its phase timings"""
+    if not METRICS_ENABLED or not isinstance(data, dict):
+        return
+    timings = data.get("timings") or {}
+    backend = timings.get("backend") or "browser"
+    SCRAPES.labels(backend, "failed" if data.get("error") else "succeeded").inc()
+    if timings.get("total_seconds") is not None:
+        SCRAPE_DURATION.labels(backend).observe(timings["total_seconds"])
+    for phase, seconds in (timings.get("phases") or {}).items():
+        SCRAPE_PHASES.labels(phase).observe(seconds)
+    network = timings.get("network") or {}
+    if network:
+        SCRAPE_BYTES.inc(network.get("bytes") or 0)
+        SCRAPE_BLOCKED.inc(network.get("blocked") or 0)
+
+
+def observe_proxy(source, ok):
+    if METRICS_ENABLED:
+        PROXY_CHECKS.labels(source, "ok" if ok else "failed").inc()
@@ -0,0 +1,257 @@
+from sqlalchemy import inspect, text, select, exists, tuple_, delete, func
+from sqlalchemy.orm import Session, sessionmaker
+import logging
+from datetime import datetime, timedelta
+from models import Trend, Topic, TrendEntry, TopicStats, TopicHourly
+import crud
+from changes import is_error_row
+from search import create_search_index
+from retention import is_partitioned, create_partitions, bucket_start, RETENTION_PARTITIONS_AHEAD
+from scheduler import acquire_lease, release_lease, lease_holder
+
+logger = logging.getLogger(__name__)
+
+# Columns added to existing tables after their first release: (table, column, DDL type)
+ADDED_COLUMNS = [
+    ("trends", "timings", "JSON"),
+    ("trends", "account", "VARCHAR"),
+    ("trends", "location", "VARCHAR"),
+    ("trends", "last_seen_at", "TIMESTAMP"),
+    ("trends", "seen_count", "INTEGER"),
+    ("trends", "diff", "JSON"),
+]
+
+# Indexes added to tables that may already exist
+ADDED_INDEXES = [index for table in (Trend.__table__, TrendEntry.__table__) for index in table.indexes]
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Only one replica backfills at a time; the lease is renewed after every batch
+MIGRATION_LEASE_NAME = "migrations"
+MIGRATION_LEASE_SECONDS = 300
+
+
+def run_migrations(engine):
+    """Apply schema changes that create_all() can't make to existing tables"""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    with Session(engine) as db:
+        partitioned = is_partitioned(db)
+
+    removed_duplicates = 0
+    with engine.begin() as conn:
+        for table, column, ddl_type in ADDED_COLUMNS:
+            if table not in tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                logger.info(f"Adding column {table}.{column}")
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+        existing_indexes = {i["name"] for table in ("trends", "trend_entries") if table in tables
+                            for i in inspector.get_indexes(table)}
+        for index in ADDED_INDEXES:
+            if index.name in existing_indexes:
+                continue
+            if index.unique and index.table.name == "trend_entries":
+                removed_duplicates += remove_duplicate_entries(conn)
+            create_index(conn, index, partitioned)
+
+    create_search_index(engine)
+
+    with Session(engine) as db:
+        if is_partitioned(db):
+            # New rows must find their day's partition even when the retention task is off
+            today = bucket_start(datetime.utcnow(), "day")
+            create_partitions(db, today, today + timedelta(days=RETENTION_PARTITIONS_AHEAD))
+            db.commit()
+
+    # Aggregates start empty on databases that already have topic history,
+    # and counted the duplicate entries that were just removed
+    with Session(engine) as db:
+        needs_aggregates = db.execute(select(exists().select_from(TrendEntry))).scalar() and (
+            removed_duplicates or not db.execute(select(exists().select_from(TopicStats))).scalar()
+        )
+    needs_backfill = needs_aggregates or has_unsplit_snapshots(engine)
+    if not needs_backfill:
+        return
+
+    session_factory = sessionmaker(bind=engine)
+    holder = lease_holder()
+    if not acquire_lease(session_factory, MIGRATION_LEASE_NAME, holder, MIGRATION_LEASE_SECONDS):
+        logger.info("Another process is backfilling topic history, skipping")
+        return
+    try:
+        if needs_aggregates:
+            rebuild_topic_aggregates(engine)
+        backfill_trend_entries(engine, renew=lambda: acquire_lease(
+            session_factory, MIGRATION_LEASE_NAME, holder, MIGRATION_LEASE_SECONDS
+        ))
+    finally:
+        release_lease(session_factory, MIGRATION_LEASE_NAME, holder)
+
+
+def create_index(conn, index, partitioned=False):
+    if index.unique and partitioned:
+        # Unique indexes on a partitioned table must include the partition key
+        columns = ", ".join([c.name for c in index.columns] + ["datetime"])
+        conn.execute(text(f"CREATE UNIQUE INDEX {index.name} ON {index.table.name} ({columns})"))
+    else:
+        index.create(conn, checkfirst=True)
+
+
+def remove_duplicate_entries(conn):
+    """Drop trend_entries repeating a (trend_id, rank), left by overlapping backfills"""
+    keep = select(func.min(TrendEntry.id)).group_by(TrendEntry.trend_id, TrendEntry.rank)
+    removed = conn.execute(delete(TrendEntry).where(TrendEntry.id.not_in(keep))).rowcount
+    if removed:
+        logger.warning(f"Removed {removed} duplicate trend entries")
+    return removed
+
+
+def _unsplit_snapshots():
+    has_entries = exists().where(TrendEntry.trend_id == Trend.id)
+    return (
+        select(Trend.id, Trend.datetime, *[getattr(Trend, c) for c in crud.TREND_COLUMNS])
+        .where(~has_entries)
+        .where(Trend.datetime.isnot(None))
+        .where(~is_error_row())
+    )
+
+
+def has_unsplit_snapshots(engine):
+    with Session(engine) as db:
+        return db.execute(select(exists(_unsplit_snapshots()))).scalar()
+
+
+def backfill_trend_entries(engine, batch_size=BACKFILL_BATCH_SIZE, renew=None):
+    """Split legacy trend1..trend5 rows into topics/trend_entries, one batch per transaction.
+
+    Entries that already exist are skipped, so an interrupted or concurrent
+    run never doubles them up. ``renew`` is called before each batch; the
+    backfill stops when it returns False (the migration lease was lost).
+    """
+    query = _unsplit_snapshots().order_by(Trend.datetime, Trend.id)
+
+    total = 0
+    last_key = None
+    while True:
+        if renew and not renew():
+            logger.warning(f"Lost the migration lease, stopping the backfill after {total} snapshots")
+            break
+        with Session(engine) as db:
+            batch_query = query
+            if last_key:
+                batch_query = batch_query.where(tuple_(Trend.datetime, Trend.id) > tuple_(*last_key))
+            rows = db.execute(batch_query.limit(batch_size)).all()
+            if not rows:
+                break
+
+            entries, topics = [], {}
+            for row in rows:
+                row_entries, row_topics = crud.build_entries(row.id, list(row[2:]), row.datetime)
+                entries.extend(row_entries)
+                topics.update((t["id"], t) for t in row_topics)
+
+            crud.insert_ignore(db, Topic.__table__, list(topics.values()))
+            inserted = crud.insert_ignore(db, TrendEntry.__table__, entries, returning=TrendEntry.trend_id)
+            # Only count snapshots this run split; another process may have beaten us to some
+            crud.update_topic_aggregates(db, [e for e in entries if e["trend_id"] in inserted])
+            db.commit()
+
+            total += len(rows)
+            last_key = (rows[-1].datetime, rows[-1].id)
+            logger.info(f"Backfilled trend entries for {total} snapshots")
+
+    return total
+
+
+def rebuild_topic_aggregates(engine, batch_size=BACKFILL_BATCH_SIZE):
+    """Recompute topic_stats / topic_hourly from trend_entries in one transaction.
+
+    Entries are read in batches, but the old aggregates are only replaced on
+    commit, so readers never see them empty or half rebuilt. Inserts keep the
+    aggregates current and deletes subtract their entries; a rebuild is
+    only needed after deleting a snapshot that was seen again in later hours
+    (those repeats stay in the hourly buckets) or to repair them. Unchanged scrapes folded
+    into a row (seen_count) are counted again, but in the hour the row was
+    first stored: hourly buckets of long-unchanged snapshots come out front-loaded.
+    """
+    columns = (
+        TrendEntry.id, TrendEntry.topic_id, TrendEntry.rank, TrendEntry.datetime,
+        func.coalesce(Trend.seen_count, 1).label("count"), Trend.last_seen_at.label("last_seen")
+    )
+    total = 0
+    last_id = 0
+    with Session(engine) as db:
+        db.execute(delete(TopicHourly))
+        db.execute(delete(TopicStats))
+        while True:
+            rows = db.execute(
+                select(*columns).join(Trend, Trend.id == TrendEntry.trend_id)
+                .where(TrendEntry.id > last_id).order_by(TrendEntry.id).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            crud.update_topic_aggregates(db, [row._asdict() for row in rows])
+
+            total += len(rows)
+            last_id = rows[-1].id
+            logger.info(f"Rebuilt topic aggregates from {total} trend entries")
+        db.commit()
+
+    crud.trend_cache.invalidate("analytics")
+    return total
+
+
+def partition_trends(engine):
+    """Turn trends / trend_entries into daily range partitions on datetime (PostgreSQL).
+
+    Run once, with the API stopped: the tables are copied into their
+    partitioned replacements in one transaction. Partitioned tables cannot keep
+    a primary key on id alone, so both get a unique (id, datetime) index, and
+    trend_entries loses its foreign key (deletes go through the ORM cascade).
+    Rows without a datetime land in the default partition.
+    """
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("Partitioning needs PostgreSQL")
+    with Session(engine) as db:
+        if is_partitioned(db):
+            logger.info("trends is already partitioned")
+            return
+        first = db.execute(select(func.min(Trend.datetime))).scalar() or datetime.utcnow()
+
+        for table in ("trend_entries", "trends"):
+            db.execute(text(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned"))
+            db.execute(text(
+                f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (datetime)"
+            ))
+            db.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+        today = bucket_start(datetime.utcnow(), "day")
+        create_partitions(db, bucket_start(first, "day"), today + timedelta(days=RETENTION_PARTITIONS_AHEAD))
+
+        for table in ("trends", "trend_entries"):
+            db.execute(text(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned"))
+        # The id sequence belongs to the old column and would be dropped with it
+        db.execute(text("ALTER SEQUENCE trend_entries_id_seq OWNED BY NONE"))
+        db.execute(text("DROP TABLE trend_entries_unpartitioned, trends_unpartitioned"))
+        db.execute(text("ALTER SEQUENCE trend_entries_id_seq OWNED BY trend_entries.id"))
+
+        for table in ("trends", "trend_entries"):
+            db.execute(text(f"CREATE UNIQUE INDEX {table}_id_datetime_key ON {table} (id, datetime)"))
+        for index in ADDED_INDEXES:
+            create_index(db.connection(), index, partitioned=True)
+        db.commit()
+    logger.info(f"Partitioned trends and trend_entries by day since {first:%Y-%m-%d}")
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine, Base
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    if "--partition-trends" in sys.argv:
+        partition_trends(engine)
+    run_migrations(engine)
+    if "--rebuild-aggregates" in sys.argv:
+        rebuild_topic_aggregates(engine)
@@ -1,7 +1,15 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, JSON, Integer, ForeignKey, Index
+from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
 
+# Columns holding the ranked topics of a snapshot
+TREND_COLUMNS = ["trend1", "trend2", "trend3", "trend4", "trend5"]
+# Placeholder text stored when a rank could not be scraped
+EMPTY_TREND = "No trend available"
+
+# One row per scrape run; trend1..trend5 keep the API's snapshot shape,
+# the normalized per-topic rows live in trend_entries
 class Trend(Base):
     __tablename__ = "trends"
 
@@ -13,3 +21,111 @@ class Trend(Base):
     trend5 = Column(String, nullable=True)
     datetime = Column(DateTime, default=datetime.utcnow)
     ip = Column(String, nullable=True)
+    account = Column(String, nullable=True)  # Scraping account, set by fan-out runs
+    location = Column(String, nullable=True)  # Region the target was scraped for
+    timings = Column(JSON, nullable=True)  # Per-phase scrape durations (see timing.TimingProfile)
+    last_seen_at = Column(DateTime, nullable=True)  # Last scrape that returned this same snapshot (heartbeat)
+    seen_count = Column(Integer, nullable=True, default=1)  # Scrapes folded into this row
+    diff = Column(JSON, nullable=True)  # Changes from the previous snapshot of the same account/location
+
+    entries = relationship("TrendEntry", back_populates="trend", cascade="all, delete-orphan", order_by="TrendEntry.rank")
+
+    __table_args__ = (
+        Index("ix_trends_datetime_desc", datetime.desc(), id.desc()),
+        Index("ix_trends_location_datetime", location, datetime.desc()),
+    )
+
+    def to_dict(self):
+        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
+
+# Downsampled history: one row per (account, location) and hour or day, written by
+# retention.py once raw snapshots age out. trend1..trend5 are the bucket's dominant snapshot.
+class TrendRollup(Base):
+    __tablename__ = "trend_rollups"
+
+    id = Column(String, primary_key=True)  # Derived from resolution, account, location and bucket
+    resolution = Column(String, nullable=False)  # "hour" or "day"
+    trend1 = Column(String, nullable=True)
+    trend2 = Column(String, nullable=True)
+    trend3 = Column(String, nullable=True)
+    trend4 = Column(String, nullable=True)
+    trend5 = Column(String, nullable=True)
+    datetime = Column(DateTime, nullable=False)  # Start of the bucket
+    account = Column(String, nullable=True)
+    location = Column(String, nullable=True)
+    last_seen_at = Column(DateTime, nullable=False)  # Last scrape folded in
+    seen_count = Column(Integer, nullable=False)  # Scrapes folded in
+    snapshots = Column(Integer, nullable=False)  # Stored snapshots (trends rows) folded in
+
+    __table_args__ = (
+        Index("ix_trend_rollups_resolution_datetime", resolution, datetime),
+        Index("ix_trend_rollups_datetime_desc", datetime.desc(), id.desc()),
+        Index("ix_trend_rollups_location_datetime", location, datetime.desc()),
+    )
+
+# Lease that lets only one backend replica run the scrape scheduler (or the retention task)
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+# A distinct topic, identified by a hash of its normalized text
+class Topic(Base):
+    __tablename__ = "topics"
+
+    id = Column(String(16), primary_key=True)
+    name = Column(String, nullable=False)  # Display text the first time it was seen
+    normalized = Column(String, nullable=False, unique=True)
+    first_seen = Column(DateTime, default=datetime.utcnow)
+
+# One ranked topic within a scrape run
+class TrendEntry(Base):
+    __tablename__ = "trend_entries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    trend_id = Column(String, ForeignKey("trends.id", ondelete="CASCADE"), nullable=False)
+    rank = Column(Integer, nullable=False)
+    text = Column(String, nullable=False)
+    normalized = Column(String, nullable=False)
+    topic_id = Column(String(16), ForeignKey("topics.id"), nullable=False)
+    datetime = Column(DateTime, nullable=False)  # Copy of the run time so topic history needs no join
+
+    trend = relationship("Trend", back_populates="entries")
+
+    __table_args__ = (
+        Index("ix_trend_entries_trend_id", "trend_id"),
+        Index("ux_trend_entries_trend_rank", "trend_id", "rank", unique=True),  # One entry per rank, backfills can't double up
+        Index("ix_trend_entries_topic_datetime", "topic_id", datetime.desc()),
+        Index("ix_trend_entries_normalized", "normalized"),
+    )
+
+# Running per-topic totals, updated with every insert (see crud.update_topic_aggregates)
+class TopicStats(Base):
+    __tablename__ = "topic_stats"
+
+    topic_id = Column(String(16), ForeignKey("topics.id"), primary_key=True)
+    appearances = Column(Integer, nullable=False)  # Snapshots the topic was ranked in
+    rank_sum = Column(Integer, nullable=False)  # For the average rank
+    best_rank = Column(Integer, nullable=False)
+    first_seen = Column(DateTime, nullable=False)
+    last_seen = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_topic_stats_appearances", appearances.desc()),
+    )
+
+# The same totals per topic and hour, so windowed queries read buckets instead of snapshots
+class TopicHourly(Base):
+    __tablename__ = "topic_hourly"
+
+    topic_id = Column(String(16), ForeignKey("topics.id"), primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    appearances = Column(Integer, nullable=False)
+    rank_sum = Column(Integer, nullable=False)
+    best_rank = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_topic_hourly_hour", "hour"),
+    )
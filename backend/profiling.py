@@ -0,0 +1,400 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import cProfile
+import logging
+import marshal
+import threading
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Master switch: when off, X-Profile / ?profile= are ignored and nothing is sampled
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# Fraction of requests and scrapes profiled without being asked (1 = everything)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# "sampling" (wall-clock stacks, flamegraph-ready) or "cprofile" (deterministic, pstats)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampling").lower()
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+# Ring of recent profiles on disk; the oldest are deleted past PROFILE_KEEP
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+# Profiles running at once; requests past the limit are served unprofiled
+PROFILE_MAX_ACTIVE = int(os.getenv("PROFILE_MAX_ACTIVE", "2"))
+# When set, asking for a profile also needs an X-Profile-Token header with this value
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+MODES = ("sampling", "cprofile")
+FORMATS = {
+    "sampling": ("collapsed", ".collapsed", "text/plain; charset=utf-8"),
+    "cprofile": ("pstats", ".prof", "application/octet-stream"),
+}
+PROFILE_ID = re.compile(r"^\d{8}T\d{12}-[a-z]+-[0-9a-f]{8}$")
+
+# Frames a pool thread sits in while it has nothing to do
+_IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+
+def _frame_name(code):
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of some threads every ``interval`` seconds.
+
+    Runs in its own thread and reads ``sys._current_frames()``, so the profiled
+    code is not slowed down beyond the GIL switches, and time spent waiting
+    (I/O, locks, sleeps) shows up like any other frame. Output is the collapsed
+    format of flamegraph.pl / speedscope / inferno: one ``root;caller;callee count``
+    line per distinct stack, rooted at the thread name. ``threads(ident, name)``
+    picks the threads to sample; samples of other threads idling in a pool are
+    dropped.
+    """
+
+    def __init__(self, threads, interval=PROFILE_INTERVAL_MS / 1000):
+        self.threads = threads
+        self.interval = interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if ident == own or not self.threads(ident, name):
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def output(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common()).encode()
+
+
+class DeterministicProfiler:
+    """cProfile on the calling thread; output is what ``pstats.Stats`` / snakeviz load.
+
+    It only sees the thread that started it. On the event loop thread that
+    includes other requests' coroutines running during the profiled one's awaits.
+    """
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self.samples = None
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def output(self):
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)  # Same bytes as Profile.dump_stats()
+
+
+class ProfileStore:
+    """The last ``keep`` profiles in a directory, each a data file plus a JSON sidecar.
+
+    Ids start with a UTC timestamp so sorting file names sorts by age; pruning
+    globs the directory, so API replicas can share it.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, meta, data):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, meta["id"])
+        with open(base + meta["extension"], "wb") as f:
+            f.write(data)
+        # The sidecar is what makes a profile listed, so it goes last and atomically
+        with open(base + ".json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(base + ".json.tmp", base + ".json")
+        self.prune()
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".json") and PROFILE_ID.match(name[:-5]))
+
+    def prune(self):
+        ids = self._ids()
+        for profile_id in ids[:max(len(ids) - self.keep, 0)]:
+            for extension in (".json",) + tuple(ext for _, ext, _ in FORMATS.values()):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, profile_id):
+        """Metadata of a stored profile, or None (ids are validated, never used as paths directly)"""
+        if not PROFILE_ID.match(profile_id or ""):
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id + ".json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def path(self, meta):
+        return os.path.join(self.directory, meta["id"] + meta["extension"])
+
+    def list(self):
+        found = (self.get(profile_id) for profile_id in reversed(self._ids()))
+        return [meta for meta in found if meta]
+
+
+class Profiler:
+    """Decides what gets profiled, runs the profilers and files the results.
+
+    A profile is taken when a caller asks for one (``X-Profile`` header or
+    ``?profile=`` flag, naming the mode or just ``1``) or, unasked, for a
+    ``sample_rate`` fraction of traffic. At most ``max_active`` run at once so
+    continuous sampling has a fixed cost ceiling.
+    """
+
+    def __init__(self, enabled=PROFILING_ENABLED, sample_rate=PROFILE_SAMPLE_RATE, mode=PROFILE_MODE,
+                 store=None, max_active=PROFILE_MAX_ACTIVE, token=PROFILE_TOKEN):
+        if mode not in MODES:
+            logger.warning(f"Unknown PROFILE_MODE {mode!r}, using sampling")
+            mode = "sampling"
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.store = store or ProfileStore()
+        self.token = token
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._cprofile_threads = set()  # cProfile allows one profiler per thread
+        self._calls = threading.local()  # Set while a profiled call runs, so wrapped calls do not nest
+        self._lock = threading.Lock()
+        self._stats = {"taken": 0, "requested": 0, "sampled": 0, "skipped": 0, "failed": 0}
+
+    def requested_mode(self, value, token=None):
+        """Mode asked for by a header / query value ("1", "true", "sampling", "cprofile"), or None"""
+        value = (value or "").strip().lower()
+        if not self.enabled or value in ("", "0", "false", "off"):
+            return None
+        if self.token and token != self.token:
+            return None
+        return value if value in MODES else self.mode
+
+    def sampled_mode(self):
+        if self.enabled and self.sample_rate > 0 and random.random() < self.sample_rate:
+            return self.mode
+        return None
+
+    @staticmethod
+    def new_id(kind):
+        return f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{kind}-{uuid.uuid4().hex[:8]}"
+
+    def start(self, mode, threads):
+        """A running profiler, or None when every slot is busy"""
+        if not self._slots.acquire(blocking=False):
+            self._stats["skipped"] += 1
+            return None
+        ident = threading.get_ident()
+        if mode == "cprofile":
+            with self._lock:
+                if ident in self._cprofile_threads:
+                    mode = "sampling"  # Already profiling this thread (another request on the loop)
+                else:
+                    self._cprofile_threads.add(ident)
+        profiler = DeterministicProfiler() if mode == "cprofile" else SamplingProfiler(threads)
+        profiler.mode, profiler.ident = mode, ident
+        profiler.started_at, profiler.started = datetime.utcnow(), time.perf_counter()
+        try:
+            profiler.start()
+        except Exception:
+            self._release(profiler)
+            raise
+        return profiler
+
+    def _release(self, profiler):
+        if profiler.mode == "cprofile":
+            with self._lock:
+                self._cprofile_threads.discard(profiler.ident)
+        self._slots.release()
+
+    def discard(self, profiler):
+        try:
+            profiler.stop()
+        finally:
+            self._release(profiler)
+
+    def finish(self, profiler, profile_id, kind, target, requested, **extra):
+        """Stop a profiler and describe it; returns (meta, data) for ``save``"""
+        self.discard(profiler)
+        fmt, extension, media_type = FORMATS[profiler.mode]
+        meta = {
+            "id": profile_id,
+            "kind": kind,
+            "target": target,
+            "mode": profiler.mode,
+            "format": fmt,
+            "extension": extension,
+            "media_type": media_type,
+            "trigger": "requested" if requested else "sampled",
+            "started_at": profiler.started_at.isoformat() + "Z",
+            "seconds": round(time.perf_counter() - profiler.started, 4),
+            "samples": profiler.samples,
+            **extra,
+        }
+        return meta, profiler.output()
+
+    def save(self, meta, data):
+        try:
+            self.store.save({**meta, "bytes": len(data)}, data)
+            self._stats["taken"] += 1
+            self._stats["requested" if meta["trigger"] == "requested" else "sampled"] += 1
+            logger.info(f"Saved {meta['mode']} profile {meta['id']} of {meta['target']} ({meta['seconds']}s)")
+        except Exception as e:
+            self._stats["failed"] += 1
+            logger.warning(f"Could not save profile {meta['id']}: {e}")
+
+    def call(self, fn, kind, target, mode=None, profile_id=None, requested=None):
+        """Run ``fn()`` on this thread, profiled in ``mode`` (None = sample-rate decides)"""
+        if getattr(self._calls, "active", False):
+            return fn()
+        requested = mode is not None if requested is None else requested
+        mode = mode or self.sampled_mode()
+        own = threading.get_ident()
+        profiler = self.start(mode, lambda ident, name: ident == own) if mode else None
+        if profiler is None:
+            return fn()
+        self._calls.active = True
+        try:
+            return fn()
+        finally:
+            self._calls.active = False
+            self.save(*self.finish(profiler, profile_id or self.new_id(kind), kind, target, requested))
+
+    def wrap(self, fn, kind, target=None, mode=None, profile_id=None, requested=None):
+        """``fn`` as a zero-argument callable that profiles itself (for the scrape job queue)"""
+        target = target or kind
+        return lambda: self.call(fn, kind, target, mode, profile_id, requested)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "mode": self.mode,
+            "directory": self.store.directory,
+            "keep": self.store.keep,
+            "token_required": bool(self.token),
+            **self._stats,
+        }
+
+
+# Shared by the middleware, the scrape routes and the job queue
+profiler = Profiler()
+
+
+def claim(request):
+    """Take over the request's profile for work handed to another thread (a queued scrape).
+
+    Returns ``(mode, profile_id, requested)`` or None; the middleware then drops
+    its own profile of the request and the caller profiles the work under the same id.
+    """
+    state = request.scope.get("state") or {}
+    if not state.get("profile_mode"):
+        return None
+    state["profile_claimed"] = True
+    return state["profile_mode"], state["profile_id"], state["profile_requested"]
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling single requests on demand or at the sample rate.
+
+    Sampling covers the event loop thread and the threadpool running sync
+    endpoints; cProfile only sees the event loop thread. The response carries
+    ``X-Profile-Id``. Profile downloads, metrics and long-lived streams are
+    never profiled.
+    """
+
+    def __init__(self, app, profiler=profiler, excluded=("/profiles", "/metrics", "/trends/stream")):
+        self.app = app
+        self.profiler = profiler
+        self.excluded = tuple(excluded)
+
+    def _mode(self, scope):
+        headers = dict(scope.get("headers") or [])
+        value = headers.get(b"x-profile", b"").decode("latin-1")
+        if not value and b"profile=" in scope.get("query_string", b""):
+            value = (parse_qs(scope["query_string"].decode("latin-1")).get("profile") or [""])[0]
+        token = headers.get(b"x-profile-token", b"").decode("latin-1") or None
+        mode = self.profiler.requested_mode(value, token)
+        if mode:
+            return mode, True
+        return self.profiler.sampled_mode(), False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled or scope["path"].startswith(self.excluded):
+            await self.app(scope, receive, send)
+            return
+
+        mode, requested = self._mode(scope)
+        loop_thread = threading.get_ident()
+        running = self.profiler.start(
+            mode, lambda ident, name: ident == loop_thread or name.startswith("AnyIO worker thread")
+        ) if mode else None
+        if running is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = self.profiler.new_id("request")
+        state = scope.setdefault("state", {})
+        state.update(profile_mode=running.mode, profile_id=profile_id, profile_requested=requested)
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if state.get("profile_claimed"):
+                self.profiler.discard(running)
+            else:
+                target = f"{scope['method']} {getattr(scope.get('route'), 'path', None) or scope['path']}"
+                meta, data = self.profiler.finish(running, profile_id, "request", target, requested,
+                                                  path=scope["path"], status=status)
+                await asyncio.to_thread(self.profiler.save, meta, data)
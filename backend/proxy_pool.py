@@ -0,0 +1,348 @@
+import os
+import json
+import math
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from transport import transport
+from metrics import observe_proxy
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Static list of working free proxies (updated from free-proxy-list.net)
+STATIC_PROXIES = [
+    "8.208.97.82:3129",
+    "57.129.81.201:8080",
+    "32.223.6.94:80",
+    "94.130.104.137:8080",
+    "192.177.139.220:8000",
+    "194.59.204.87:9080",
+    "200.174.198.86:8888",
+    "152.53.107.230:80",
+    "91.132.92.150:80",
+    "143.42.66.91:80",
+    "116.107.169.233:10001",
+    "123.141.181.22:5031",
+    "51.20.192.194:3128",
+    "178.18.244.8:8888",
+    "113.160.132.195:8080",
+    "123.141.181.12:5031",
+    "198.23.236.47:1111",
+    "91.84.99.28:80",
+    "38.147.98.190:8080",
+    "37.187.74.125:80"
+]
+
+# Free proxy APIs
+DEFAULT_PROXY_LIST_URLS = [
+    "https://api.proxyscrape.com/v2/?request=get&protocol=http&timeout=10000&country=all&ssl=all&anonymity=all",
+    "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/http.txt",
+    "https://raw.githubusercontent.com/proxifly/free-proxy-list/main/proxies/all.txt",
+    "https://www.proxy-list.download/api/v1/get?type=http"
+]
+
+PROXY_LIST_URLS = [u.strip() for u in os.getenv("PROXY_LIST_URLS", "").split(",") if u.strip()] or DEFAULT_PROXY_LIST_URLS
+PROXY_CHECK_URL = os.getenv("PROXY_CHECK_URL", "http://httpbin.org/ip")
+PROXY_STORE_PATH = os.getenv("PROXY_STORE_PATH", "./proxies.json")
+PROXY_VALIDATE_CONCURRENCY = int(os.getenv("PROXY_VALIDATE_CONCURRENCY", "32"))
+PROXY_VALIDATE_TIMEOUT = int(os.getenv("PROXY_VALIDATE_TIMEOUT", "8"))
+PROXY_MAX_CANDIDATES = int(os.getenv("PROXY_MAX_CANDIDATES", "200"))
+# 0 = validate once at startup only; shorter intervals are raised to MIN_REVALIDATE_INTERVAL
+PROXY_REVALIDATE_INTERVAL = int(os.getenv("PROXY_REVALIDATE_INTERVAL", "600"))
+# How long get() waits for the background refresh when no proxy is validated yet
+PROXY_WAIT_TIMEOUT = int(os.getenv("PROXY_WAIT_TIMEOUT", "90"))
+PROXY_TOP_K = int(os.getenv("PROXY_TOP_K", "5"))
+
+# A proxy's score halves for every this many seconds since it last worked
+RECENCY_HALF_LIFE = 3600
+# Proxies failing this many checks in a row are dropped from the store
+MAX_FAILURE_STREAK = 3
+# Revalidating more often than this would just hammer the public list APIs
+MIN_REVALIDATE_INTERVAL = 30
+
+
+def parse_proxy_list(api_url, content):
+    """Parse an ip:port list from one of the proxy APIs (JSON or plain text)"""
+    content = content.strip()
+
+    if "proxyscrape" in api_url:
+        # JSON format
+        try:
+            data = json.loads(content)
+            if 'proxies' in data:
+                return [f"{proxy['ip']}:{proxy['port']}" for proxy in data['proxies']]
+        except ValueError:
+            pass
+
+    # Text format
+    return [p.strip() for p in content.split('\n') if ':' in p and len(p.strip()) > 5]
+
+
+class ProxyRecord:
+    """Validation history of one proxy"""
+
+    def __init__(self, address, ip=None, latency=None, successes=0, failures=0,
+                 failure_streak=0, last_seen=None, last_checked=None):
+        self.address = address
+        self.ip = ip
+        self.latency = latency
+        self.successes = successes
+        self.failures = failures
+        self.failure_streak = failure_streak
+        self.last_seen = last_seen
+        self.last_checked = last_checked
+
+    @property
+    def alive(self):
+        return self.last_seen is not None and self.failure_streak == 0
+
+    def update(self, ok, ip=None, latency=None):
+        now = time.time()
+        self.last_checked = now
+        if ok:
+            self.successes += 1
+            self.failure_streak = 0
+            self.last_seen = now
+            self.ip = ip or self.ip
+            # Exponential moving average so one slow check doesn't sink a good proxy
+            self.latency = latency if self.latency is None else 0.7 * self.latency + 0.3 * latency
+        else:
+            self.failures += 1
+            self.failure_streak += 1
+
+    def score(self, now=None):
+        """Higher is better: success rate x speed x recency"""
+        if not self.alive:
+            return 0.0
+        now = now or time.time()
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        speed = 1 / (1 + (self.latency or PROXY_VALIDATE_TIMEOUT))
+        recency = math.pow(0.5, (now - self.last_seen) / RECENCY_HALF_LIFE)
+        return success_rate * speed * recency
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class ProxyPool:
+    """Scored pool of validated proxies, persisted to disk and refreshed in the background.
+
+    ``get()`` only reads the ranking built by the last refresh, so callers never
+    wait on proxy validation unless the pool is completely empty.
+    """
+
+    def __init__(self, list_urls=PROXY_LIST_URLS, check_url=PROXY_CHECK_URL, static_proxies=STATIC_PROXIES,
+                 store_path=PROXY_STORE_PATH, concurrency=PROXY_VALIDATE_CONCURRENCY,
+                 timeout=PROXY_VALIDATE_TIMEOUT, max_candidates=PROXY_MAX_CANDIDATES,
+                 interval=PROXY_REVALIDATE_INTERVAL, top_k=PROXY_TOP_K, wait_timeout=PROXY_WAIT_TIMEOUT):
+        self.list_urls = list_urls
+        self.check_url = check_url
+        self.static_proxies = static_proxies
+        self.store_path = store_path
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_candidates = max_candidates
+        if 0 < interval < MIN_REVALIDATE_INTERVAL:
+            logger.warning(f"Proxy revalidation interval {interval}s raised to {MIN_REVALIDATE_INTERVAL}s")
+            interval = MIN_REVALIDATE_INTERVAL
+        self.interval = interval
+        self.top_k = top_k
+        self.wait_timeout = wait_timeout
+
+        self._records = {}
+        self._ranked = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed = threading.Event()  # Set once the first refresh has finished
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_refresh = None
+
+        self._load()
+
+    # -------------------- Persistence --------------------
+
+    def _load(self):
+        if not self.store_path or not os.path.exists(self.store_path):
+            return
+        try:
+            with open(self.store_path) as f:
+                data = json.load(f)
+            self._records = {r["address"]: ProxyRecord(**r) for r in data.get("proxies", [])}
+            self._rank()
+            logger.info(f"Loaded {len(self._records)} proxies from {self.store_path} ({len(self._ranked)} alive)")
+        except Exception as e:
+            logger.warning(f"Failed to load proxy store {self.store_path}: {e}")
+
+    def _save(self):
+        if not self.store_path:
+            return
+        try:
+            with self._lock:
+                data = {"saved_at": time.time(), "proxies": [r.to_dict() for r in self._records.values()]}
+            # Per process: fan-out workers each keep a pool and save it to the same store
+            tmp_path = f"{self.store_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.store_path)
+        except Exception as e:
+            logger.warning(f"Failed to save proxy store {self.store_path}: {e}")
+
+    # -------------------- Fetching & validation --------------------
+
+    def _fetch_list(self, api_url):
+        try:
+            logger.info(f"Fetching proxies from: {api_url}")
+            response = transport.get(api_url, timeout=10)
+            if response.status_code == 200:
+                proxies = parse_proxy_list(api_url, response.text)
+                logger.info(f"Found {len(proxies)} proxies from {api_url}")
+                return proxies
+        except Exception as e:
+            logger.warning(f"Failed to fetch from {api_url}: {e}")
+        return []
+
+    def fetch_candidates(self):
+        """Download every proxy list concurrently and merge them with the static list"""
+        with ThreadPoolExecutor(max_workers=max(1, len(self.list_urls))) as executor:
+            results = executor.map(self._fetch_list, self.list_urls)
+            fresh_proxies = [proxy for proxies in results for proxy in proxies]
+
+        all_proxies = list(set(fresh_proxies + self.static_proxies))
+        logger.info(f"Total unique proxies available: {len(all_proxies)}")
+        return all_proxies
+
+    def check(self, address, timeout=None):
+        """Test one proxy against the check URL, returns (ok, ip, latency)"""
+        start = time.perf_counter()
+        try:
+            # No retries: a proxy that fails once is retried by the next validation round
+            response = transport.get(self.check_url, proxy=address, retries=0, timeout=timeout or self.timeout)
+            if response.status_code == 200:
+                result_ip = response.json().get('origin', '').split(',')[0]
+                latency = time.perf_counter() - start
+                transport.remember_ip(address, result_ip)
+                logger.debug(f"Proxy {address} working - IP: {result_ip} ({latency:.2f}s)")
+                return True, result_ip, latency
+        except Exception as e:
+            logger.debug(f"Proxy {address} failed: {e}")
+        return False, None, None
+
+    def validate(self, addresses):
+        """Check proxies in parallel (at most ``concurrency`` at once) and record the results"""
+        if not addresses:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(addresses))) as executor:
+            results = list(executor.map(self.check, addresses))
+
+        working = 0
+        with self._lock:
+            for address, (ok, ip, latency) in zip(addresses, results):
+                record = self._records.setdefault(address, ProxyRecord(address))
+                record.update(ok, ip, latency)
+                working += ok
+                observe_proxy("validation", ok)
+        logger.info(f"Validated {len(addresses)} proxies, {working} working")
+        return working
+
+    def refresh(self):
+        """Revalidate known proxies, try new candidates and rebuild the ranking"""
+        with self._refresh_lock:
+            with self._lock:
+                known = list(self._records)
+
+            try:
+                candidates = [p for p in self.fetch_candidates() if p not in self._records]
+                random.shuffle(candidates)
+                budget = max(0, self.max_candidates - len(known))
+
+                self.validate(known + candidates[:budget])
+                self._prune()
+                self._rank()
+                self._save()
+                self.last_refresh = time.time()
+            finally:
+                self._refreshed.set()
+
+    def _prune(self):
+        with self._lock:
+            for address in [a for a, r in self._records.items() if r.failure_streak >= MAX_FAILURE_STREAK]:
+                del self._records[address]
+
+    def _rank(self):
+        now = time.time()
+        with self._lock:
+            alive = [r for r in self._records.values() if r.alive]
+            alive.sort(key=lambda r: r.score(now), reverse=True)
+            self._ranked = alive
+
+    # -------------------- Consumers --------------------
+
+    def get(self):
+        """Return (address, ip) of a known-good proxy, or (None, None) for a direct connection"""
+        if not self._ranked:
+            if self._thread:
+                # Wait for the background refresh (the thread may not have started it yet)
+                # rather than starting another; give up after wait_timeout
+                if self._refreshed.wait(self.wait_timeout) and self._refresh_lock.acquire(timeout=self.wait_timeout):
+                    self._refresh_lock.release()
+            else:
+                # Nothing validated yet and no background refresher: validate inline once
+                self.refresh()
+
+        ranked = self._ranked
+        if not ranked:
+            logger.warning("No working proxy found, using direct connection")
+            return None, None
+
+        # Rotate among the best few instead of always hammering the top one
+        record = random.choice(ranked[:self.top_k])
+        return record.address, record.ip
+
+    def report(self, address, ok, latency=None):
+        """Feed back the outcome of a real request made through a proxy"""
+        if not address:
+            return
+        observe_proxy("scrape", ok)
+        with self._lock:
+            record = self._records.setdefault(address, ProxyRecord(address))
+            record.update(ok, latency=latency if latency is not None else record.latency or self.timeout)
+        self._rank()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "known": len(self._records),
+                "alive": len(self._ranked),
+                "last_refresh": self.last_refresh,
+                "best": [{"address": r.address, "latency": r.latency, "score": round(r.score(), 4)} for r in self._ranked[:self.top_k]],
+            }
+
+    # -------------------- Background revalidation --------------------
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="proxy-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Proxy pool refresh failed: {e}")
+            if self.interval <= 0:
+                logger.info("Proxy revalidation disabled (PROXY_REVALIDATE_INTERVAL=0)")
+                return
+            self._stop.wait(self.interval)
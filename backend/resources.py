@@ -0,0 +1,165 @@
+import os
+import json
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Which requests the scraper's browser skips (trend text only needs the HTML and scripts)
+RESOURCE_BLOCKING = os.getenv("RESOURCE_BLOCKING", "true").lower() == "true"
+BLOCK_RESOURCE_TYPES = [t.strip() for t in os.getenv("BLOCK_RESOURCE_TYPES", "image,media,font").split(",") if t.strip()]
+BLOCK_TRACKERS = os.getenv("BLOCK_TRACKERS", "true").lower() == "true"
+BLOCK_URL_PATTERNS = [p.strip() for p in os.getenv("BLOCK_URL_PATTERNS", "").split(",") if p.strip()]
+# "eager" returns from driver.get() at DOMContentLoaded; every wait after it is an explicit condition
+PAGE_LOAD_STRATEGY = os.getenv("PAGE_LOAD_STRATEGY", "eager")
+# Count requests, blocked requests and bytes per scrape from Chrome's performance log
+NETWORK_ACCOUNTING = os.getenv("NETWORK_ACCOUNTING", "true").lower() == "true"
+
+# Network.setBlockedURLs patterns per resource type; "*" is the only wildcard and
+# a pattern has to match the whole URL, hence the trailing "*" for query strings
+RESOURCE_PATTERNS = {
+    "image": ["*pbs.twimg.com/*", "*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.ico*"],
+    "media": ["*video.twimg.com/*", "*.mp4*", "*.m3u8*", "*.m4s*", "*.webm*", "*.mp3*"],
+    "font": ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+}
+
+# Analytics beacons and ad calls fired by x.com pages
+TRACKER_PATTERNS = [
+    "*google-analytics.com/*",
+    "*googletagmanager.com/*",
+    "*doubleclick.net/*",
+    "*ads-twitter.com/*",
+    "*ads-api.x.com/*",
+    "*ads-api.twitter.com/*",
+    "*analytics.twitter.com/*",
+    "*/i/api/1.1/jot/*",
+]
+
+
+class ResourcePolicy:
+    """What the scraper's browser loads, and how much it transferred.
+
+    Blocked URLs are set over CDP (Network.setBlockedURLs) once per driver, so
+    they hold for every page a pooled driver opens. Images are also turned off
+    in the browser profile, which skips them before any request is made.
+    Accounting reads Chrome's performance log: call ``reset`` when a scrape
+    starts and ``usage`` when it ends.
+    """
+
+    def __init__(self, enabled=RESOURCE_BLOCKING, block_types=None, block_trackers=BLOCK_TRACKERS,
+                 extra_patterns=None, page_load_strategy=PAGE_LOAD_STRATEGY, accounting=NETWORK_ACCOUNTING):
+        self.enabled = enabled
+        self.block_types = BLOCK_RESOURCE_TYPES if block_types is None else block_types
+        self.block_trackers = block_trackers
+        self.extra_patterns = BLOCK_URL_PATTERNS if extra_patterns is None else extra_patterns
+        self.page_load_strategy = page_load_strategy
+        self.accounting = accounting
+
+        unknown = set(self.block_types) - set(RESOURCE_PATTERNS)
+        if unknown:
+            logger.warning(f"Unknown BLOCK_RESOURCE_TYPES ignored: {sorted(unknown)}")
+
+    def url_patterns(self):
+        if not self.enabled:
+            return []
+        patterns = [p for t in self.block_types for p in RESOURCE_PATTERNS.get(t, [])]
+        if self.block_trackers:
+            patterns += TRACKER_PATTERNS
+        return patterns + self.extra_patterns
+
+    def configure(self, options):
+        """Page-load strategy, image setting and performance log for new Chrome options"""
+        options.page_load_strategy = self.page_load_strategy
+        if self.accounting:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+    def prefs(self):
+        # 2 = block, 1 = allow
+        return {"profile.managed_default_content_settings.images": 2 if self.enabled and "image" in self.block_types else 1}
+
+    def apply(self, driver):
+        """Install the URL blocklist on a freshly started driver"""
+        patterns = self.url_patterns()
+        if not patterns:
+            return
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+            logger.info(f"Blocking {len(patterns)} URL patterns ({', '.join(self.block_types)}, trackers: {self.block_trackers})")
+        except Exception as e:
+            logger.warning(f"Could not set blocked URLs, loading every resource: {e}")
+
+    def reset(self, driver):
+        """Drop log entries from before this scrape (a pooled driver logs while idle too)"""
+        if self.accounting:
+            _performance_log(driver)
+
+    def usage(self, driver):
+        """Requests, blocked requests and bytes since the last reset (None when the log is off)"""
+        entries = _performance_log(driver) if self.accounting else None
+        return None if entries is None else summarize_network(entries)
+
+    def describe(self):
+        return {
+            "enabled": self.enabled,
+            "block_types": self.block_types if self.enabled else [],
+            "block_trackers": self.enabled and self.block_trackers,
+            "url_patterns": len(self.url_patterns()),
+            "page_load_strategy": self.page_load_strategy,
+            "accounting": self.accounting,
+        }
+
+
+def _performance_log(driver):
+    try:
+        return driver.get_log("performance")
+    except Exception as e:
+        logger.debug(f"Performance log unavailable: {e}")
+        return None
+
+
+def summarize_network(entries):
+    """Totals of Network.* events from a performance log.
+
+    ``bytes`` is what came over the wire (encodedDataLength: headers and
+    compressed bodies). Requests blocked by the URL list fail with the
+    "inspector" reason, or with ERR_BLOCKED_BY_CLIENT in older Chrome versions.
+    """
+    types, by_type = {}, {}
+    totals = {"requests": 0, "blocked": 0, "failed": 0, "bytes": 0}
+
+    def count(request_id, key, amount=1):
+        kind = (types.get(request_id) or "Other").lower()
+        bucket = by_type.setdefault(kind, {"requests": 0, "blocked": 0, "bytes": 0})
+        bucket[key] += amount
+
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, TypeError, ValueError):
+            continue
+        method, params = message.get("method"), message.get("params") or {}
+        request_id = params.get("requestId")
+
+        if method == "Network.requestWillBeSent":
+            if params.get("redirectResponse"):
+                continue  # Same request id, already counted
+            types[request_id] = params.get("type")
+            totals["requests"] += 1
+            count(request_id, "requests")
+        elif method == "Network.loadingFinished":
+            size = int(params.get("encodedDataLength") or 0)
+            totals["bytes"] += size
+            count(request_id, "bytes", size)
+        elif method == "Network.loadingFailed":
+            types.setdefault(request_id, params.get("type"))
+            if params.get("blockedReason") or "ERR_BLOCKED_BY_CLIENT" in (params.get("errorText") or ""):
+                totals["blocked"] += 1
+                count(request_id, "blocked")
+            elif not params.get("canceled"):
+                totals["failed"] += 1
+
+    return {**totals, "by_type": by_type}
+
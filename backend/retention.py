@@ -0,0 +1,383 @@
+import os
+import re
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, text, func
+from dotenv import load_dotenv
+from models import Trend, TrendEntry, TrendRollup, TREND_COLUMNS
+from changes import is_error, snapshot_keys, change_detector
+from scheduler import lease_holder, acquire_lease, release_lease
+from cache import trend_cache, trend_count, rollup_count
+import crud
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between retention runs (0 disables the background task)
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "0"))
+# Raw snapshots older than this are folded into hourly rollups
+RETENTION_RAW_DAYS = int(os.getenv("RETENTION_RAW_DAYS", "7"))
+# Hourly rollups older than this are folded into daily rollups
+RETENTION_HOURLY_DAYS = int(os.getenv("RETENTION_HOURLY_DAYS", "90"))
+# Daily rollups older than this are deleted (0 keeps them forever)
+RETENTION_DAILY_DAYS = int(os.getenv("RETENTION_DAILY_DAYS", "0"))
+# Rows read, folded and deleted per transaction
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "1000"))
+# Daily partitions created ahead of time on a partitioned PostgreSQL database
+RETENTION_PARTITIONS_AHEAD = int(os.getenv("RETENTION_PARTITIONS_AHEAD", "7"))
+
+LEASE_NAME = "trend-retention"
+
+# Namespace for rollup ids; never change it or re-running a rollup will duplicate rows
+ROLLUP_NAMESPACE = uuid.UUID("0d8f3a4e-6c1b-4d27-9a57-52c1e4b8a0f3")
+
+PARTITIONED_TABLES = ("trends", "trend_entries")
+PARTITION_RE = re.compile(r"^trends_p(\d{8})$")
+
+
+def bucket_start(when: datetime, resolution: str):
+    when = when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0) if resolution == "day" else when
+
+
+def rollup_id(resolution, account, location, bucket):
+    return str(uuid.uuid5(ROLLUP_NAMESPACE, f"{resolution}|{account or ''}|{location or ''}|{bucket.isoformat()}"))
+
+
+class Rollup:
+    """Folds snapshots (trends rows, or finer rollups) into one row per stream and bucket.
+
+    Rows ranking the same topics are grouped; the group seen in the most scrapes
+    becomes the bucket's snapshot (the later one on a tie). Failed scrapes are
+    left out.
+    """
+
+    def __init__(self, resolution):
+        self.resolution = resolution
+        self._buckets = {}  # (account, location, bucket) -> {snapshot keys -> group}
+
+    def add(self, row: dict):
+        if is_error(row):
+            return
+        values = [row[c] for c in TREND_COLUMNS]
+        stream_bucket = (row["account"], row["location"], bucket_start(row["datetime"], self.resolution))
+        groups = self._buckets.setdefault(stream_bucket, {})
+        seen = row.get("seen_count") or 1
+        snapshots = row.get("snapshots") or 1
+        last = row.get("last_seen_at") or row["datetime"]
+
+        keys = snapshot_keys(values)
+        group = groups.get(keys)
+        if group is None:
+            groups[keys] = {"values": values, "seen": seen, "snapshots": snapshots, "last": last}
+            return
+        group["seen"] += seen
+        group["snapshots"] += snapshots
+        if last > group["last"]:
+            group["values"], group["last"] = values, last
+
+    def rows(self):
+        rows = []
+        for (account, location, bucket), groups in self._buckets.items():
+            top = max(groups.values(), key=lambda group: (group["seen"], group["last"]))
+            rows.append({
+                "id": rollup_id(self.resolution, account, location, bucket),
+                "resolution": self.resolution,
+                **dict(zip(TREND_COLUMNS, top["values"])),
+                "datetime": bucket,
+                "account": account,
+                "location": location,
+                "last_seen_at": max(group["last"] for group in groups.values()),
+                "seen_count": sum(group["seen"] for group in groups.values()),
+                "snapshots": sum(group["snapshots"] for group in groups.values()),
+            })
+        return rows
+
+
+ROLLUP_COLUMNS = [*TREND_COLUMNS, "datetime", "account", "location", "last_seen_at", "seen_count", "snapshots"]
+
+
+def save_rollups(db, rollup: Rollup):
+    """Store a rollup's buckets, merged with the rows already stored for the same buckets.
+
+    A bucket folded in several batches or runs gets its stored row added back
+    as one more group, so the counts add up and its snapshot is picked again.
+    The stored row only keeps its winning group, which is credited with all of
+    the bucket's earlier scrapes.
+    """
+    rows = rollup.rows()
+    if not rows:
+        return
+    table = TrendRollup.__table__
+    stored = db.execute(
+        select(*[table.c[c] for c in ROLLUP_COLUMNS]).where(table.c.id.in_([row["id"] for row in rows]))
+    ).all()
+    if stored:
+        for row in stored:
+            rollup.add(row._asdict())
+        rows = rollup.rows()
+    crud.upsert_add(db, table, rows, ["id"], replace=ROLLUP_COLUMNS)
+
+
+# -------------------- PostgreSQL partitions --------------------
+
+def is_partitioned(db):
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return bool(db.execute(text(
+        "SELECT count(*) FROM pg_partitioned_table WHERE partrelid = to_regclass('trends')"
+    )).scalar())
+
+
+def create_partitions(db, first_day, last_day):
+    """Daily partitions of trends / trend_entries for [first_day, last_day]"""
+    day = first_day
+    while day <= last_day:
+        for table in PARTITIONED_TABLES:
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table}_p{day:%Y%m%d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{day:%Y-%m-%d}') TO ('{day + timedelta(days=1):%Y-%m-%d}')"
+            ))
+        day += timedelta(days=1)
+
+
+def expired_partitions(db, cutoff: datetime):
+    """Days whose trends partition ends at or before cutoff, oldest first"""
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('trends')"
+    )).scalars()
+    days = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            day = datetime.strptime(match.group(1), "%Y%m%d")
+            if day + timedelta(days=1) <= cutoff:
+                days.append(day)
+    return sorted(days)
+
+
+# -------------------- Retention --------------------
+
+class RetentionManager:
+    """Ages trend history through tiers: raw snapshots, hourly rollups, daily rollups.
+
+    Each run folds raw rows older than ``raw_days`` into hourly rollups and
+    hourly rollups older than ``hourly_days`` into daily ones, deleting what
+    it folded, ``batch_size`` rows per transaction so writers are never blocked
+    for long. On a partitioned PostgreSQL database whole expired days are
+    rolled up and their partitions dropped instead. Rollup ids are derived from
+    the bucket, so a run that stops halfway just continues next time. With
+    several replicas only the holder of the retention lease runs.
+    """
+
+    def __init__(self, session_factory, interval=RETENTION_INTERVAL_SECONDS, raw_days=RETENTION_RAW_DAYS,
+                 hourly_days=RETENTION_HOURLY_DAYS, daily_days=RETENTION_DAILY_DAYS,
+                 batch_size=RETENTION_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self.batch_size = batch_size
+        self.holder = lease_holder()
+        self.last_run_at = None
+        self.last_result = None
+        self.last_error = None
+        self._task = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def start(self):
+        if not self.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Retention task started (every {self.interval}s, raw {self.raw_days}d, hourly {self.hourly_days}d)")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await asyncio.to_thread(release_lease, self.session_factory, LEASE_NAME, self.holder)
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "interval_seconds": self.interval,
+            "tiers": {"raw_days": self.raw_days, "hourly_days": self.hourly_days, "daily_days": self.daily_days or None},
+            "last_run_at": self.last_run_at,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+    async def _loop(self):
+        while True:
+            try:
+                # Held for a whole interval so a slow run is never picked up twice
+                if await asyncio.to_thread(acquire_lease, self.session_factory, LEASE_NAME, self.holder, self.interval * 2):
+                    await asyncio.to_thread(self.run_once)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def cutoffs(self, now=None):
+        now = now or datetime.utcnow()
+        return {
+            "raw": bucket_start(now - timedelta(days=self.raw_days), "hour"),
+            "hour": bucket_start(now - timedelta(days=self.hourly_days), "day"),
+            "day": bucket_start(now - timedelta(days=self.daily_days), "day") if self.daily_days else None,
+        }
+
+    def run_once(self, now=None):
+        """Apply every tier once, returns what was done"""
+        started = time.perf_counter()
+        cutoffs = self.cutoffs(now)
+        result = {"raw_rolled_up": 0, "partitions_dropped": 0, "hourly_rolled_up": 0, "daily_deleted": 0}
+
+        db = self.session_factory()
+        try:
+            partitioned = is_partitioned(db)
+            if partitioned:
+                today = bucket_start(now or datetime.utcnow(), "day")
+                create_partitions(db, today, today + timedelta(days=RETENTION_PARTITIONS_AHEAD))
+                db.commit()
+                for day in expired_partitions(db, cutoffs["raw"]):
+                    result["raw_rolled_up"] += self._rollup_partition(db, day)
+                    result["partitions_dropped"] += 1
+        finally:
+            db.close()
+
+        # Everything left over: the whole table on SQLite, the default partition on PostgreSQL
+        # (whose cutoff stays on a day boundary so live partitions are only ever dropped whole)
+        raw_cutoff = bucket_start(cutoffs["raw"], "day") if partitioned else cutoffs["raw"]
+        result["raw_rolled_up"] += self._fold(Trend, "hour", raw_cutoff)
+        result["hourly_rolled_up"] = self._fold(TrendRollup, "day", cutoffs["hour"])
+        if cutoffs["day"]:
+            result["daily_deleted"] = self._expire_daily(cutoffs["day"])
+
+        if result["raw_rolled_up"] or result["hourly_rolled_up"] or result["daily_deleted"]:
+            trend_count.reset()
+            rollup_count.reset()
+            trend_cache.invalidate("latest", "all")
+            change_detector.forget()
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        self.last_run_at, self.last_result, self.last_error = datetime.utcnow(), result, None
+        logger.info(f"Retention run: {result}")
+        return result
+
+    def _columns(self, source):
+        table = source.__table__
+        columns = [table.c.id, *[table.c[c] for c in TREND_COLUMNS], table.c.datetime, table.c.account,
+                   table.c.location, table.c.last_seen_at, table.c.seen_count]
+        if source is TrendRollup:
+            columns.append(table.c.snapshots)
+        return columns
+
+    def _fold(self, source, resolution, cutoff):
+        """Fold rows of `source` older than cutoff into `resolution` rollups and delete them, batch by batch"""
+        table = source.__table__
+        # Rows seen again after the cutoff (repeated scrapes) are still live; datetime keeps the index usable
+        conditions = [table.c.datetime < cutoff, func.coalesce(table.c.last_seen_at, table.c.datetime) < cutoff]
+        if source is TrendRollup:
+            conditions.append(table.c.resolution == "hour")
+        query = select(*self._columns(source)).where(*conditions).order_by(table.c.datetime, table.c.id)
+
+        total = 0
+        while True:
+            db = self.session_factory()
+            try:
+                rows = db.execute(query.limit(self.batch_size)).all()
+                if not rows:
+                    break
+                if len(rows) == self.batch_size:
+                    # The last bucket may continue past this batch; leave it for the next one
+                    # (unless it fills the whole batch) so buckets are folded in one go
+                    last = bucket_start(rows[-1].datetime, resolution)
+                    rows = [row for row in rows if bucket_start(row.datetime, resolution) < last] or rows
+
+                rollup = Rollup(resolution)
+                for row in rows:
+                    rollup.add(row._asdict())
+                save_rollups(db, rollup)
+                ids = [row.id for row in rows]
+                if source is Trend:
+                    db.execute(delete(TrendEntry).where(TrendEntry.trend_id.in_(ids)))
+                db.execute(delete(table).where(table.c.id.in_(ids)))
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            total += len(ids)
+        if total:
+            logger.info(f"Folded {total} {table.name} rows older than {cutoff.isoformat()} into {resolution}ly rollups")
+        return total
+
+    def _rollup_partition(self, db, day):
+        """Roll up one expired day, then drop its partitions in the same transaction"""
+        query = (
+            select(*self._columns(Trend))
+            .where(Trend.datetime >= day, Trend.datetime < day + timedelta(days=1))
+            .order_by(Trend.datetime, Trend.id)
+            .execution_options(yield_per=self.batch_size)
+        )
+        rollup, count = Rollup("hour"), 0
+        for rows in db.execute(query).partitions():
+            for row in rows:
+                rollup.add(row._asdict())
+            count += len(rows)
+
+        # DDL is transactional on PostgreSQL: the rollups and the drop commit together
+        try:
+            save_rollups(db, rollup)
+            db.execute(text("DROP TABLE " + ", ".join(f"{table}_p{day:%Y%m%d}" for table in PARTITIONED_TABLES)))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info(f"Rolled up {count} trends of {day:%Y-%m-%d} and dropped their partitions")
+        return count
+
+    def _expire_daily(self, cutoff):
+        total = 0
+        while True:
+            db = self.session_factory()
+            try:
+                ids = list(db.execute(
+                    select(TrendRollup.id)
+                    .where(TrendRollup.resolution == "day", TrendRollup.datetime < cutoff)
+                    .limit(self.batch_size)
+                ).scalars())
+                if not ids:
+                    break
+                db.execute(delete(TrendRollup).where(TrendRollup.id.in_(ids)))
+                db.commit()
+            finally:
+                db.close()
+            total += len(ids)
+        return total
+
+
+if __name__ == "__main__":
+    import json
+    from database import engine, Base, SessionLocal
+    from migrations import run_migrations
+
+    logging.basicConfig(level=logging.INFO)
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    print(json.dumps(RetentionManager(SessionLocal).run_once(), indent=2))
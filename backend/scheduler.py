@@ -0,0 +1,251 @@
+import os
+import time
+import uuid
+import random
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+from models import Trend, SchedulerLease
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Seconds between scheduled scrapes (0 disables the scheduler)
+SCRAPE_INTERVAL_SECONDS = int(os.getenv("SCRAPE_INTERVAL_SECONDS", "0"))
+# Random delay added to each run so replicas and restarts don't line up
+SCRAPE_JITTER_SECONDS = int(os.getenv("SCRAPE_JITTER_SECONDS", "60"))
+# Upper bound of the exponential backoff after consecutive failures
+SCRAPE_BACKOFF_MAX_SECONDS = int(os.getenv("SCRAPE_BACKOFF_MAX_SECONDS", "3600"))
+# How long the leader's lease lasts without renewal (defaults to two intervals)
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "0"))
+
+LEASE_NAME = "scrape-scheduler"
+# How often a running scheduled job is checked for completion
+JOB_POLL_SECONDS = 1
+
+
+def lease_holder():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def acquire_lease(session_factory, name, holder, seconds):
+    """Take or renew the named DB lease, returns whether this holder has it"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=seconds)
+    db = session_factory()
+    try:
+        result = db.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == name)
+            .where((SchedulerLease.holder == holder) | (SchedulerLease.expires_at < now))
+            .values(holder=holder, expires_at=expires_at)
+        )
+        if result.rowcount:
+            db.commit()
+            return True
+
+        db.add(SchedulerLease(name=name, holder=holder, expires_at=expires_at))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            # Another replica holds a live lease
+            db.rollback()
+            return False
+    finally:
+        db.close()
+
+
+def release_lease(session_factory, name, holder):
+    db = session_factory()
+    try:
+        db.execute(
+            update(SchedulerLease)
+            .where(SchedulerLease.name == name)
+            .where(SchedulerLease.holder == holder)
+            .values(expires_at=datetime.utcnow())
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class ScrapeScheduler:
+    """Runs scrapes on a fixed interval inside the API process.
+
+    Runs go through the job queue, so a scheduled run never overlaps a manual
+    one (they collapse into the same job). With several replicas only the
+    holder of the DB lease scrapes; the others stay on standby and take over
+    once the lease expires.
+    """
+
+    def __init__(self, job_queue, session_factory, scrape_fn=None, interval=SCRAPE_INTERVAL_SECONDS,
+                 jitter=SCRAPE_JITTER_SECONDS, backoff_max=SCRAPE_BACKOFF_MAX_SECONDS,
+                 lease_seconds=SCHEDULER_LEASE_SECONDS):
+        self.job_queue = job_queue
+        self.scrape_fn = scrape_fn  # e.g. a fan-out run instead of the default scraper
+        self.session_factory = session_factory
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff_max = backoff_max
+        self.lease_seconds = lease_seconds or interval * 2
+        self.holder = lease_holder()
+
+        self.next_run_at = None
+        self.last_run_at = None
+        self.last_duration = None
+        self.last_status = None
+        self.last_error = None
+        self.failure_streak = 0
+        self.is_leader = False
+        self._task = None
+
+    @property
+    def enabled(self):
+        return self.interval > 0
+
+    def start(self):
+        if not self.enabled or self._task:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Scrape scheduler started (every {self.interval}s, holder {self.holder})")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            await asyncio.to_thread(self._release_lease)
+
+    def status(self):
+        return {
+            "enabled": self.enabled,
+            "interval_seconds": self.interval,
+            "jitter_seconds": self.jitter,
+            "next_run_at": self.next_run_at,
+            "last_run_at": self.last_run_at,
+            "last_duration_seconds": self.last_duration,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+            "failure_streak": self.failure_streak,
+            "is_leader": self.is_leader,
+            "holder": self.holder,
+        }
+
+    # -------------------- Scheduling --------------------
+
+    def _jitter(self):
+        return random.uniform(0, self.jitter) if self.jitter else 0
+
+    def _delay_after_run(self):
+        if self.failure_streak:
+            backoff = min(self.interval * 2 ** self.failure_streak, self.backoff_max)
+            return max(backoff, self.interval) + self._jitter()
+        return self.interval + self._jitter()
+
+    def _first_run_at(self):
+        """Catch up once after downtime instead of replaying every missed interval"""
+        db = self.session_factory()
+        try:
+            # Unchanged scrapes only move last_seen_at of the row they repeated
+            latest = max(filter(None, db.query(func.max(Trend.datetime), func.max(Trend.last_seen_at)).one()), default=None)
+        finally:
+            db.close()
+
+        now = datetime.utcnow()
+        if latest is None or now - latest >= timedelta(seconds=self.interval):
+            return now + timedelta(seconds=self._jitter())
+        return latest + timedelta(seconds=self.interval + self._jitter())
+
+    async def _sleep_until(self, when):
+        delay = (when - datetime.utcnow()).total_seconds()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _loop(self):
+        try:
+            self.next_run_at = await asyncio.to_thread(self._first_run_at)
+        except Exception as e:
+            logger.error(f"Scheduler could not read the last scrape time: {e}")
+            self.next_run_at = datetime.utcnow()
+
+        while True:
+            await self._sleep_until(self.next_run_at)
+            try:
+                delay = await self._tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduled scrape failed: {e}")
+                self.failure_streak += 1
+                self.last_status, self.last_error = "failed", str(e)
+                delay = self._delay_after_run()
+            if self.is_leader:
+                # Hold the lease through the wait (including backoff) so standbys don't take over
+                self.is_leader = await asyncio.to_thread(self._acquire_lease, delay + self.lease_seconds)
+            self.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
+            logger.info(f"Next scheduled scrape at {self.next_run_at.isoformat()}")
+
+    async def _tick(self):
+        """Run one scheduled scrape if this replica holds the lease, returns the next delay"""
+        self.is_leader = await asyncio.to_thread(self._acquire_lease)
+        if not self.is_leader:
+            self.last_status = "standby"
+            return self.interval + self._jitter()
+
+        started = datetime.utcnow()
+        self.last_run_at = started
+        if self.scrape_fn:
+            job, created = self.job_queue.submit("fanout", self.scrape_fn)
+        else:
+            job, created = self.job_queue.submit()
+        if not created:
+            logger.info(f"Scheduled scrape joined in-flight job {job.id}")
+        renew_at = time.monotonic() + self.lease_seconds / 3
+        while not job.finished.is_set():
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            if time.monotonic() < renew_at or job.finished.is_set():
+                continue
+            # A scrape can outlast the lease; renew it or a standby starts a second one
+            if not await self._renew_lease():
+                logger.warning(f"Lost the scheduler lease while job {job.id} was running, standing by")
+                self.last_status = "standby"
+                return self.interval + self._jitter()
+            renew_at = time.monotonic() + self.lease_seconds / 3
+        self.last_duration = round((datetime.utcnow() - started).total_seconds(), 3)
+
+        if job.state == "succeeded" and not job.error:
+            self.failure_streak = 0
+            self.last_status, self.last_error = "succeeded", None
+        else:
+            self.failure_streak += 1
+            self.last_status, self.last_error = "failed", job.error
+            logger.warning(f"Scheduled scrape failed ({self.failure_streak} in a row): {job.error}")
+
+        return self._delay_after_run()
+
+    # -------------------- DB lease --------------------
+
+    def _acquire_lease(self, seconds=None):
+        return acquire_lease(self.session_factory, LEASE_NAME, self.holder, seconds or self.lease_seconds)
+
+    async def _renew_lease(self):
+        try:
+            self.is_leader = await asyncio.to_thread(self._acquire_lease)
+        except Exception as e:
+            logger.error(f"Could not renew the scheduler lease: {e}")
+            self.is_leader = False
+        return self.is_leader
+
+    def _release_lease(self):
+        release_lease(self.session_factory, LEASE_NAME, self.holder)
+        self.is_leader = False
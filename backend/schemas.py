@@ -0,0 +1,36 @@
+import datetime as dt
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+# Response models for the trend read endpoints. Routes serve pre-encoded (cached)
+# bodies, so these document the contract rather than validate every response.
+
+
+class TrendOut(BaseModel):
+    id: str
+    trend1: Optional[str] = None
+    trend2: Optional[str] = None
+    trend3: Optional[str] = None
+    trend4: Optional[str] = None
+    trend5: Optional[str] = None
+    datetime: Optional[dt.datetime] = None
+    ip: Optional[str] = None
+    account: Optional[str] = None
+    location: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = None
+    last_seen_at: Optional[dt.datetime] = None
+    seen_count: Optional[int] = None
+    diff: Optional[Dict[str, Any]] = None
+    resolution: Optional[str] = None  # "raw", or "hour" / "day" for rollups of older history
+
+
+class TrendResponse(BaseModel):
+    status: str
+    data: TrendOut
+
+
+class TrendPage(BaseModel):
+    status: str
+    total: int
+    next_cursor: Optional[str] = None
+    data: List[TrendOut]
@@ -1,7 +1,4 @@
 import time
-import random
-import requests
-import json
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -12,6 +9,13 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 import os
 from dotenv import load_dotenv
 import logging
+from driver_pool import DriverPool, SessionStore
+from proxy_pool import ProxyPool
+from timing import TimingProfile
+from resources import ResourcePolicy
+from transport import transport
+from fetchers import TrendFetcher, HttpTrendFetcher, FetchUnavailable, SCRAPE_BACKEND, USER_AGENT
+from extraction import TrendExtractor, collect_candidates, MIN_TRENDS
 
 # Load environment variables
 load_dotenv()
@@ -20,171 +24,100 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Site root; point it at a stub page server to exercise the scraper without X.com
+X_BASE_URL = os.getenv("X_BASE_URL", "https://x.com").rstrip("/")
+
+# Timeout budget (seconds) for each scrape phase; every wait returns as soon as its condition holds
+PHASE_TIMEOUTS = {
+    "navigate": int(os.getenv("SCRAPE_TIMEOUT_NAVIGATE", "20")),
+    "username": int(os.getenv("SCRAPE_TIMEOUT_USERNAME", "15")),
+    "password": int(os.getenv("SCRAPE_TIMEOUT_PASSWORD", "15")),
+    "login_confirm": int(os.getenv("SCRAPE_TIMEOUT_LOGIN_CONFIRM", "30")),
+    "extract": int(os.getenv("SCRAPE_TIMEOUT_EXTRACT", "15")),
+}
+
+NEXT_BUTTON_XPATH = '//*[@role="button" and .//span[text()="Next"]]'
+LOGIN_BUTTON_XPATH = '//*[@role="button" and .//span[text()="Log in"]]'
+EMAIL_INPUT_SELECTOR = 'input[data-testid="ocfEnterTextTextInput"]'
+LOGGED_IN_SELECTOR = '[data-testid="SideNav_AccountSwitcher_Button"], [aria-label="Account menu"]'
+TREND_READY_SELECTOR = '[data-testid="trend"], [data-testid="cellInnerDiv"]'
+
 class ProxyManager:
-    """Manages free proxy fetching and validation"""
+    """Manages free proxy fetching and validation (backed by a persistent ProxyPool)"""
     
-    def __init__(self):
-        # Static list of working free proxies (updated from free-proxy-list.net)
-        self.static_proxies = [
-            "8.208.97.82:3129",
-            "57.129.81.201:8080", 
-            "32.223.6.94:80",
-            "94.130.104.137:8080",
-            "192.177.139.220:8000",
-            "194.59.204.87:9080",
-            "200.174.198.86:8888",
-            "152.53.107.230:80",
-            "91.132.92.150:80",
-            "143.42.66.91:80",
-            "116.107.169.233:10001",
-            "123.141.181.22:5031",
-            "51.20.192.194:3128",
-            "178.18.244.8:8888",
-            "113.160.132.195:8080",
-            "123.141.181.12:5031",
-            "198.23.236.47:1111",
-            "91.84.99.28:80",
-            "38.147.98.190:8080",
-            "37.187.74.125:80"
-        ]
-        
-        # Free proxy APIs
-        self.proxy_apis = [
-            "https://api.proxyscrape.com/v2/?request=get&protocol=http&timeout=10000&country=all&ssl=all&anonymity=all",
-            "https://raw.githubusercontent.com/TheSpeedX/PROXY-List/master/http.txt",
-            "https://raw.githubusercontent.com/proxifly/free-proxy-list/main/proxies/all.txt",
-            "https://www.proxy-list.download/api/v1/get?type=http"
-        ]
+    def __init__(self, pool=None):
+        self.pool = pool or ProxyPool()
         
     def fetch_fresh_proxies(self):
         """Fetch fresh proxies from free APIs"""
-        fresh_proxies = []
-        
-        for api_url in self.proxy_apis:
-            try:
-                logger.info(f"Fetching proxies from: {api_url}")
-                response = requests.get(api_url, timeout=10)
-                
-                if response.status_code == 200:
-                    content = response.text.strip()
-                    
-                    # Parse different formats
-                    if "proxyscrape" in api_url:
-                        # JSON format
-                        try:
-                            data = json.loads(content)
-                            if 'proxies' in data:
-                                for proxy in data['proxies']:
-                                    fresh_proxies.append(f"{proxy['ip']}:{proxy['port']}")
-                        except:
-                            # Text format fallback
-                            proxies = content.split('\n')
-                            fresh_proxies.extend([p.strip() for p in proxies if ':' in p])
-                    else:
-                        # Text format
-                        proxies = content.split('\n')
-                        fresh_proxies.extend([p.strip() for p in proxies if ':' in p and len(p.strip()) > 5])
-                        
-                    logger.info(f"Found {len(fresh_proxies)} proxies from {api_url}")
-                    
-            except Exception as e:
-                logger.warning(f"Failed to fetch from {api_url}: {e}")
-                continue
-        
-        # Remove duplicates and combine with static
-        all_proxies = list(set(fresh_proxies + self.static_proxies))
-        logger.info(f"Total unique proxies available: {len(all_proxies)}")
-        
-        return all_proxies[:50]  # Return first 50 proxies
+        return self.pool.fetch_candidates()
     
     def test_proxy(self, proxy_ip_port, timeout=10):
         """Test if proxy is working"""
-        try:
-            proxy_dict = {
-                'http': f'http://{proxy_ip_port}',
-                'https': f'http://{proxy_ip_port}'
-            }
-            
-            response = requests.get('http://httpbin.org/ip', 
-                                  proxies=proxy_dict, 
-                                  timeout=timeout)
-            
-            if response.status_code == 200:
-                result_ip = response.json().get('origin', '').split(',')[0]
-                logger.info(f"Proxy {proxy_ip_port} working - IP: {result_ip}")
-                return True, result_ip
-            
-        except Exception as e:
-            logger.debug(f"Proxy {proxy_ip_port} failed: {e}")
-            
-        return False, None
+        ok, ip, _ = self.pool.check(proxy_ip_port, timeout)
+        return ok, ip
     
     def get_working_proxy(self):
-        """Get a random working proxy"""
-        # Try fresh proxies first
-        proxies = self.fetch_fresh_proxies()
-        
-        # Shuffle for randomness
-        random.shuffle(proxies)
-        
-        # Test proxies until we find a working one
-        for proxy in proxies[:10]:  # Test first 10
-            is_working, ip = self.test_proxy(proxy, timeout=8)
-            if is_working:
-                return proxy, ip
-        
-        logger.warning("No working proxy found, using direct connection")
-        return None, None
+        """Get a known-good proxy from the pool"""
+        return self.pool.get()
+    
+    def report(self, proxy, ok):
+        """Tell the pool whether a proxy worked for a real scrape"""
+        self.pool.report(proxy, ok)
+
+class BrowserTrendFetcher(TrendFetcher):
+    """Logs in with a pooled Chrome (or reuses its session) and reads the rendered trends"""
+
+    name = "browser"
+
+    def __init__(self, scraper):
+        self.scraper = scraper
+
+    def fetch(self, profile, info):
+        return self.scraper.fetch_with_browser(profile, info)
 
 class TwitterTrendingScraper:
-    def __init__(self):
-        self.username = os.getenv("TWITTER_USERNAME")
-        self.password = os.getenv("TWITTER_PASSWORD")
-        self.email = os.getenv("TWITTER_EMAIL")
+    """Scrapes trends for one account.
+
+    ``proxy`` is the proxy policy: ``"pool"`` (best proxy from the ProxyPool),
+    ``"direct"`` (no proxy) or an explicit ``host:port``. ``location`` only tags
+    the results; the account itself decides which region X shows trends for.
+    Several scrapers can share one ``driver_pool``; drivers are keyed by proxy
+    policy so a scraper never borrows a browser routed through another proxy.
+    ``resource_policy`` decides which requests the browser blocks. ``backend``
+    is ``"browser"`` or ``"http"`` (JSON endpoints with the saved login, and the
+    browser only when that login is missing or rejected).
+    """
+
+    def __init__(self, username=None, password=None, email=None, location=None,
+                 proxy="pool", driver_pool=None, proxy_manager=None, resource_policy=None,
+                 backend=SCRAPE_BACKEND):
+        self.username = username or os.getenv("TWITTER_USERNAME")
+        self.password = password or os.getenv("TWITTER_PASSWORD")
+        self.email = email or os.getenv("TWITTER_EMAIL")
+        self.location = location
+        self.proxy_policy = proxy or "pool"
         self.current_ip = None
-        self.proxy_manager = ProxyManager()
+        self.proxy_manager = proxy_manager or ProxyManager()
+        self.resource_policy = resource_policy or ResourcePolicy()
+        self.session_store = SessionStore()
+        self.driver_pool = driver_pool or DriverPool(self.launch_driver)
+        
+        # Tried in order; a FetchUnavailable from one hands the scrape to the next
+        self.fetchers = [BrowserTrendFetcher(self)]
+        if backend == "http":
+            self.fetchers.insert(0, HttpTrendFetcher(self.username, self.resolve_proxy, self.session_store,
+                                                       report_proxy=self.proxy_manager.report))
+        elif backend != "browser":
+            logger.warning(f"Unknown SCRAPE_BACKEND {backend!r}, using the browser")
         
         # Validate credentials
         if not self.username or not self.password:
             logger.warning("Twitter credentials not found in environment variables")
     
     def get_current_ip(self, proxy=None):
-        """Get current IP address"""
-        try:
-            proxies = None
-            if proxy:
-                proxies = {
-                    "http": f"http://{proxy}",
-                    "https": f"http://{proxy}"
-                }
-            
-            # Try multiple IP detection services
-            services = [
-                "https://httpbin.org/ip",
-                "https://api.ipify.org?format=json",
-                "https://ipinfo.io/ip"
-            ]
-            
-            for service in services:
-                try:
-                    response = requests.get(service, proxies=proxies, timeout=10)
-                    if "json" in service:
-                        if "ipify" in service:
-                            return response.json().get("ip", "Unknown")
-                        elif "httpbin" in service:
-                            return response.json().get("origin", "Unknown").split(',')[0]
-                        else:
-                            return response.text.strip()
-                    else:
-                        return response.text.strip()
-                except Exception as e:
-                    logger.debug(f"IP service {service} failed: {e}")
-                    continue
-            
-            return "Unknown"
-        except Exception as e:
-            logger.error(f"Failed to get IP: {e}")
-            return "127.0.0.1"
+        """Get current IP address (cached per proxy for EGRESS_IP_TTL seconds)"""
+        return transport.egress_ip(proxy)
     
     def setup_driver(self, proxy=None):
         """Setup Chrome driver with optional proxy support"""
@@ -197,7 +130,7 @@ class TwitterTrendingScraper:
         chrome_options.add_argument("--window-size=1920,1080")
         
         # Updated User Agent
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+        chrome_options.add_argument(f"--user-agent={USER_AGENT}")
         
         # Add proxy if provided
         if proxy:
@@ -208,13 +141,14 @@ class TwitterTrendingScraper:
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
-        # Performance optimizations
+        # Performance optimizations: skip images/media/fonts/trackers and stop waiting at DOMContentLoaded
         prefs = {
             "profile.default_content_setting_values.notifications": 2,
             "profile.default_content_settings.popups": 0,
-            "profile.managed_default_content_settings.images": 1,
+            **self.resource_policy.prefs(),
         }
         chrome_options.add_experimental_option("prefs", prefs)
+        self.resource_policy.configure(chrome_options)
         
         # Headless mode for production (comment out for debugging)
         chrome_options.add_argument("--headless")
@@ -224,205 +158,206 @@ class TwitterTrendingScraper:
             
             # Execute script to hide automation
             driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            self.resource_policy.apply(driver)
             
             driver.set_page_load_timeout(60)
-            driver.implicitly_wait(10)
+            # No implicit wait: every lookup that needs to wait uses an explicit condition
+            driver.implicitly_wait(0)
             
             return driver
         except Exception as e:
             logger.error(f"Failed to setup driver: {e}")
             return None
     
-    def login_to_twitter(self, driver):
-        """Enhanced Twitter login with better error handling"""
+    def resolve_proxy(self):
+        """(proxy, IP) for the proxy policy; proxy is None for a direct connection"""
+        if self.proxy_policy == "direct":
+            proxy, proxy_ip = None, None
+        elif self.proxy_policy != "pool":
+            proxy, proxy_ip = self.proxy_policy, None
+        else:
+            # Get a working proxy for IP rotation
+            proxy, proxy_ip = self.proxy_manager.get_working_proxy()
+        
+        if proxy:
+            logger.info(f"Using proxy: {proxy} (IP: {proxy_ip})")
+            current_ip = proxy_ip or "Unknown"
+        else:
+            logger.info("Using direct connection (no proxy)")
+            current_ip = self.get_current_ip()
+        return proxy, current_ip
+    
+    def launch_driver(self, profile=None):
+        """Cold-start a driver for the pool, picking a proxy and resolving its IP"""
+        profile = profile or TimingProfile()
+        with profile.phase("proxy", parent="driver"):
+            proxy, current_ip = self.resolve_proxy()
+        
+        # Setup driver with or without proxy
+        with profile.phase("driver_setup", parent="driver"):
+            driver = self.setup_driver(proxy)
+        if not driver:
+            raise Exception("Failed to setup Chrome driver")
+        
+        # Verify IP after driver setup
         try:
-            logger.info("Navigating to Twitter login page")
-            driver.get("https://x.com/i/flow/login")
-            time.sleep(5)
-            
-            # Wait for and enter username
-            logger.info("Entering username")
-            username_input = WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'input[autocomplete="username"]'))
+            final_ip = self.get_current_ip(proxy)
+            if final_ip and final_ip != "Unknown":
+                current_ip = final_ip
+            self.proxy_manager.report(proxy, final_ip not in (None, "Unknown"))
+            logger.info(f"Final IP address: {current_ip}")
+        except:
+            pass
+        
+        return driver, {"proxy": proxy, "ip": current_ip}
+    
+    def is_logged_in(self, driver, timeout=10):
+        """Check whether the driver has a live logged-in session"""
+        try:
+            driver.get(f"{X_BASE_URL}/home")
+            WebDriverWait(driver, timeout).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, LOGGED_IN_SELECTOR))
             )
-            username_input.clear()
-            username_input.send_keys(self.username)
-            time.sleep(2)
-            
-            # Click Next button
-            next_buttons = driver.find_elements(By.XPATH, '//span[text()="Next"]/parent::*/parent::*')
-            if not next_buttons:
-                next_buttons = driver.find_elements(By.XPATH, '//*[@role="button" and .//span[text()="Next"]]')
-            
-            if next_buttons:
-                next_buttons[0].click()
+            return True
+        except Exception:
+            return False
+    
+    def ensure_logged_in(self, pooled, profile=None):
+        """Reuse the pooled or saved session when possible, otherwise log in"""
+        profile = profile or TimingProfile()
+        driver = pooled.driver
+        
+        if pooled.logged_in_as == self.username:
+            with profile.phase("session_check"):
+                logged_in = self.is_logged_in(driver)
+            if logged_in:
+                logger.info("Reusing logged-in pooled driver")
+                return True
+        
+        with profile.phase("session_restore"):
+            restored = self.session_store.restore(self.username, driver) and self.is_logged_in(driver)
+        
+        if restored:
+            logger.info("Reusing saved login session")
+        elif not self.login_to_twitter(driver, profile):
+            self.session_store.clear(self.username)
+            return False
+        
+        self.session_store.save(self.username, driver)
+        pooled.logged_in_as = self.username
+        return True
+    
+    def login_to_twitter(self, driver, profile=None):
+        """Enhanced Twitter login with better error handling"""
+        profile = profile or TimingProfile()
+        try:
+            with profile.phase("navigate"):
+                logger.info("Navigating to Twitter login page")
+                driver.get(f"{X_BASE_URL}/i/flow/login")
+                username_input = WebDriverWait(driver, PHASE_TIMEOUTS["navigate"]).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, 'input[autocomplete="username"]'))
+                )
+            
+            with profile.phase("username"):
+                # Enter username and click Next
+                logger.info("Entering username")
+                username_input.clear()
+                username_input.send_keys(self.username)
+                
+                next_button = WebDriverWait(driver, PHASE_TIMEOUTS["username"]).until(
+                    EC.element_to_be_clickable((By.XPATH, NEXT_BUTTON_XPATH))
+                )
+                next_button.click()
                 logger.info("Clicked Next button")
-                time.sleep(3)
+                
+                # X either asks for the password or for an email check next
+                WebDriverWait(driver, PHASE_TIMEOUTS["username"]).until(EC.any_of(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, 'input[name="password"]')),
+                    EC.presence_of_element_located((By.CSS_SELECTOR, EMAIL_INPUT_SELECTOR))
+                ))
             
             # Check if email verification is needed
-            try:
-                email_input = driver.find_element(By.CSS_SELECTOR, 'input[data-testid="ocfEnterTextTextInput"]')
-                if email_input and self.email:
+            email_inputs = driver.find_elements(By.CSS_SELECTOR, EMAIL_INPUT_SELECTOR)
+            if email_inputs and self.email:
+                with profile.phase("email_verification"):
                     logger.info("Email verification required, entering email")
-                    email_input.send_keys(self.email)
-                    time.sleep(2)
+                    email_inputs[0].send_keys(self.email)
                     
-                    # Click Next again
-                    next_button = WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, '//span[text()="Next"]/parent::*/parent::*'))
+                    next_button = WebDriverWait(driver, PHASE_TIMEOUTS["username"]).until(
+                        EC.element_to_be_clickable((By.XPATH, NEXT_BUTTON_XPATH))
                     )
                     next_button.click()
-                    time.sleep(3)
-            except:
-                pass  # Email verification not needed
-            
-            # Enter password
-            logger.info("Entering password")
-            password_input = WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, 'input[name="password"]'))
-            )
-            password_input.clear()
-            password_input.send_keys(self.password)
-            time.sleep(2)
-            
-            # Click Login button
-            login_buttons = driver.find_elements(By.XPATH, '//span[text()="Log in"]/parent::*/parent::*')
-            if not login_buttons:
-                login_buttons = driver.find_elements(By.XPATH, '//*[@role="button" and .//span[text()="Log in"]]')
             
-            if login_buttons:
-                login_buttons[0].click()
+            with profile.phase("password"):
+                logger.info("Entering password")
+                password_input = WebDriverWait(driver, PHASE_TIMEOUTS["password"]).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, 'input[name="password"]'))
+                )
+                password_input.clear()
+                password_input.send_keys(self.password)
+                
+                login_button = WebDriverWait(driver, PHASE_TIMEOUTS["password"]).until(
+                    EC.element_to_be_clickable((By.XPATH, LOGIN_BUTTON_XPATH))
+                )
+                login_button.click()
                 logger.info("Clicked Login button")
             
-            # Wait for successful login with multiple checks
-            login_success = False
-            for attempt in range(6):  # Wait up to 60 seconds
-                time.sleep(10)
-                current_url = driver.current_url.lower()
-                
-                if any(indicator in current_url for indicator in ['home', 'x.com/', 'twitter.com/']):
-                    # Additional check - look for user-specific elements
-                    try:
-                        # Look for elements that indicate successful login
-                        user_elements = driver.find_elements(By.CSS_SELECTOR, '[data-testid="SideNav_AccountSwitcher_Button"]')
-                        if not user_elements:
-                            user_elements = driver.find_elements(By.CSS_SELECTOR, '[aria-label="Account menu"]')
-                        
-                        if user_elements:
-                            login_success = True
-                            break
-                    except:
-                        pass
-                
-                logger.info(f"Login attempt {attempt + 1}/6, current URL: {current_url}")
+            # Wait for an element that only exists for a logged-in user
+            with profile.phase("login_confirm"):
+                WebDriverWait(driver, PHASE_TIMEOUTS["login_confirm"]).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, LOGGED_IN_SELECTOR))
+                )
             
-            if login_success:
-                logger.info("Successfully logged in to Twitter")
-                return True
-            else:
-                logger.error("Login verification failed")
-                return False
+            logger.info("Successfully logged in to Twitter")
+            return True
                 
         except TimeoutException as e:
-            logger.error(f"Login timeout: {e}")
+            logger.error(f"Login timeout (current URL: {driver.current_url}): {e}")
             return False
         except Exception as e:
             logger.error(f"Login failed: {e}")
             return False
     
-    def extract_trending_topics(self, driver):
+    def extract_trending_topics(self, driver, profile=None):
         """Extract trending topics with improved selectors"""
+        profile = profile or TimingProfile()
         try:
             logger.info("Looking for trending topics...")
             
             # Try different pages where trends might be visible
             pages_to_try = [
-                "https://x.com/explore/tabs/trending",
-                "https://x.com/explore",
-                "https://x.com/home"
+                "explore/tabs/trending",
+                "explore",
+                "home"
             ]
             
-            trends = []
+            extractor = TrendExtractor()
+            fallback_texts = []
             
-            for page_url in pages_to_try:
+            for page in pages_to_try:
+                page_url = f"{X_BASE_URL}/{page}"
                 try:
-                    logger.info(f"Trying to extract trends from: {page_url}")
-                    driver.get(page_url)
-                    time.sleep(8)  # Wait for page to load
-                    
-                    # Scroll down a bit to load more content
-                    driver.execute_script("window.scrollTo(0, 500);")
-                    time.sleep(3)
-                    
-                    # Multiple selectors for trending topics
-                    trend_selectors = [
-                        # New X.com selectors
-                        '[data-testid="trend"]',
-                        '[data-testid="trendItem"]',
-                        '.css-1dbjc4n[role="button"] span[dir="ltr"]',
-                        'div[data-testid="cellInnerDiv"] span',
-                        
-                        # Legacy selectors
-                        '.trend-item span',
-                        '.trending-topic',
-                        'span.css-901oao.css-16my406',
+                    with profile.phase(f"extract:{page}"):
+                        logger.info(f"Trying to extract trends from: {page_url}")
+                        driver.get(page_url)
+                        WebDriverWait(driver, PHASE_TIMEOUTS["extract"]).until(
+                            EC.presence_of_element_located((By.CSS_SELECTOR, TREND_READY_SELECTOR))
+                        )
                         
-                        # Generic text selectors
-                        'span[dir="ltr"]',
-                        'div[role="button"] span'
-                    ]
-                    
-                    for selector in trend_selectors:
+                        # Scroll down a bit to load more content, then wait for trend rows to render
+                        driver.execute_script("window.scrollTo(0, 500);")
                         try:
-                            elements = driver.find_elements(By.CSS_SELECTOR, selector)
-                            logger.info(f"Found {len(elements)} elements with selector: {selector}")
-                            
-                            for element in elements:
-                                try:
-                                    text = element.text.strip()
-                                    
-                                    # Filter out unwanted text
-                                    unwanted_phrases = [
-                                        'sign up', 'log in', 'create account', 'new to x', 
-                                        'don\'t miss', 'happening', 'first to know',
-                                        'terms of service', 'privacy policy', 'cookie',
-                                        'accessibility', 'ads info', 'Â© 20', 'corp',
-                                        'follow', 'tweet', 'retweet', 'like', 'reply',
-                                        'explore', 'notifications', 'messages', 'bookmarks',
-                                        'home', 'profile', 'more', 'trending', 'for you',
-                                        'what\'s happening', 'show more'
-                                    ]
-                                    
-                                    # Check if text is valid trend
-                                    if (text and 
-                                        len(text) > 2 and 
-                                        len(text) < 100 and
-                                        text.lower() not in [t.lower() for t in trends] and
-                                        not any(phrase in text.lower() for phrase in unwanted_phrases) and
-                                        not text.startswith('http') and
-                                        not text.isdigit() and
-                                        not text.lower().endswith(' posts') and
-                                        not text.lower().endswith('k posts') and
-                                        not text.lower().endswith(' tweets') and
-                                        'k post' not in text.lower()):
-                                        
-                                        trends.append(text)
-                                        logger.info(f"Added trend: {text}")
-                                        
-                                        if len(trends) >= 5:
-                                            break
-                                
-                                except Exception as e:
-                                    continue
-                            
-                            if len(trends) >= 5:
-                                break
+                            WebDriverWait(driver, 3).until(
+                                lambda d: len(d.find_elements(By.CSS_SELECTOR, '[data-testid="trend"]')) >= 5
+                            )
+                        except TimeoutException:
+                            pass
                         
-                        except Exception as e:
-                            logger.warning(f"Selector {selector} failed: {e}")
-                            continue
+                        # Pull every candidate text in one call and filter locally
+                        groups, fallback_texts = collect_candidates(driver)
+                        extractor.add_candidates(groups)
                     
-                    if len(trends) >= 3:  # If we found at least 3 good trends, stop
+                    if len(extractor.trends) >= MIN_TRENDS:  # If we found at least 3 good trends, stop
                         break
                         
                 except Exception as e:
@@ -430,32 +365,11 @@ class TwitterTrendingScraper:
                     continue
             
             # If we still don't have enough trends, try a more aggressive approach
-            if len(trends) < 3:
+            if len(extractor.trends) < MIN_TRENDS:
                 logger.info("Trying aggressive text extraction...")
-                try:
-                    # Get all text elements and filter them
-                    all_spans = driver.find_elements(By.TAG_NAME, "span")
-                    
-                    for span in all_spans:
-                        try:
-                            text = span.text.strip()
-                            if (text and 
-                                3 <= len(text) <= 50 and
-                                text.lower() not in [t.lower() for t in trends] and
-                                not any(phrase in text.lower() for phrase in [
-                                    'sign', 'log', 'account', 'x', 'twitter', 'home',
-                                    'explore', 'notification', 'message', 'bookmark'
-                                ]) and
-                                any(c.isalpha() for c in text)):  # Contains at least one letter
-                                
-                                trends.append(text)
-                                if len(trends) >= 5:
-                                    break
-                        except:
-                            continue
-                            
-                except Exception as e:
-                    logger.warning(f"Aggressive extraction failed: {e}")
+                extractor.add_fallback(fallback_texts)
+            
+            trends = extractor.trends
             
             # Generate fallback trends if needed
             current_topics = [
@@ -485,46 +399,45 @@ class TwitterTrendingScraper:
                 "Current Events"
             ]
     
+    def fetch_with_browser(self, profile, info):
+        """Browser fetcher: login (skipped when the session is still valid) and extraction"""
+        # Borrow a warm driver (or cold-start one with a fresh proxy; its steps are timed as sub-phases of "driver")
+        acquire_started = time.perf_counter()
+        with self.driver_pool.acquire(key=self.proxy_policy, factory=lambda: self.launch_driver(profile)) as pooled:
+            profile.record("driver", time.perf_counter() - acquire_started)
+            driver = pooled.driver
+            info["ip"] = pooled.meta.get("ip")
+            logger.info(f"Using {'new' if pooled.fresh else 'warm'} driver, IP: {info['ip']}")
+            self.resource_policy.reset(driver)
+            
+            try:
+                if not self.ensure_logged_in(pooled, profile):
+                    raise Exception("Failed to login to Twitter")
+                return self.extract_trending_topics(driver, profile)
+            finally:
+                info["network"] = self.resource_policy.usage(driver)
+    
     def scrape(self):
         """Main scraping function with IP rotation"""
-        driver = None
-        
+        profile = TimingProfile()
+        info = {}
         try:
             logger.info("Starting Twitter trending topics scraper with IP rotation")
             
-            # Get a working proxy for IP rotation
-            proxy, proxy_ip = self.proxy_manager.get_working_proxy()
-            
-            if proxy:
-                logger.info(f"Using proxy: {proxy} (IP: {proxy_ip})")
-                self.current_ip = proxy_ip
-            else:
-                logger.info("Using direct connection (no proxy)")
-                self.current_ip = self.get_current_ip()
-            
-            # Setup driver with or without proxy
-            driver = self.setup_driver(proxy)
-            if not driver:
-                raise Exception("Failed to setup Chrome driver")
-            
-            # Verify IP after driver setup
-            try:
-                final_ip = self.get_current_ip(proxy)
-                if final_ip and final_ip != "Unknown":
-                    self.current_ip = final_ip
-                logger.info(f"Final IP address: {self.current_ip}")
-            except:
-                pass
-            
-            # Login to Twitter
-            if not self.login_to_twitter(driver):
-                raise Exception("Failed to login to Twitter")
-            
-            # Wait after login
-            time.sleep(5)
-            
-            # Extract trending topics
-            trends = self.extract_trending_topics(driver)
+            for fetcher in self.fetchers:
+                info = {"backend": fetcher.name}
+                try:
+                    trends = fetcher.fetch(profile, info)
+                    break
+                except FetchUnavailable as e:
+                    if fetcher is self.fetchers[-1]:
+                        raise
+                    logger.warning(f"{fetcher.name} fetch unavailable ({e}), falling back")
+            self.current_ip = info.get("ip")
+            
+            network = info.get("network")
+            if network:
+                logger.info(f"Transferred {network['bytes'] / 1024:.0f} KB in {network['requests']} requests, blocked {network['blocked']}")
             
             # Prepare data for database
             data = {
@@ -533,12 +446,16 @@ class TwitterTrendingScraper:
                 "trend3": trends[2][:200] if len(trends) > 2 else "No trend available", 
                 "trend4": trends[3][:200] if len(trends) > 3 else "No trend available",
                 "trend5": trends[4][:200] if len(trends) > 4 else "No trend available",
-                "ip": self.current_ip
+                "ip": self.current_ip,
+                "account": self.username,
+                "location": self.location,
+                "timings": {**profile.to_dict(), "backend": info.get("backend"), "network": info.get("network")}
             }
             
             logger.info("Scraping completed successfully")
             logger.info(f"Using IP: {self.current_ip}")
             logger.info(f"Scraped trends: {[data[f'trend{i}'] for i in range(1, 6)]}")
+            logger.info(f"Scrape took {data['timings']['total_seconds']}s, slowest phase: {data['timings']['slowest_phase']}")
             return data
             
         except Exception as e:
@@ -550,16 +467,12 @@ class TwitterTrendingScraper:
                 "trend3": "Verify Twitter login details",
                 "trend4": "Check Chrome driver installation", 
                 "trend5": "Review server logs for details",
-                "ip": self.current_ip or "Unknown"
+                "ip": info.get("ip") or self.current_ip or "Unknown",
+                "account": self.username,
+                "location": self.location,
+                "timings": {**profile.to_dict(), "backend": info.get("backend"), "network": info.get("network")},
+                "error": str(e)
             }
-        
-        finally:
-            if driver:
-                try:
-                    driver.quit()
-                    logger.info("Chrome driver closed")
-                except:
-                    pass
 
 # Global scraper instance
 scraper_instance = TwitterTrendingScraper()
@@ -572,6 +485,7 @@ def scrape_trending_topics():
 if __name__ == "__main__":
     # Test the scraper
     result = scrape_trending_topics()
+    scraper_instance.driver_pool.close()
     print("\n" + "="*50)
     print("TWITTER TRENDING TOPICS SCRAPER RESULT")
     print("="*50)
@@ -0,0 +1,253 @@
+import os
+import re
+import math
+import logging
+from sqlalchemy import select, func, text, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from models import Topic, TopicStats, TrendEntry
+from canonical import normalize_topic
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Topics fetched from the index per query before ranking them in Python
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "200"))
+# Minimum trigram similarity (0..1) for a fuzzy-only match, like pg_trgm's default
+SEARCH_FUZZY_THRESHOLD = float(os.getenv("SEARCH_FUZZY_THRESHOLD", "0.3"))
+# Trigrams found in this many topics are too common to find fuzzy candidates with (SQLite)
+SEARCH_FUZZY_MAX_POSTINGS = int(os.getenv("SEARCH_FUZZY_MAX_POSTINGS", "5000"))
+
+# Better matches sort first; the score breaks ties within a kind
+MATCH_KINDS = {"exact": 3, "prefix": 2, "substring": 1, "fuzzy": 0}
+
+# The index covers topics (distinct normalized texts), not every snapshot:
+# PostgreSQL uses a pg_trgm GIN index on topics.normalized, SQLite an FTS5
+# trigram table kept in sync by triggers. Both answer substring queries from
+# the index and rank fuzzy candidates by shared trigrams.
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5(normalized, topic_id UNINDEXED, tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS topics_fts_insert AFTER INSERT ON topics BEGIN "
+    "INSERT INTO topics_fts (normalized, topic_id) VALUES (new.normalized, new.id); END",
+    "CREATE TRIGGER IF NOT EXISTS topics_fts_update AFTER UPDATE OF normalized ON topics BEGIN "
+    "UPDATE topics_fts SET normalized = new.normalized WHERE topic_id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS topics_fts_delete AFTER DELETE ON topics BEGIN "
+    "DELETE FROM topics_fts WHERE topic_id = old.id; END",
+]
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_topics_normalized_trgm ON topics USING gin (normalized gin_trgm_ops)",
+]
+
+
+def create_search_index(engine):
+    """Create the topic search index (and fill it on databases that already have topics)"""
+    if engine.dialect.name == "sqlite":
+        existed = "topics_fts" in inspect(engine).get_table_names()
+        with engine.begin() as conn:
+            for statement in SQLITE_SEARCH_DDL:
+                conn.execute(text(statement))
+            if not existed:
+                conn.execute(text("INSERT INTO topics_fts (normalized, topic_id) SELECT normalized, id FROM topics"))
+                logger.info("Built the topic search index")
+    elif engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as conn:
+                for statement in POSTGRES_SEARCH_DDL:
+                    conn.execute(text(statement))
+        except Exception as e:
+            logger.warning(f"Topic search index not created (needs the pg_trgm extension): {e}")
+
+
+# -------------------- Scoring --------------------
+
+def trigrams(value: str):
+    """pg_trgm style trigrams: each word padded with two spaces in front and one behind"""
+    grams = set()
+    for word in re.findall(r"\w+", value.casefold()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Share of trigrams two strings (or trigram sets) have in common, like pg_trgm's similarity()"""
+    a_grams = trigrams(a) if isinstance(a, str) else a
+    b_grams = trigrams(b) if isinstance(b, str) else b
+    if not a_grams or not b_grams:
+        return 0.0
+    shared = len(a_grams & b_grams)
+    return shared / (len(a_grams) + len(b_grams) - shared)
+
+
+def match_kind(query: str, normalized: str):
+    if normalized == query:
+        return "exact"
+    if re.search(r"(?<!\w)" + re.escape(query), normalized):
+        return "prefix"  # The query starts the topic or one of its words
+    if query in normalized:
+        return "substring"
+    return "fuzzy"
+
+
+# -------------------- Candidate lookup --------------------
+
+def _fts_phrase(value: str):
+    return '"' + value.replace('"', '""') + '"'
+
+
+async def _scalars(db: AsyncSession, statement, params=None):
+    return list((await db.execute(statement, params or {})).scalars())
+
+
+async def _rare_trigrams(db: AsyncSession, query: str):
+    """The query trigrams a fuzzy match must hit at least one of, rarest first.
+
+    A topic sharing SEARCH_FUZZY_THRESHOLD of the query's trigrams contains one
+    of any (n - ceil(threshold * n) + 1) of them, so only that many rarest ones
+    are searched. Trigrams in SEARCH_FUZZY_MAX_POSTINGS topics or more are too
+    common to narrow anything down and are left out.
+    """
+    grams = sorted({query[i:i + 3] for i in range(len(query) - 2)})
+    counts = []
+    for gram in grams:
+        # Counting stops at the cap, so a very common trigram costs no more than a rare one
+        count = (await db.execute(
+            text("SELECT count(*) FROM (SELECT 1 FROM topics_fts WHERE topics_fts MATCH :match LIMIT :cap)"),
+            {"match": _fts_phrase(gram), "cap": SEARCH_FUZZY_MAX_POSTINGS},
+        )).scalar()
+        if count < SEARCH_FUZZY_MAX_POSTINGS:
+            counts.append((count, gram))
+    needed = len(grams) - math.ceil(SEARCH_FUZZY_THRESHOLD * len(grams)) + 1
+    return [gram for _, gram in sorted(counts)[:needed]]
+
+
+async def _sqlite_stages(db: AsyncSession, query: str, fuzzy: bool, limit: int):
+    # Whole-topic prefix, from the unique index on normalized
+    yield await _scalars(
+        db, select(Topic.id).where(Topic.normalized >= query, Topic.normalized < query + "\U0010ffff").limit(limit)
+    )
+    if len(query) < 3:
+        return  # Too short for trigrams
+    # Substring anywhere; unordered, so FTS5 stops after `limit` rows
+    yield await _scalars(
+        db, text("SELECT topic_id FROM topics_fts WHERE topics_fts MATCH :match LIMIT :limit"),
+        {"match": _fts_phrase(query), "limit": limit},
+    )
+    if fuzzy:
+        grams = await _rare_trigrams(db, query)
+        if grams:
+            # bm25 puts topics sharing the most (and rarest) trigrams first
+            yield await _scalars(
+                db, text("SELECT topic_id FROM topics_fts WHERE topics_fts MATCH :match ORDER BY rank LIMIT :limit"),
+                {"match": " OR ".join(_fts_phrase(gram) for gram in grams), "limit": limit},
+            )
+
+
+async def _postgres_stages(db: AsyncSession, query: str, fuzzy: bool, limit: int):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    yield await _scalars(db, select(Topic.id).where(Topic.normalized.like(f"{escaped}%")).limit(limit))
+    if len(query) < 3:
+        return
+    yield await _scalars(db, select(Topic.id).where(Topic.normalized.like(f"%{escaped}%")).limit(limit))
+    if fuzzy:
+        # % is pg_trgm's similarity operator, answered from the GIN index
+        yield await _scalars(
+            db,
+            select(Topic.id).where(Topic.normalized.op("%")(query))
+            .order_by(func.similarity(Topic.normalized, query).desc()).limit(limit)
+        )
+
+
+async def _topic_rows(db: AsyncSession, topic_ids: list, since=None, until=None):
+    """Name, counts and first/last seen of topics, inside [since, until) when given"""
+    if since or until:
+        conditions = [TrendEntry.topic_id.in_(topic_ids)]
+        if since:
+            conditions.append(TrendEntry.datetime >= since)
+        if until:
+            conditions.append(TrendEntry.datetime < until)
+        counts = (
+            select(
+                TrendEntry.topic_id,
+                func.count().label("appearances"),
+                func.min(TrendEntry.rank).label("best_rank"),
+                func.min(TrendEntry.datetime).label("first_seen"),
+                func.max(TrendEntry.datetime).label("last_seen")
+            )
+            .where(*conditions)
+            .group_by(TrendEntry.topic_id)
+            .subquery()
+        )
+        query = (
+            select(Topic.id, Topic.name, Topic.normalized, counts.c.appearances, counts.c.best_rank,
+                   counts.c.first_seen, counts.c.last_seen)
+            .join(counts, counts.c.topic_id == Topic.id)
+        )
+    else:
+        query = (
+            select(Topic.id, Topic.name, Topic.normalized, TopicStats.appearances, TopicStats.best_rank,
+                   TopicStats.first_seen, TopicStats.last_seen)
+            .join(TopicStats, TopicStats.topic_id == Topic.id)
+            .where(Topic.id.in_(topic_ids))
+        )
+    return (await db.execute(query)).all()
+
+
+# -------------------- Search --------------------
+
+async def search_topics(db: AsyncSession, q: str, fuzzy: bool = True, since=None, until=None, limit: int = 20):
+    """Topics matching q, best match first.
+
+    Candidates come from the index in stages (prefix, substring, fuzzy); the
+    fuzzy stage is skipped once the earlier ones found `limit` topics, since
+    fuzzy matches rank below them anyway. Without a time range the counts come
+    from topic_stats; with one they are counted from trend_entries inside the
+    range and topics that did not trend in it are dropped.
+    """
+    query = normalize_topic(q)
+    if not query:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        stages = _postgres_stages(db, query, fuzzy, SEARCH_CANDIDATES)
+    else:
+        stages = _sqlite_stages(db, query, fuzzy, SEARCH_CANDIDATES)
+
+    query_grams = trigrams(query)
+    matches, seen, strong = [], set(), 0
+    async for candidate_ids in stages:
+        candidate_ids = [topic_id for topic_id in candidate_ids if topic_id not in seen]
+        seen.update(candidate_ids)
+        if not candidate_ids:
+            continue
+        for row in await _topic_rows(db, candidate_ids, since, until):
+            kind = match_kind(query, row.normalized)
+            score = similarity(query_grams, row.normalized)
+            if kind == "fuzzy" and (not fuzzy or score < SEARCH_FUZZY_THRESHOLD):
+                continue
+            strong += kind != "fuzzy"
+            data = row._asdict()
+            del data["normalized"]
+            matches.append({"topic_id": data.pop("id"), **data, "match": kind, "score": round(score, 3)})
+        if strong >= limit:
+            break
+
+    matches.sort(key=lambda m: (MATCH_KINDS[m["match"]], m["score"], m["appearances"]), reverse=True)
+    return matches[:limit]
+
+
+async def search_trend_entries(db: AsyncSession, topic_ids: list, since=None, until=None, limit: int = 50):
+    """Every time one of the topics trended (newest first)"""
+    if not topic_ids:
+        return []
+    query = (
+        select(TrendEntry.trend_id, TrendEntry.topic_id, TrendEntry.text, TrendEntry.rank, TrendEntry.datetime)
+        .where(TrendEntry.topic_id.in_(topic_ids))
+    )
+    if since:
+        query = query.where(TrendEntry.datetime >= since)
+    if until:
+        query = query.where(TrendEntry.datetime < until)
+    result = await db.execute(query.order_by(TrendEntry.datetime.desc(), TrendEntry.id.desc()).limit(limit))
+    return [row._asdict() for row in result.all()]
@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# Backend modules are imported by name, as when the API runs from backend/
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Always use the SQLite fallback: nothing listens on the discard port
+os.environ["DATABASE_HOST"] = "127.0.0.1"
+os.environ["DATABASE_PORT"] = "9"
+
+# The fallback database, sessions and profiles live relative to the working directory
+os.chdir(tempfile.mkdtemp(prefix="trends-tests-"))
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
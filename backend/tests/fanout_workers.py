@@ -0,0 +1,78 @@
+"""Fan-out worker functions for the tests: importable by name in spawned processes.
+
+``scrape_worker`` runs the real fanout.scrape_target (scraper, driver pool,
+proxy pool) with Chrome replaced by a FakeDriver serving the saved explore
+page. ``stub_worker`` mirrors it with a fixed scrape time, for the timing and
+crash cases; its explore page is served by a local stub (FANOUT_STUB_URL).
+"""
+import os
+import time
+import requests
+from driver_pool import DriverPool, FakeDriver, SessionStore
+from extraction import extract_from_html, candidates_from_html, COLLECT_SCRIPT
+
+SCRAPE_SECONDS = 0.5
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "explore_trending.html")
+
+_pool = DriverPool(lambda: (FakeDriver(), {"ip": "198.51.100.7"}), size=1)
+
+
+class ExploreDriver(FakeDriver):
+    """A logged-in FakeDriver whose pages all show the saved explore page"""
+
+    def __init__(self):
+        from scraper import LOGGED_IN_SELECTOR, TREND_READY_SELECTOR
+
+        super().__init__(elements={LOGGED_IN_SELECTOR: [object()], TREND_READY_SELECTOR: [object()],
+                                   '[data-testid="trend"]': [object()] * 5})
+        with open(FIXTURE, encoding="utf-8") as f:
+            self.page = f.read()
+
+    def execute_script(self, script, *args):
+        if script == COLLECT_SCRIPT:
+            groups, fallback = candidates_from_html(self.page)
+            return groups + [fallback]
+        return super().execute_script(script, *args)
+
+
+def _fake_browser(account):
+    """Swap Chrome for an ExploreDriver in this worker process and save a login to restore"""
+    import proxy_pool
+
+    # Only the stub's proxy list (PROXY_LIST_URLS), never the built-in internet proxies
+    proxy_pool.STATIC_PROXIES[:] = []
+    from scraper import TwitterTrendingScraper
+
+    TwitterTrendingScraper.setup_driver = lambda self, proxy=None: ExploreDriver()
+    if SessionStore().load(account) is None:
+        SessionStore().save(account, FakeDriver())
+
+
+def scrape_worker(target):
+    import fanout
+
+    _fake_browser(target["account"])
+    data = fanout.scrape_target(target)
+    return {**data, "pid": os.getpid(), "cold_starts": fanout._worker_driver_pool().stats()["cold_starts"]}
+
+
+def stub_worker(target):
+    started = time.time()
+    if target["account"] == "crash":
+        os._exit(1)  # What Chrome taking the worker process down looks like to the coordinator
+    with _pool.acquire(key=target["proxy"]) as pooled:
+        url = f"{os.environ['FANOUT_STUB_URL']}/explore?location={target['location']}"
+        pooled.driver.get(url)
+        trends = extract_from_html(requests.get(url, timeout=5).text)
+        time.sleep(SCRAPE_SECONDS)
+    data = {f"trend{i}": trend for i, trend in enumerate(trends[:5], 1)}
+    return {
+        **data,
+        "ip": pooled.meta["ip"],
+        "account": target["account"],
+        "location": target["location"],
+        "pid": os.getpid(),
+        "cold_starts": _pool.stats()["cold_starts"],
+        "started": started,
+        "finished": time.time(),
+    }
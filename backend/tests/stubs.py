@@ -0,0 +1,50 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubServer:
+    """Local HTTP server answering from a ``{path: handler}`` map.
+
+    A handler gets the request handler and returns ``(status, body)``; bodies
+    that are not bytes are sent as JSON. Requests sent through the server as an
+    HTTP proxy arrive with an absolute URL and are matched on ``"proxy"``.
+    """
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.hits = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                key = "proxy" if self.path.startswith("http://") else self.path.split("?")[0]
+                stub.hits.append(key)
+                handler = stub.routes.get(key)
+                status, body = handler(self) if handler else (404, b"")
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                # One write, so timings are not skewed by delayed ACKs
+                self.wfile.write(b"HTTP/1.1 %d OK\r\nContent-Length: %d\r\nConnection: keep-alive\r\n\r\n%s"
+                                 % (status, len(body), body))
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.address = f"127.0.0.1:{self.server.server_port}"
+        self.url = f"http://{self.address}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def delayed(seconds, status, body):
+    def handler(request):
+        time.sleep(seconds)
+        return status, body
+    return handler
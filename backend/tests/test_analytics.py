@@ -0,0 +1,121 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from database import Base, engine, SessionLocal
+from migrations import run_migrations
+from models import Trend
+from ingest import BulkIngester
+import crud
+import main
+
+Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+
+def hours_ago(hours):
+    return (datetime.utcnow() - timedelta(hours=hours)).isoformat() + "Z"
+
+
+@pytest.fixture(scope="module")
+def client():
+    # One snapshot in each of the last three hours
+    snapshots = [
+        {"datetime": hours_ago(hours), "trend1": "#MidsummerMarathon", "trend2": "Harbour Lights", "account": "analytics"}
+        for hours in (3, 2, 1)
+    ]
+    BulkIngester(SessionLocal).ingest(json.dumps(snapshot) + "\n" for snapshot in snapshots)
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("spelling", ["#MidsummerMarathon", "Midsummer Marathon", "midsummermarathon"])
+def test_topic_stats_resolve_every_spelling(client, spelling):
+    response = client.get(f"/analytics/topics/{spelling.replace('#', '%23')}")
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert data["name"] == "#MidsummerMarathon"
+    assert data["appearances"] == 3
+
+
+def test_topic_ranks_resolve_a_spelling_without_spaces(client):
+    # The default window is the last week
+    response = client.get("/analytics/topics/harbourlights/ranks")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Harbour Lights"
+    assert [point["best_rank"] for point in response.json()["data"]] == [2, 2, 2]
+
+
+def test_topic_ranks_window(client):
+    # Hour buckets from the start of the hour two hours ago
+    points = client.get("/analytics/topics/harbourlights/ranks?hours=2").json()["data"]
+    assert [point["appearances"] for point in points] == [1, 1]
+
+
+def test_top_topics_over_the_last_day(client):
+    top = {topic["name"]: topic for topic in client.get("/analytics/topics/top?hours=24&limit=100").json()["data"]}
+    assert top["#MidsummerMarathon"]["appearances"] == top["Harbour Lights"]["appearances"] == 3
+    assert top["Harbour Lights"]["avg_rank"] == 2
+
+
+def test_topic_id_still_resolves(client):
+    topic_id = client.get("/analytics/topics/midsummermarathon").json()["data"]["topic_id"]
+    assert client.get(f"/analytics/topics/{topic_id}").json()["data"]["name"] == "#MidsummerMarathon"
+
+
+def test_unknown_topic_is_404(client):
+    assert client.get("/analytics/topics/nosuchtopicanywhere").status_code == 404
+
+
+def snapshot_ids(account):
+    with SessionLocal() as db:
+        return [row.id for row in db.query(Trend).filter(Trend.account == account).order_by(Trend.datetime)]
+
+
+def test_deleting_a_snapshot_takes_it_out_of_the_analytics(client):
+    snapshots = [{"datetime": hours_ago(hours), "trend1": "Lantern Parade", "trend2": "Harbour Lights",
+                  "account": "analytics-delete"} for hours in (2, 1)]
+    BulkIngester(SessionLocal).ingest(json.dumps(snapshot) + "\n" for snapshot in snapshots)
+    older, newer = snapshot_ids("analytics-delete")
+    assert client.get("/analytics/topics/lanternparade").json()["data"]["appearances"] == 2
+
+    assert client.delete(f"/trends/{newer}").status_code == 200
+    # Not served from the cache, and not counted any more
+    assert client.get("/analytics/topics/lanternparade").json()["data"]["appearances"] == 1
+    assert [point["appearances"] for point in client.get("/analytics/topics/lanternparade/ranks").json()["data"]] == [1]
+    assert client.get("/analytics/topics/harbourlights").json()["data"]["appearances"] == 4
+
+    assert client.delete(f"/trends/{older}").status_code == 200
+    assert client.get("/analytics/topics/lanternparade").status_code == 404
+    assert client.get("/analytics/topics/lanternparade/ranks").json()["data"] == []
+
+
+def repeated_snapshot(account, topic):
+    data = {"trend1": topic, "trend2": "Tidal Bore", "account": account}
+    with SessionLocal() as db:
+        crud.create_trend(db, data)
+        crud.create_trend(db, data)  # Unchanged: a heartbeat on the same row
+    [trend_id] = snapshot_ids(account)
+    return trend_id
+
+
+def test_deleting_a_repeated_snapshot_subtracts_every_scrape(client, caplog):
+    trend_id = repeated_snapshot("analytics-repeats", "Kite Festival")
+    assert client.get("/analytics/topics/kitefestival").json()["data"]["appearances"] == 2
+
+    with SessionLocal() as db:
+        assert crud.delete_trend(db, trend_id)
+    assert client.get("/analytics/topics/kitefestival").status_code == 404
+    assert client.get("/analytics/topics/kitefestival/ranks").json()["data"] == []
+    assert "rebuild_topic_aggregates" not in caplog.text
+
+
+def test_repeats_in_later_hours_are_reported(client, caplog):
+    trend_id = repeated_snapshot("analytics-later-repeats", "Sandcastle Contest")
+    with SessionLocal() as db:
+        # As if the heartbeat had come two hours later (its aggregates stay in the current hour)
+        db.query(Trend).filter(Trend.id == trend_id).update({Trend.last_seen_at: datetime.utcnow() + timedelta(hours=2)})
+        db.commit()
+        assert crud.delete_trend(db, trend_id)
+
+    assert client.get("/analytics/topics/sandcastlecontest").status_code == 404
+    assert "rebuild_topic_aggregates" in caplog.text
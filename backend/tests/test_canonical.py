@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Topic
+from canonical import TopicCanonicalizer, topic_id_for, numbers
+
+
+@pytest.fixture
+def canonicalizer(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'topics.db'}")
+    Topic.__table__.create(bind=engine)
+    yield TopicCanonicalizer(session_factory=sessionmaker(bind=engine))
+    engine.dispose()
+
+
+def topic_of(canonicalizer, text):
+    return canonicalizer.canonicalize(text)[1]
+
+
+def test_spellings_share_the_exact_key(canonicalizer):
+    ids = {topic_of(canonicalizer, text) for text in ["#WorldCup", "World Cup", "worldcup", "WORLD CUP!"]}
+    assert ids == {topic_id_for("worldcup")}
+    assert canonicalizer.stats()["exact"] == 3 and canonicalizer.stats()["near_duplicate"] == 0
+
+
+# Reordered words have the same trigrams, so LSH always finds them (a 0.8 match only ~95% of the time)
+@pytest.mark.parametrize("original, variant", [
+    ("Taylor Swift", "Swift Taylor"),
+    ("Champions League Final", "Final: Champions League 🔥"),
+])
+def test_near_duplicate_joins_the_known_topic(canonicalizer, original, variant):
+    _, topic_id, canonical = canonicalizer.canonicalize(original)
+    assert canonicalizer.canonicalize(variant)[1:] == (topic_id, canonical)
+    assert canonicalizer.stats()["near_duplicate"] == 1
+
+
+def test_near_duplicate_with_the_same_numbers(canonicalizer):
+    assert topic_of(canonicalizer, "World Cup Final 2026") == topic_of(canonicalizer, "World Cup 2026 Final")
+    assert canonicalizer.stats()["near_duplicate"] == 1
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Election 2020", "Election 2024"),  # Jaccard 0.75
+    ("World Cup 2022", "World Cup 2026"),  # Jaccard 0.76
+    ("World Cup", "World Cup 2026"),
+    ("iOS 17", "iOS 18"),
+    ("GTA 5", "GTA 6"),
+    ("Wordle 1,234", "Wordle 1,235"),
+])
+def test_years_and_versions_stay_apart(canonicalizer, first, second):
+    assert topic_of(canonicalizer, first) != topic_of(canonicalizer, second)
+    assert canonicalizer.stats()["new"] == 2
+
+
+def test_numbers():
+    assert numbers("election 2024") == ["2024"]
+    assert numbers("gta 6 trailer 2") == ["2", "6"]
+    assert numbers("taylor swift") == []
@@ -0,0 +1,100 @@
+import time
+import pytest
+from driver_pool import DriverPool, FakeDriver, SessionStore
+
+
+def make_pool(**kwargs):
+    made = []
+
+    def factory():
+        driver = FakeDriver()
+        made.append(driver)
+        return driver, {"ip": "203.0.113.1"}
+
+    return DriverPool(factory, **kwargs), made
+
+
+def test_warm_driver_is_reused():
+    pool, made = make_pool(size=1, max_uses=100)
+    for _ in range(3):
+        with pool.acquire() as pooled:
+            assert pooled.driver is made[0]
+    stats = pool.stats()
+    assert (stats["cold_starts"], stats["hits"], stats["idle"], stats["busy"]) == (1, 2, 1, 0)
+    assert len(made) == 1
+
+
+def test_driver_recycled_after_max_uses():
+    pool, made = make_pool(size=1, max_uses=2)
+    for _ in range(5):
+        with pool.acquire():
+            pass
+    assert len(made) == 3
+    assert all(driver.quit_called for driver in made[:2])
+    assert pool.stats()["recycles"] == 2
+
+
+def test_driver_recycled_after_max_age():
+    pool, made = make_pool(size=1, max_age=0.05, max_uses=100)
+    with pool.acquire():
+        pass
+    time.sleep(0.1)
+    with pool.acquire() as pooled:
+        assert pooled.driver is made[1] and pooled.fresh
+    assert made[0].quit_called
+    assert pool.stats()["recycles"] == 1
+
+
+def test_unhealthy_driver_is_replaced():
+    pool, made = make_pool(size=1, max_uses=100)
+    with pool.acquire():
+        pass
+    made[0].healthy = False
+    with pool.acquire() as pooled:
+        assert pooled.driver is made[1]
+    assert pool.stats()["health_check_failures"] == 1
+
+
+def test_driver_discarded_when_the_caller_fails():
+    pool, made = make_pool(size=1, max_uses=100)
+    with pytest.raises(ValueError):
+        with pool.acquire():
+            raise ValueError("scrape failed")
+    assert made[0].quit_called
+    with pool.acquire() as pooled:
+        assert pooled.driver is made[1]
+
+
+def test_drivers_are_only_shared_within_a_key():
+    pool, made = make_pool(size=1, max_uses=100)
+    with pool.acquire(key="direct"):
+        pass
+    with pool.acquire(key="pool") as pooled:
+        assert pooled.driver is made[1]
+    assert made[0].quit_called
+    assert pool.stats()["evictions"] == 1
+
+
+def test_acquire_times_out_when_every_driver_is_busy():
+    pool, _ = make_pool(size=1, acquire_timeout=0.1)
+    with pool.acquire():
+        with pytest.raises(TimeoutError):
+            with pool.acquire():
+                pass
+
+
+def test_session_round_trip(tmp_path):
+    store = SessionStore(str(tmp_path))
+    driver = FakeDriver()
+    driver.cookies = [{"name": "auth_token", "value": "secret", "domain": ".x.com", "sameSite": "Lax"}]
+    driver.local_storage = {"theme": "dark"}
+    assert store.save("someone", driver)
+
+    restored = FakeDriver()
+    assert store.restore("someone", restored)
+    assert restored.cookies == [{"name": "auth_token", "value": "secret", "domain": ".x.com"}]
+    assert restored.local_storage == {"theme": "dark"}
+    assert store.load("someone")["account"] == "someone"
+
+    store.clear("someone")
+    assert not store.restore("someone", FakeDriver())
@@ -0,0 +1,94 @@
+import os
+import pytest
+from conftest import FIXTURES_DIR
+from driver_pool import FakeDriver
+from extraction import (extract_from_html, candidates_from_html, is_trend_text, TrendExtractor, COLLECT_SCRIPT,
+                        MIN_TRENDS)
+from scraper import TwitterTrendingScraper, X_BASE_URL, TREND_READY_SELECTOR
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+TRENDING = fixture("explore_trending.html")
+SPARSE = fixture("explore_sparse.html")
+
+
+def test_trending_page():
+    assert extract_from_html(TRENDING) == ["#WorldCup", "Taylor Swift", "Election Day", "#MondayMotivation", "Bitcoin"]
+
+
+def test_stops_at_max_trends():
+    assert len(extract_from_html(TRENDING, max_trends=5)) == 5
+    # Past the fifth, the later rows come through in page order
+    assert extract_from_html(TRENDING, max_trends=10)[5:] == ["New Album", "GTA 6"]
+
+
+def test_spellings_of_one_topic_are_deduplicated():
+    trends = extract_from_html(TRENDING, max_trends=10)
+    assert "World Cup" not in trends  # Same topic as "#WorldCup", which comes first
+    assert len({t.lower() for t in trends}) == len(trends)
+
+
+@pytest.mark.parametrize("text", ["52.1K posts", "8,812 posts", "1.2M posts", "41K posts", "3,401 Tweets", "12k posting"])
+def test_post_counts_are_not_trends(text):
+    assert not is_trend_text(text, set())
+
+
+@pytest.mark.parametrize("text", ["Home", "Show more", "What’s happening", "Trending in Music", "© 2025 X Corp.",
+                                  "https://t.co/x", "2024", "ab"])
+def test_page_chrome_is_not_a_trend(text):
+    assert not is_trend_text(text, set())
+
+
+def test_selectors_are_matched_in_priority_order():
+    groups, fallback = candidates_from_html(TRENDING)
+    assert groups[0][1].splitlines() == ["Sports · Trending", "#WorldCup", "52.1K posts"]  # Whole trend cells
+    assert "Taylor Swift" in groups[3]  # Spans inside the cells
+    assert "Home" in fallback and "Home" not in groups[3]
+
+
+def test_fallback_only_runs_below_three_trends():
+    trends = extract_from_html(SPARSE)
+    assert trends[:2] == ["Lakers", "Oscars"]
+    assert len(trends) == 5
+    # The looser span filter still drops navigation and sign-up texts
+    assert not {"Home", "Explore", "Log in", "Sign up"} & set(trends)
+
+    extractor = TrendExtractor()
+    extractor.add_candidates(candidates_from_html(TRENDING)[0])
+    assert len(extractor.trends) >= MIN_TRENDS
+    assert "Home" not in extract_from_html(TRENDING, max_trends=10)
+
+
+class PageDriver(FakeDriver):
+    """FakeDriver serving saved pages, with COLLECT_SCRIPT evaluated over the HTML"""
+
+    def __init__(self, pages):
+        super().__init__(elements={TREND_READY_SELECTOR: [object()], '[data-testid="trend"]': [object()] * 5})
+        self.pages = pages
+
+    def execute_script(self, script, *args):
+        if script == COLLECT_SCRIPT:
+            groups, fallback = candidates_from_html(self.pages.get(self.current_url, ""))
+            return groups + [fallback]
+        return super().execute_script(script, *args)
+
+
+@pytest.fixture
+def scrape():
+    return TwitterTrendingScraper(username="someone", password="pw", proxy="direct")
+
+
+def test_next_page_is_tried_until_three_trends_are_found(scrape):
+    driver = PageDriver({f"{X_BASE_URL}/explore/tabs/trending": SPARSE, f"{X_BASE_URL}/explore": TRENDING})
+    assert scrape.extract_trending_topics(driver) == ["Lakers", "Oscars", "#WorldCup", "Taylor Swift", "Election Day"]
+    assert driver.visited == [f"{X_BASE_URL}/explore/tabs/trending", f"{X_BASE_URL}/explore"]
+
+
+def test_first_page_with_enough_trends_ends_extraction(scrape):
+    driver = PageDriver({f"{X_BASE_URL}/explore/tabs/trending": TRENDING})
+    assert scrape.extract_trending_topics(driver)[0] == "#WorldCup"
+    assert driver.visited == [f"{X_BASE_URL}/explore/tabs/trending"]
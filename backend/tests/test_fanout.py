@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import pytest
+from conftest import FIXTURES_DIR
+from stubs import StubServer
+from fanout import FanoutScraper, ScrapeTarget
+import fanout_workers
+
+
+@pytest.fixture(scope="module")
+def stub():
+    with open(os.path.join(FIXTURES_DIR, "explore_trending.html"), "rb") as f:
+        page = f.read()
+    server = StubServer({
+        "/explore": lambda request: (200, page),
+        # The workers' proxy pools list the stub itself as their only proxy and check it through itself
+        "/proxies.txt": lambda request: (200, server.address.encode()),
+        "proxy": lambda request: (200, {"origin": "198.51.100.7"}),
+    })
+    # Spawned workers inherit the environment, not this module's globals
+    env = {"FANOUT_STUB_URL": server.url, "PROXY_LIST_URLS": f"{server.url}/proxies.txt",
+           "PROXY_CHECK_URL": "http://check.invalid/ip"}
+    os.environ.update(env)
+    yield server
+    server.close()
+    for name in env:
+        os.environ.pop(name)
+
+
+@pytest.fixture
+def fanout(stub):
+    scrapers = []
+
+    def make(worker_fn=fanout_workers.stub_worker, **kwargs):
+        scraper = FanoutScraper(targets=[], worker_fn=worker_fn, **kwargs)
+        scrapers.append(scraper)
+        return scraper
+
+    yield make
+    for scraper in scrapers:
+        scraper.close()
+
+
+def targets(*accounts, proxy="direct"):
+    return [ScrapeTarget(account=account, password="x", location=f"loc-{i}", proxy=proxy)
+            for i, account in enumerate(accounts)]
+
+
+def test_workers_run_the_real_scrape_path(fanout, stub):
+    scraper = fanout(worker_fn=fanout_workers.scrape_worker, max_workers=2, min_interval=0)
+    accounts = targets("a", "b", proxy="pool")
+    first = scraper.run(accounts)
+    second = scraper.run(accounts)
+
+    for data in first + second:
+        assert not data.get("error"), data.get("error")
+        assert [data[f"trend{i}"] for i in range(1, 4)] == ["#WorldCup", "Taylor Swift", "Election Day"]
+        assert data["ip"] == "198.51.100.7" and data["timings"]["backend"] == "browser"
+    assert [data["account"] for data in second] == ["a", "b"]
+    assert [data["location"] for data in second] == ["loc-0", "loc-1"]
+    # Each worker process launched one driver through its own ProxyPool, then reused it
+    results = first + second
+    cold = [data for data in results if "driver/driver_setup" in data["timings"]["phases"]]
+    assert len(cold) == len({data["pid"] for data in results}) == len({data["pid"] for data in cold})
+    assert all(data["cold_starts"] == 1 for data in second)
+
+    # The pools saved the validated stub proxy, and no worker left a temp file behind
+    with open("proxies.json") as f:
+        assert [p["address"] for p in json.load(f)["proxies"]] == [stub.address]
+    assert not [name for name in os.listdir(".") if name.startswith("proxies.json.")]
+
+
+def test_targets_scrape_in_parallel_on_warm_workers(fanout):
+    scraper = fanout(max_workers=4, min_interval=0)
+    accounts = targets("a", "b", "c", "d")
+    first = scraper.run(accounts)
+
+    started = time.perf_counter()
+    second = scraper.run(accounts)
+    elapsed = time.perf_counter() - started
+
+    # Four 0.5 s scrapes at once; serially this would take 2 s
+    assert elapsed < 2 * fanout_workers.SCRAPE_SECONDS
+    assert [data["location"] for data in second] == ["loc-0", "loc-1", "loc-2", "loc-3"]
+    assert all(data["trend1"] == "#WorldCup" for data in second)
+    # Worker processes and their drivers stay up between runs
+    assert {data["pid"] for data in second} <= {data["pid"] for data in first}
+    assert all(data["cold_starts"] == 1 for data in second)
+    assert scraper.stats()["runs"] == 2
+
+
+def test_an_account_never_runs_twice_at_once(fanout):
+    scraper = fanout(max_workers=4, min_interval=0.3)
+    results = scraper.run(targets("same", "same", "other"))
+
+    first, second, other = results
+    assert second["started"] >= first["finished"]
+    assert second["started"] - first["started"] >= 0.3
+    # Other accounts are not held back by it
+    assert other["started"] < first["finished"]
+
+
+def test_a_crashed_worker_fails_only_its_target(fanout):
+    scraper = fanout(max_workers=1, min_interval=0)
+    results = scraper.run(targets("crash"))
+    assert results[0]["error"] and results[0]["trend1"].startswith("Error:")
+    assert results[0]["account"] == "crash"
+
+    # The broken pool is replaced on the next run
+    results = scraper.run(targets("a"))
+    assert not results[0].get("error") and results[0]["trend1"] == "#WorldCup"
@@ -0,0 +1,93 @@
+import os
+import json
+import pytest
+from conftest import FIXTURES_DIR
+from fetchers import HttpTrendFetcher, FetchUnavailable, SessionInvalid, parse_trends
+from driver_pool import SessionStore
+from stubs import StubServer
+from timing import TimingProfile
+from transport import transport
+
+ACCOUNT = "trendwatcher"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_guide_json_trends_in_page_order():
+    # The promoted trend and the second spelling of #MidsummerMarathon are skipped
+    assert parse_trends(fixture("guide_trending.json")) == \
+        ["#MidsummerMarathon", "Harbour Lights", "Brentford", "#BBCQT", "Glastonbury"]
+    assert parse_trends(fixture("guide_trending.json"), max_trends=10)[-2:] == ["Rishi", "Wordle 1,234"]
+
+
+def test_graphql_explore_trends():
+    assert parse_trends(fixture("explore_graphql.json")) == ["Wimbledon", "Alcaraz", "Centre Court", "Strawberries"]
+
+
+def test_unrelated_payload_has_no_trends():
+    assert parse_trends({"errors": [{"code": 34, "message": "Sorry, that page does not exist."}]}) == []
+
+
+@pytest.fixture
+def stub():
+    server = StubServer({"/guide.json": lambda request: (200, fixture("guide_trending.json"))})
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def fetcher(stub, tmp_path, monkeypatch):
+    monkeypatch.setattr(transport, "backoff", 0)
+    store = SessionStore(directory=str(tmp_path))
+    os.makedirs(store.directory, exist_ok=True)
+    with open(store._path(ACCOUNT), "w") as f:
+        json.dump({"account": ACCOUNT, "saved_at": 1.0, "cookies": [
+            {"name": "auth_token", "value": "a1", "domain": "127.0.0.1"},
+            {"name": "ct0", "value": "c1", "domain": "127.0.0.1"}]}, f)
+
+    reports = []
+    fetcher = HttpTrendFetcher(ACCOUNT, lambda: (None, "198.51.100.7"), store, url=f"{stub.url}/guide.json",
+                               timeout=2, report_proxy=lambda proxy, ok: reports.append(ok))
+    fetcher.reports = reports
+    yield fetcher
+    fetcher.invalidate()
+
+
+def test_fetch_reads_trends_and_reports_the_proxy(fetcher):
+    info = {}
+    assert fetcher.fetch(TimingProfile(), info)[:2] == ["#MidsummerMarathon", "Harbour Lights"]
+    assert info["ip"] == "198.51.100.7" and info["network"]["bytes"] > 0
+    assert fetcher.reports == [True]
+    assert fetcher._session is not None
+
+
+@pytest.mark.parametrize("status, body", [(503, b"upstream timeout"), (200, b"<html>Proxy error</html>"), (404, b"")])
+def test_failed_fetch_drops_the_session_and_proxy(stub, fetcher, status, body):
+    fetcher.fetch(TimingProfile(), {})
+    stub.routes["/guide.json"] = lambda request: (status, body)
+
+    with pytest.raises(FetchUnavailable) as raised:
+        fetcher.fetch(TimingProfile(), {})
+    assert not isinstance(raised.value, SessionInvalid)
+    assert fetcher.reports == [True, False]
+    assert fetcher._session is None
+    assert fetcher.stats()["unavailable"] == 1
+
+
+def test_connection_error_is_unavailable(fetcher):
+    fetcher.url = "http://127.0.0.1:1/guide.json"  # Nothing listens on port 1
+    with pytest.raises(FetchUnavailable):
+        fetcher.fetch(TimingProfile(), {})
+    assert fetcher.reports == [False]
+    assert fetcher._session is None
+
+
+def test_rejected_login_is_session_invalid(stub, fetcher):
+    stub.routes["/guide.json"] = lambda request: (401, {"errors": [{"code": 89, "message": "Invalid or expired token."}]})
+    with pytest.raises(SessionInvalid):
+        fetcher.fetch(TimingProfile(), {})
+    assert fetcher.reports == []
+    assert fetcher.stats()["session_invalid"] == 1
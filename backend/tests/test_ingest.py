@@ -0,0 +1,95 @@
+import json
+from datetime import datetime
+from fastapi.testclient import TestClient
+from database import Base, engine, SessionLocal
+from migrations import run_migrations
+from models import Trend, TrendEntry
+from ingest import BulkIngester, decode_lines, ingest_file
+import crud
+import main
+
+Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+CSV = (
+    'datetime,trend1,trend2,trend3,trend4,trend5,account,location\r\n'
+    '2024-03-01T10:00:00Z,"Line one\nline two",Bravo,"Says ""hi""",Delta,Echo,ingest-csv,US\r\n'
+    '2024-03-01T10:15:00Z,Alpha,"a, b",Charlie,Delta,Echo,ingest-csv,US\r\n'
+    '\r\n'
+    '2024-03-01T10:30:00Z,,Bravo,Charlie,Delta,Echo,ingest-csv,US\r\n'
+)
+
+
+def stored(account):
+    with SessionLocal() as db:
+        return db.query(Trend).filter(Trend.account == account).order_by(Trend.datetime).all()
+
+
+def test_decode_lines_rejoins_lines_and_characters_split_across_chunks():
+    data = "first,\"x\ny\"\r\nsecond,é\nthird".encode()
+    chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+    assert list(decode_lines(chunks)) == ['first,"x\n', 'y"\r\n', "second,é\n", "third"]
+
+
+def test_csv_quoted_fields_may_span_lines(tmp_path):
+    path = tmp_path / "snapshots.csv"
+    path.write_bytes(CSV.encode())
+    summary = ingest_file(str(path), SessionLocal)
+
+    assert (summary["inserted"], summary["invalid"]) == (2, 1)
+    # Errors point at the line the bad record starts on
+    assert summary["errors"] == [{"line": 6, "error": "trend1 is required"}]
+    first, second = stored("ingest-csv")
+    assert first.trend1 == "Line one\nline two" and first.trend3 == 'Says "hi"'
+    assert second.trend2 == "a, b"
+
+    # Re-sending inserts nothing
+    assert ingest_file(str(path), SessionLocal)["duplicates"] == 2
+
+
+def test_bulk_endpoint_streams_csv_split_mid_record():
+    body = CSV.replace("ingest-csv", "ingest-http").encode()
+    chunks = [body[i:i + 7] for i in range(0, len(body), 7)]
+    response = TestClient(main.app).post("/trends/bulk?format=csv", content=iter(chunks))
+
+    assert response.status_code == 200
+    assert (response.json()["inserted"], response.json()["invalid"]) == (2, 1)
+    assert stored("ingest-http")[0].trend1 == "Line one\nline two"
+
+
+def test_error_rows_stay_out_of_topic_history():
+    rows = [
+        {"datetime": "2024-03-02T10:00:00Z", "trend1": "Error: login failed", "trend2": "Scraping failed",
+         "account": "ingest-errors"},
+        {"datetime": "2024-03-02T10:15:00Z", "trend1": "Alpha", "trend2": "Bravo", "account": "ingest-errors"},
+    ]
+    summary = BulkIngester(SessionLocal).ingest(json.dumps(row) + "\n" for row in rows)
+    assert summary["inserted"] == 2
+
+    failed, ok = stored("ingest-errors")
+    with SessionLocal() as db:
+        assert db.query(TrendEntry).filter(TrendEntry.trend_id == failed.id).count() == 0
+        assert db.query(TrendEntry).filter(TrendEntry.trend_id == ok.id).count() == 2
+
+
+def test_next_scrape_is_compared_with_an_ingested_newer_snapshot():
+    scrape = {"trend1": "Alpha", "trend2": "Bravo", "trend3": "Charlie", "trend4": "Delta", "trend5": "Echo",
+              "account": "ingest-stream", "location": "US"}
+    newer = {**scrape, "trend1": "Foxtrot", "trend2": "Golf"}
+    with SessionLocal() as db:
+        crud.create_trend(db, scrape)
+
+    summary = BulkIngester(SessionLocal).ingest([json.dumps({**newer, "datetime": datetime.utcnow().isoformat()}) + "\n"])
+    assert summary["inserted"] == 1
+
+    # The same ranking as the ingested snapshot is a repeat of it, not a change from the scraped one
+    with SessionLocal() as db:
+        repeat = crud.create_trend(db, newer)
+    first, ingested = stored("ingest-stream")
+    assert repeat.id == ingested.id and ingested.seen_count == 2 and ingested.diff is None
+
+    changed = {**newer, "trend5": "Hotel"}
+    with SessionLocal() as db:
+        latest = crud.create_trend(db, changed)
+    assert latest.diff["entered"] == [{"topic": "Hotel", "rank": 5}]
+    assert latest.diff["left"] == [{"topic": "Echo", "rank": 5}]
@@ -0,0 +1,83 @@
+import time
+import threading
+from database import Base, engine, SessionLocal
+from migrations import run_migrations
+from jobs import ScrapeJobQueue
+
+Base.metadata.create_all(bind=engine)
+run_migrations(engine)
+
+
+def fake_scrape(delay=0.0, trends=("Alpha", "Bravo", "Charlie", "Delta", "Echo"), error=None):
+    def scrape():
+        time.sleep(delay)
+        data = {f"trend{i}": trend for i, trend in enumerate(trends, 1)}
+        return {**data, "ip": "203.0.113.1", "error": error}
+    return scrape
+
+
+def test_submit_returns_before_the_scrape_finishes():
+    release = threading.Event()
+    queue = ScrapeJobQueue(lambda: release.wait(5) and fake_scrape()(), SessionLocal, max_workers=1)
+    started = time.perf_counter()
+    job, created = queue.submit()
+    assert created and time.perf_counter() - started < 0.5
+    assert job.state in ("queued", "running")
+
+    release.set()
+    assert job.finished.wait(5)
+    assert job.state == "succeeded"
+    assert job.result["trend1"] == "Alpha"
+    queue.shutdown()
+
+
+def test_duplicate_submissions_share_one_job():
+    queue = ScrapeJobQueue(fake_scrape(delay=0.3, trends=("Foxtrot", "Golf", "Hotel", "India", "Juliett")),
+                           SessionLocal, max_workers=2)
+    first, created = queue.submit()
+    second, created_again = queue.submit()
+    assert created and not created_again
+    assert second.id == first.id
+
+    assert first.finished.wait(5)
+    # Once the first job is done the same key starts a new one
+    third, created = queue.submit()
+    assert created and third.id != first.id
+    assert third.finished.wait(5)
+    queue.shutdown()
+
+
+def test_workers_bound_concurrency():
+    running, peak, lock = 0, 0, threading.Lock()
+
+    def scrape():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.2)
+        with lock:
+            running -= 1
+        return fake_scrape(trends=("Kilo", "Lima", "Mike", "November", "Oscar"))()
+
+    queue = ScrapeJobQueue(scrape, SessionLocal, max_workers=2)
+    jobs = [queue.submit(key=f"k{i}")[0] for i in range(5)]
+    for job in jobs:
+        assert job.finished.wait(5)
+    assert peak == 2
+    assert queue.stats()["succeeded"] == 5
+    queue.shutdown()
+
+
+def test_failed_scrapes_keep_their_error():
+    queue = ScrapeJobQueue(fake_scrape(error="Login timeout"), SessionLocal, max_workers=1)
+    job, _ = queue.submit()
+    assert job.finished.wait(5)
+    assert job.state == "succeeded"  # The placeholder row is still saved
+    assert job.error == "Login timeout"
+
+    queue.scrape_fn = lambda: None
+    job, _ = queue.submit()
+    assert job.finished.wait(5)
+    assert job.state == "failed"
+    queue.shutdown()
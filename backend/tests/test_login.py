@@ -0,0 +1,121 @@
+import time
+import pytest
+import scraper
+from driver_pool import DriverPool, FakeDriver, PooledDriver, SessionStore
+from timing import TimingProfile
+from scraper import (TwitterTrendingScraper, X_BASE_URL, LOGGED_IN_SELECTOR, NEXT_BUTTON_XPATH,
+                     LOGIN_BUTTON_XPATH)
+
+
+class FakeElement:
+    def __init__(self):
+        self.typed = []
+        self.clicked = 0
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def clear(self):
+        self.typed = []
+
+    def send_keys(self, text):
+        self.typed.append(text)
+
+    def click(self):
+        self.clicked += 1
+
+
+LOGIN_PAGE = {
+    'input[autocomplete="username"]': [FakeElement()],
+    'input[name="password"]': [FakeElement()],
+    NEXT_BUTTON_XPATH: [FakeElement()],
+    LOGIN_BUTTON_XPATH: [FakeElement()],
+}
+
+
+@pytest.fixture
+def account(tmp_path, monkeypatch):
+    scrape = TwitterTrendingScraper(username="someone", password="hunter2", proxy="direct",
+                                    driver_pool=DriverPool(lambda: (FakeDriver(), {})))
+    scrape.session_store = SessionStore(str(tmp_path))
+    return scrape
+
+
+def no_login(driver, profile=None):
+    raise AssertionError("should not log in again")
+
+
+def test_logged_in_pooled_driver_skips_login(account, monkeypatch):
+    monkeypatch.setattr(account, "login_to_twitter", no_login)
+    pooled = PooledDriver(FakeDriver(elements={LOGGED_IN_SELECTOR: [FakeElement()]}))
+    pooled.logged_in_as = "someone"
+    profile = TimingProfile()
+
+    assert account.ensure_logged_in(pooled, profile)
+    assert pooled.driver.visited == [f"{X_BASE_URL}/home"]
+    assert list(profile.to_dict()["phases"]) == ["session_check"]
+
+
+def test_saved_session_is_restored_instead_of_logging_in(account, monkeypatch):
+    saved = FakeDriver()
+    saved.cookies = [{"name": "auth_token", "value": "secret"}]
+    account.session_store.save("someone", saved)
+    monkeypatch.setattr(account, "login_to_twitter", no_login)
+
+    pooled = PooledDriver(FakeDriver(elements={LOGGED_IN_SELECTOR: [FakeElement()]}))
+    assert account.ensure_logged_in(pooled)
+    assert pooled.driver.cookies == [{"name": "auth_token", "value": "secret"}]
+    assert pooled.logged_in_as == "someone"
+
+
+def test_login_returns_as_soon_as_each_step_is_ready(account):
+    driver = FakeDriver(elements={**LOGIN_PAGE, LOGGED_IN_SELECTOR: [FakeElement()]})
+    profile = TimingProfile()
+
+    started = time.perf_counter()
+    assert account.login_to_twitter(driver, profile)
+    assert time.perf_counter() - started < 1  # No fixed sleeps between the steps
+
+    assert driver.elements['input[autocomplete="username"]'][0].typed == ["someone"]
+    assert driver.elements['input[name="password"]'][0].typed == ["hunter2"]
+    assert list(profile.to_dict()["phases"]) == ["navigate", "username", "password", "login_confirm"]
+
+
+def test_login_gives_up_after_the_confirm_timeout(account, monkeypatch):
+    monkeypatch.setitem(scraper.PHASE_TIMEOUTS, "login_confirm", 0.3)
+    account.session_store.save("someone", FakeDriver())  # Stale session: restoring it does not log in
+    monkeypatch.setattr(account, "is_logged_in", lambda driver, timeout=10: False)
+    pooled = PooledDriver(FakeDriver(elements=dict(LOGIN_PAGE)))
+
+    started = time.perf_counter()
+    assert not account.ensure_logged_in(pooled)
+    assert time.perf_counter() - started < 2
+    assert account.session_store.load("someone") is None  # Cleared so the next scrape logs in fresh
+    assert pooled.logged_in_as is None
+
+
+def test_cold_start_steps_are_sub_phases_of_driver(tmp_path, monkeypatch):
+    scrape = TwitterTrendingScraper(username="someone", password="hunter2", proxy="direct")
+    scrape.session_store = SessionStore(str(tmp_path))
+
+    def slow_setup(proxy=None):
+        time.sleep(0.05)
+        return FakeDriver()
+
+    monkeypatch.setattr(scrape, "setup_driver", slow_setup)
+    monkeypatch.setattr(scrape, "get_current_ip", lambda proxy=None: "198.51.100.7")
+    monkeypatch.setattr(scrape, "ensure_logged_in", lambda pooled, profile: True)
+    monkeypatch.setattr(scrape, "extract_trending_topics", lambda driver, profile: ["A", "B", "C"])
+    profile = TimingProfile()
+
+    assert scrape.fetch_with_browser(profile, {}) == ["A", "B", "C"]
+    phases = profile.to_dict()["phases"]
+    assert set(phases) == {"driver", "driver/proxy", "driver/driver_setup"}
+    # The cold start runs inside the driver phase, not next to it
+    assert phases["driver"] >= phases["driver/proxy"] + phases["driver/driver_setup"] >= 0.05
+    assert sum(profile.top_level().values()) <= profile.total
+    assert profile.slowest() == "driver"
+    scrape.driver_pool.close()
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import Session, sessionmaker
+from database import Base, engine as app_engine
+from models import Trend, TrendEntry, TopicStats
+import crud
+import migrations
+from scheduler import acquire_lease
+
+# The canonicalizer indexes topics from the application database
+Base.metadata.create_all(bind=app_engine)
+
+TRENDS = ["#WorldCup", "Taylor Swift", "Election Day", "Bitcoin", "Lakers"]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+def add_legacy_snapshots(engine, count):
+    """Snapshots stored before trend_entries existed: trend1..trend5 only"""
+    start = datetime(2024, 6, 1)
+    rows = [crud.trend_row({f"trend{r}": t for r, t in enumerate(TRENDS, 1)}, start + timedelta(hours=i))
+            for i in range(count)]
+    with Session(engine) as db:
+        db.execute(Trend.__table__.insert(), rows)
+        db.commit()
+    return rows
+
+
+def entry_count(engine):
+    with Session(engine) as db:
+        return db.execute(select(func.count()).select_from(TrendEntry)).scalar()
+
+
+def appearances(engine):
+    with Session(engine) as db:
+        return db.execute(select(func.sum(TopicStats.appearances))).scalar()
+
+
+def test_backfill_splits_legacy_snapshots(engine):
+    add_legacy_snapshots(engine, 12)
+    migrations.run_migrations(engine)
+    assert entry_count(engine) == 12 * len(TRENDS)
+    assert appearances(engine) == 12 * len(TRENDS)
+
+
+def test_overlapping_backfills_never_double_entries(engine, monkeypatch):
+    rows = add_legacy_snapshots(engine, 6)
+    # Another process split half of the snapshots after this one had read them
+    with Session(engine) as db:
+        for row in rows[:3]:
+            entries, _ = crud.build_entries(row["id"], [row[c] for c in crud.TREND_COLUMNS], row["datetime"])
+            db.execute(TrendEntry.__table__.insert(), entries)
+        db.commit()
+    monkeypatch.setattr(migrations, "_unsplit_snapshots", lambda: select(
+        Trend.id, Trend.datetime, *[getattr(Trend, c) for c in crud.TREND_COLUMNS]
+    ))
+    migrations.backfill_trend_entries(engine)
+    assert entry_count(engine) == 6 * len(TRENDS)
+
+
+def test_duplicate_entries_are_removed_before_the_unique_index(engine):
+    rows = add_legacy_snapshots(engine, 4)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ux_trend_entries_trend_rank"))
+    migrations.backfill_trend_entries(engine)
+    # What an overlapping backfill used to leave behind, counted in the aggregates too
+    with Session(engine) as db:
+        entries, _ = crud.build_entries(rows[0]["id"], TRENDS, rows[0]["datetime"])
+        db.execute(TrendEntry.__table__.insert(), entries)
+        crud.update_topic_aggregates(db, entries)
+        db.commit()
+
+    migrations.run_migrations(engine)
+    assert entry_count(engine) == 4 * len(TRENDS)
+    # The aggregates had counted the duplicates and are rebuilt
+    assert appearances(engine) == 4 * len(TRENDS)
+
+
+def test_backfill_waits_for_the_lease_holder(engine):
+    add_legacy_snapshots(engine, 3)
+    assert acquire_lease(sessionmaker(bind=engine), migrations.MIGRATION_LEASE_NAME, "other-replica", 60)
+    migrations.run_migrations(engine)
+    assert entry_count(engine) == 0
+
+
+def test_rebuild_in_batches_matches_the_running_totals(engine):
+    add_legacy_snapshots(engine, 7)
+    migrations.run_migrations(engine)
+    before = appearances(engine)
+    assert migrations.rebuild_topic_aggregates(engine, batch_size=4) == 7 * len(TRENDS)
+    assert appearances(engine) == before
+
+
+def test_a_failed_rebuild_keeps_the_old_aggregates(engine, monkeypatch):
+    add_legacy_snapshots(engine, 7)
+    migrations.run_migrations(engine)
+    before = appearances(engine)
+
+    update = crud.update_topic_aggregates
+    calls = []
+
+    def fail_on_second_batch(db, entries):
+        calls.append(len(entries))
+        if len(calls) == 2:
+            raise RuntimeError("connection lost")
+        update(db, entries)
+
+    monkeypatch.setattr(crud, "update_topic_aggregates", fail_on_second_batch)
+    with pytest.raises(RuntimeError):
+        migrations.rebuild_topic_aggregates(engine, batch_size=10)
+    assert appearances(engine) == before
@@ -0,0 +1,85 @@
+import time
+import pytest
+from proxy_pool import ProxyPool, MAX_FAILURE_STREAK, MIN_REVALIDATE_INTERVAL
+from stubs import StubServer, delayed
+
+# Nothing listens on port 1, so these fail at once
+DEAD = ["127.0.0.1:1", "127.0.0.2:1"]
+
+
+@pytest.fixture
+def stub():
+    server = StubServer({})
+    server.routes.update({
+        # Two list APIs (one plain text, one JSON) that each take 0.3 s
+        "/list.txt": delayed(0.3, 200, f"{server.address}\n{DEAD[0]}\n".encode()),
+        "/proxyscrape": delayed(0.3, 200, {"proxies": [{"ip": "127.0.0.2", "port": 1}]}),
+        # The "httpbin" answer, reached through the stub acting as a proxy
+        "proxy": lambda request: (200, {"origin": "198.51.100.7"}),
+    })
+    yield server
+    server.close()
+
+
+def make_pool(stub, tmp_path, **kwargs):
+    options = dict(list_urls=[f"{stub.url}/list.txt", f"{stub.url}/proxyscrape"], check_url="http://check.invalid/ip",
+                   static_proxies=[], store_path=str(tmp_path / "proxies.json"), timeout=2)
+    return ProxyPool(**{**options, **kwargs})
+
+
+def test_lists_are_fetched_concurrently(stub, tmp_path):
+    pool = make_pool(stub, tmp_path)
+    started = time.perf_counter()
+    candidates = pool.fetch_candidates()
+    assert time.perf_counter() - started < 0.55
+    assert sorted(candidates) == sorted([stub.address] + DEAD)
+
+
+def test_refresh_keeps_only_working_proxies(stub, tmp_path):
+    pool = make_pool(stub, tmp_path)
+    pool.refresh()
+    assert pool.get() == (stub.address, "198.51.100.7")
+    stats = pool.stats()
+    assert (stats["known"], stats["alive"]) == (3, 1)
+
+
+def test_scores_persist_across_restarts(stub, tmp_path):
+    make_pool(stub, tmp_path).refresh()
+    restarted = make_pool(stub, tmp_path, list_urls=[])
+    assert restarted.get() == (stub.address, "198.51.100.7")
+    assert stub.hits.count("proxy") == 1  # Served from the store, not validated again
+
+
+def test_failing_proxies_expire(stub, tmp_path):
+    pool = make_pool(stub, tmp_path)
+    pool.refresh()
+    pool.report(stub.address, False)
+    assert pool.stats()["alive"] == 0  # One failure takes it out of rotation
+
+    for _ in range(MAX_FAILURE_STREAK - 1):
+        pool.refresh()
+    # The dead proxies were dropped; the working one came back on revalidation
+    assert pool.stats()["known"] == 1
+    assert pool.get()[0] == stub.address
+
+
+def test_get_waits_for_the_first_background_refresh(stub, tmp_path):
+    pool = make_pool(stub, tmp_path, interval=0)
+    pool.start()
+    try:
+        assert pool.get() == (stub.address, "198.51.100.7")
+    finally:
+        pool.stop()
+
+
+def test_zero_interval_refreshes_once(stub, tmp_path):
+    pool = make_pool(stub, tmp_path, interval=0)
+    pool.start()
+    thread = pool._thread
+    thread.join(5)
+    assert not thread.is_alive()
+    assert stub.hits.count("/list.txt") == 1
+
+
+def test_short_intervals_are_clamped(stub, tmp_path):
+    assert make_pool(stub, tmp_path, interval=1).interval == MIN_REVALIDATE_INTERVAL
@@ -0,0 +1,51 @@
+import json
+from resources import ResourcePolicy, RESOURCE_PATTERNS, TRACKER_PATTERNS, summarize_network
+
+
+def event(method, **params):
+    return {"message": json.dumps({"message": {"method": method, "params": params}})}
+
+
+def test_summary_counts_bytes_blocked_and_failed_requests():
+    entries = [
+        event("Network.requestWillBeSent", requestId="1", type="Document"),
+        event("Network.requestWillBeSent", requestId="1", type="Document", redirectResponse={"status": 302}),
+        event("Network.loadingFinished", requestId="1", encodedDataLength=5000),
+        event("Network.requestWillBeSent", requestId="2", type="Script"),
+        event("Network.loadingFinished", requestId="2", encodedDataLength=1200),
+        event("Network.requestWillBeSent", requestId="3", type="Image"),
+        event("Network.loadingFailed", requestId="3", type="Image", blockedReason="inspector"),
+        event("Network.requestWillBeSent", requestId="4", type="Font"),
+        event("Network.loadingFailed", requestId="4", errorText="net::ERR_BLOCKED_BY_CLIENT"),
+        event("Network.requestWillBeSent", requestId="5", type="XHR"),
+        event("Network.loadingFailed", requestId="5", errorText="net::ERR_ABORTED", canceled=True),
+        event("Network.requestWillBeSent", requestId="6", type="XHR"),
+        event("Network.loadingFailed", requestId="6", errorText="net::ERR_CONNECTION_RESET"),
+        {"message": "not json"},
+        event("Page.loadEventFired"),
+    ]
+    summary = summarize_network(entries)
+
+    # The redirect reuses request 1 and is not a second request
+    assert {k: summary[k] for k in ("requests", "blocked", "failed", "bytes")} == \
+        {"requests": 6, "blocked": 2, "failed": 1, "bytes": 6200}
+    assert summary["by_type"]["document"] == {"requests": 1, "blocked": 0, "bytes": 5000}
+    assert summary["by_type"]["image"] == {"requests": 1, "blocked": 1, "bytes": 0}
+    assert summary["by_type"]["font"]["blocked"] == 1
+    assert summary["by_type"]["xhr"] == {"requests": 2, "blocked": 0, "bytes": 0}
+
+
+def test_empty_log():
+    assert summarize_network([]) == {"requests": 0, "blocked": 0, "failed": 0, "bytes": 0, "by_type": {}}
+
+
+def test_url_patterns_follow_the_policy():
+    assert ResourcePolicy(enabled=False).url_patterns() == []
+
+    policy = ResourcePolicy(enabled=True, block_types=["image", "font"], block_trackers=False, extra_patterns=["*.svg*"])
+    assert policy.url_patterns() == RESOURCE_PATTERNS["image"] + RESOURCE_PATTERNS["font"] + ["*.svg*"]
+
+    policy = ResourcePolicy(enabled=True, block_types=["media", "bogus"], block_trackers=True, extra_patterns=[])
+    assert policy.url_patterns() == RESOURCE_PATTERNS["media"] + TRACKER_PATTERNS
+    assert policy.describe()["url_patterns"] == len(RESOURCE_PATTERNS["media"] + TRACKER_PATTERNS)
+    assert policy.prefs()["profile.managed_default_content_settings.images"] == 1
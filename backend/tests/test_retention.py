@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from models import Trend, TrendRollup
+from retention import RetentionManager
+from cache import trend_count, rollup_count
+import crud
+import crud_async
+
+NOW = datetime(2024, 6, 30, 12, 0)
+OLD_HOUR = datetime(2024, 6, 1, 9, 0)  # Far past the 7 day raw cutoff
+SNAPSHOT_A = ["Alpha", "Bravo", "Charlie", "Delta", "Echo"]
+SNAPSHOT_B = ["Bravo", "Alpha", "Charlie", "Delta", "Echo"]
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def add_snapshot(session_factory, trends, when, last_seen_at=None, seen_count=1):
+    row = crud.trend_row({**{f"trend{i}": t for i, t in enumerate(trends, 1)}, "location": "US"}, when)
+    with session_factory() as db:
+        db.execute(Trend.__table__.insert(), [{**row, "last_seen_at": last_seen_at, "seen_count": seen_count}])
+        db.commit()
+
+
+def rollups(session_factory):
+    with session_factory() as db:
+        return db.execute(select(TrendRollup)).scalars().all()
+
+
+def raw_count(session_factory):
+    with session_factory() as db:
+        return db.query(Trend).count()
+
+
+def test_rows_seen_after_the_cutoff_stay_raw(session_factory):
+    add_snapshot(session_factory, SNAPSHOT_A, OLD_HOUR, last_seen_at=NOW - timedelta(hours=1), seen_count=2000)
+    add_snapshot(session_factory, SNAPSHOT_B, OLD_HOUR + timedelta(minutes=5))
+
+    result = RetentionManager(session_factory).run_once(now=NOW)
+    assert result["raw_rolled_up"] == 1
+    assert raw_count(session_factory) == 1
+
+
+def test_a_bucket_folded_in_several_batches_is_merged(session_factory):
+    # Two scrapes of A, then three of B, in one hour: B is the bucket's snapshot
+    for minute, trends in enumerate([SNAPSHOT_A, SNAPSHOT_A, SNAPSHOT_B, SNAPSHOT_B, SNAPSHOT_B]):
+        add_snapshot(session_factory, trends, OLD_HOUR + timedelta(minutes=minute))
+
+    RetentionManager(session_factory, batch_size=2).run_once(now=NOW)
+    [rollup] = rollups(session_factory)
+    assert [rollup.trend1, rollup.trend2] == SNAPSHOT_B[:2]
+    assert (rollup.seen_count, rollup.snapshots) == (5, 5)
+    assert rollup.last_seen_at == OLD_HOUR + timedelta(minutes=4)
+
+
+def test_a_later_run_adds_onto_the_stored_bucket(session_factory):
+    add_snapshot(session_factory, SNAPSHOT_A, OLD_HOUR)
+    add_snapshot(session_factory, SNAPSHOT_B, OLD_HOUR + timedelta(minutes=5), last_seen_at=NOW - timedelta(days=1),
+                 seen_count=40)
+    manager = RetentionManager(session_factory)
+
+    manager.run_once(now=NOW)
+    [rollup] = rollups(session_factory)
+    assert rollup.trend1 == "Alpha" and rollup.seen_count == 1
+
+    # A week later B is past the cutoff too, and outweighs A in the same bucket
+    manager.run_once(now=NOW + timedelta(days=7))
+    [rollup] = rollups(session_factory)
+    assert rollup.trend1 == "Bravo"
+    assert (rollup.seen_count, rollup.snapshots) == (41, 2)
+    assert raw_count(session_factory) == 0
+
+
+def test_totals_are_recounted_only_after_a_run(tmp_path, session_factory):
+    add_snapshot(session_factory, SNAPSHOT_A, OLD_HOUR)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'retention.db'}")
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    async def count():
+        async with async_sessionmaker(async_engine)() as db:
+            return await crud_async.count_trends(db)
+
+    trend_count.reset()
+    rollup_count.reset()
+    assert asyncio.run(count()) == 1
+    assert any("trend_rollups" in statement for statement in statements)
+
+    # Later requests are answered from memory
+    statements.clear()
+    assert asyncio.run(count()) == 1
+    assert statements == []
+
+    # The run moves the snapshot into a rollup and both totals are counted again
+    RetentionManager(session_factory).run_once(now=NOW)
+    assert asyncio.run(count()) == 1
+    assert sum("count(" in statement for statement in statements) == 2
+    asyncio.run(async_engine.dispose())
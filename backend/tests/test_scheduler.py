@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from jobs import ScrapeJob
+from models import SchedulerLease
+import scheduler
+from scheduler import ScrapeScheduler, LEASE_NAME, acquire_lease
+
+
+class FakeQueue:
+    """Hands out one job that finishes after ``duration`` seconds"""
+
+    def __init__(self, duration):
+        self.duration = duration
+
+    def submit(self, *args):
+        job = ScrapeJob("scrape")
+        job.state = "running"
+
+        def finish():
+            job.state = "succeeded"
+            job.finished.set()
+
+        threading.Timer(self.duration, finish).start()
+        return job, True
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    monkeypatch.setattr(scheduler, "JOB_POLL_SECONDS", 0.05)
+    engine = create_engine(f"sqlite:///{tmp_path / 'lease.db'}")
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def lease_of(session_factory):
+    with session_factory() as db:
+        return db.get(SchedulerLease, LEASE_NAME)
+
+
+def test_lease_is_renewed_while_a_long_scrape_runs(session_factory):
+    leader = ScrapeScheduler(FakeQueue(1.5), session_factory, interval=60, jitter=0, lease_seconds=0.6)
+    asyncio.run(leader._tick())
+
+    assert leader.is_leader and leader.last_status == "succeeded"
+    # Renewed during the scrape: a standby still can't take over right after it
+    assert not acquire_lease(session_factory, LEASE_NAME, "standby", 60)
+
+
+def test_scheduler_stands_by_when_the_lease_is_lost_mid_scrape(session_factory):
+    leader = ScrapeScheduler(FakeQueue(1.5), session_factory, interval=60, jitter=0, lease_seconds=0.6)
+
+    async def tick_and_steal():
+        tick = asyncio.create_task(leader._tick())
+        await asyncio.sleep(0.1)
+        # Another replica takes the lease over (e.g. this one stalled past its expiry)
+        with session_factory() as db:
+            db.execute(update(SchedulerLease).values(holder="other", expires_at=datetime(2100, 1, 1)))
+            db.commit()
+        return await tick
+
+    delay = asyncio.run(tick_and_steal())
+    assert not leader.is_leader
+    assert leader.last_status == "standby"
+    assert delay == leader.interval
+    assert lease_of(session_factory).holder == "other"
@@ -0,0 +1,68 @@
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Callables notified with the phase name whenever a phase starts (e.g. job progress events)
+PHASE_LISTENERS = []
+
+# Joins a sub-phase to the phase it runs inside ("driver/proxy")
+SUBPHASE_SEPARATOR = "/"
+
+
+def add_phase_listener(listener):
+    if listener not in PHASE_LISTENERS:
+        PHASE_LISTENERS.append(listener)
+
+
+class TimingProfile:
+    """Records how long each phase of a scrape took.
+
+    Phases that run more than once (e.g. extraction on several pages) are
+    summed, so the profile always has one duration per phase name. A phase
+    started with ``parent`` is recorded as ``parent/name``; its time is already
+    part of the parent's, so it is left out when picking the slowest phase.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name, parent=None):
+        if parent:
+            name = f"{parent}{SUBPHASE_SEPARATOR}{name}"
+        for listener in PHASE_LISTENERS:
+            try:
+                listener(name)
+            except Exception as e:
+                logger.debug(f"Phase listener failed: {e}")
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        logger.info(f"Phase {name} took {seconds:.2f}s")
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started_at
+
+    def top_level(self):
+        """Phases that do not overlap, so their durations add up to at most the total"""
+        return {name: seconds for name, seconds in self.phases.items() if SUBPHASE_SEPARATOR not in name}
+
+    def slowest(self):
+        phases = self.top_level()
+        return max(phases, key=phases.get) if phases else None
+
+    def to_dict(self):
+        return {
+            "total_seconds": round(self.total, 3),
+            "slowest_phase": self.slowest(),
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+        }
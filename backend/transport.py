@@ -0,0 +1,235 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Kept-alive connections per host in each session
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+# Sessions kept open (one per proxy, plus direct); the least recently used is closed
+HTTP_MAX_SESSIONS = int(os.getenv("HTTP_MAX_SESSIONS", "64"))
+# Retries of failed connections and 429/5xx answers, waiting backoff * 2^n seconds between tries
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+# How long a resolved egress IP is trusted before asking the IP services again
+EGRESS_IP_TTL = int(os.getenv("EGRESS_IP_TTL", "600"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Tried in order until one answers; JSON answers carry the IP as "origin" or "ip"
+IP_SERVICES = [
+    "https://httpbin.org/ip",
+    "https://api.ipify.org?format=json",
+    "https://ipinfo.io/ip",
+]
+
+
+class TransportMetrics:
+    """Requests, new connections (TCP/TLS handshakes), retries and latency per host"""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        found = self._hosts.get(host)
+        if found is None:
+            found = self._hosts[host] = {
+                "requests": 0, "errors": 0, "retries": 0, "connections": 0, "seconds": 0.0, "max_seconds": 0.0,
+            }
+        return found
+
+    def connection(self, host):
+        with self._lock:
+            self._host(host)["connections"] += 1
+
+    def request(self, host, seconds, retries=0, error=False):
+        with self._lock:
+            entry = self._host(host)
+            entry["requests"] += 1
+            entry["errors"] += error
+            entry["retries"] += retries
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def snapshot(self):
+        with self._lock:
+            hosts = {host: dict(entry) for host, entry in self._hosts.items()}
+        totals = {key: sum(entry[key] for entry in hosts.values()) for key in ("requests", "errors", "retries", "connections")}
+        for entry in hosts.values():
+            entry["avg_ms"] = round(entry.pop("seconds") / entry["requests"] * 1000, 1) if entry["requests"] else None
+            entry["max_ms"] = round(entry.pop("max_seconds") * 1000, 1)
+        return {**totals, "hosts": hosts}
+
+
+def _counting_pool(pool_class, metrics):
+    class CountingPool(pool_class):
+        def _new_conn(self):
+            metrics.connection(self.host)
+            return super()._new_conn()
+    return CountingPool
+
+
+class MeteredAdapter(HTTPAdapter):
+    """HTTPAdapter that reports every request and every new connection to TransportMetrics.
+
+    New connections are counted where urllib3 opens them, so a reused
+    keep-alive connection costs nothing and each count is one TCP (and TLS)
+    handshake. Requests through a proxy are counted the same way.
+    """
+
+    def __init__(self, metrics, **kwargs):
+        self.metrics = metrics
+        super().__init__(**kwargs)
+
+    def _count_connections(self, manager):
+        manager.pool_classes_by_scheme = {
+            scheme: _counting_pool(pool_class, self.metrics)
+            for scheme, pool_class in manager.pool_classes_by_scheme.items()
+        }
+        return manager
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._count_connections(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        created = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        return self._count_connections(manager) if created else manager
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).hostname
+        started = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            self.metrics.request(host, time.perf_counter() - started, error=True)
+            raise
+        retries = getattr(response.raw, "retries", None)
+        self.metrics.request(
+            host, time.perf_counter() - started,
+            retries=len(retries.history) if retries is not None else 0,
+            error=response.status_code >= 500,
+        )
+        return response
+
+
+class Transport:
+    """Shared HTTP sessions for proxy checks, proxy lists and IP detection.
+
+    Sessions are kept per (proxy, retry policy) so connections through the
+    same proxy are reused between calls instead of paying a new handshake
+    each time. The egress IP of each proxy (None = direct) is cached for
+    ``ip_ttl`` seconds; proxy checks fill the cache as a side effect.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, max_sessions=HTTP_MAX_SESSIONS, retries=HTTP_RETRIES,
+                 backoff=HTTP_BACKOFF, ip_ttl=EGRESS_IP_TTL):
+        self.pool_size = pool_size
+        self.max_sessions = max_sessions
+        self.retries = retries
+        self.backoff = backoff
+        self.ip_ttl = ip_ttl
+        self.metrics = TransportMetrics()
+        self._sessions = OrderedDict()  # (proxy, retries) -> Session, least recently used first
+        self._ips = {}  # proxy -> (ip, expires_at)
+        self._lock = threading.Lock()
+        self._ip_stats = {"hits": 0, "misses": 0}
+
+    def create_session(self, proxy=None, retries=None):
+        """A new metered session (for callers that need their own cookies)"""
+        retries = self.retries if retries is None else retries
+        session = requests.Session()
+        adapter = MeteredAdapter(
+            self.metrics,
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=Retry(
+                total=retries, backoff_factor=self.backoff, status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset({"GET", "HEAD"}), raise_on_status=False,
+            ),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if proxy:
+            session.proxies = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+        return session
+
+    def session(self, proxy=None, retries=None):
+        """The shared session for a proxy (None for a direct connection)"""
+        key = (proxy, self.retries if retries is None else retries)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                return session
+            session = self._sessions[key] = self.create_session(proxy, retries)
+            if len(self._sessions) > self.max_sessions:
+                _, evicted = self._sessions.popitem(last=False)
+                evicted.close()
+            return session
+
+    def get(self, url, proxy=None, retries=None, **kwargs):
+        return self.session(proxy, retries).get(url, **kwargs)
+
+    # -------------------- Egress IP --------------------
+
+    def remember_ip(self, proxy, ip):
+        if ip and ip != "Unknown":
+            with self._lock:
+                self._ips[proxy] = (ip, time.monotonic() + self.ip_ttl)
+
+    def cached_ip(self, proxy=None):
+        with self._lock:
+            found = self._ips.get(proxy)
+        if found and found[1] > time.monotonic():
+            return found[0]
+        return None
+
+    def egress_ip(self, proxy=None, timeout=10):
+        """Public IP seen by sites when going through ``proxy``, or "Unknown" """
+        ip = self.cached_ip(proxy)
+        if ip:
+            self._ip_stats["hits"] += 1
+            return ip
+        self._ip_stats["misses"] += 1
+
+        for service in IP_SERVICES:
+            try:
+                response = self.get(service, proxy=proxy, retries=0, timeout=timeout)
+                response.raise_for_status()
+                try:
+                    data = response.json()
+                    ip = data.get("origin") or data.get("ip")
+                except ValueError:
+                    ip = response.text
+                ip = (ip or "").split(",")[0].strip()
+                if ip:
+                    self.remember_ip(proxy, ip)
+                    return ip
+            except Exception as e:
+                logger.debug(f"IP service {service} failed: {e}")
+        return "Unknown"
+
+    def forget_ip(self, proxy=None):
+        with self._lock:
+            self._ips.pop(proxy, None)
+
+    def stats(self):
+        with self._lock:
+            sessions, cached_ips = len(self._sessions), len(self._ips)
+        return {**self.metrics.snapshot(), "sessions": sessions, "egress_ips": {**self._ip_stats, "cached": cached_ips}}
+
+
+# Shared by the proxy pool and every scraper in the process
+transport = Transport()
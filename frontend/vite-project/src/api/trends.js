@@ -4,16 +4,10 @@ import axios from "axios";
 // Base URL from Vite environment variable
 const API_BASE = import.meta.env.VITE_API_BASE || "http://localhost:8000";
 
-// Create a reusable Axios instance with longer timeout for scraping
-const api = axios.create({
-  baseURL: API_BASE,
-  timeout: 120000, // 2 minutes timeout for scraping operations
-  headers: {
-    "Content-Type": "application/json",
-  },
-});
+// How long to wait for a queued scrape job before giving up
+const SCRAPE_JOB_TIMEOUT = 300000; // 5 minutes
 
-// Create a separate instance for quick operations
+// Axios instance for quick operations (scrapes run as background jobs)
 const quickApi = axios.create({
   baseURL: API_BASE,
   timeout: 10000, // 10 seconds for quick operations
@@ -45,9 +39,66 @@ const handleRequest = async (request) => {
   }
 };
 
-// ✅ Call POST /scrape to run Selenium scraper (with longer timeout)
-export const scrapeTrends = async () => {
-  return handleRequest(api.post("/scrape"));
+// ✅ Call GET /scrape/jobs/{job_id} to get the state of a scrape job (quick operation)
+export const getScrapeJob = async (job_id) => {
+  return handleRequest(quickApi.get(`/scrape/jobs/${job_id}`));
+};
+
+// Wait for a scrape job's final state on the /trends/stream event stream
+const watchScrapeJob = (job_id, deadline, onProgress) =>
+  new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE}/trends/stream`);
+    const finish = (callback) => {
+      clearTimeout(timer);
+      source.close();
+      callback();
+    };
+    const timer = setTimeout(
+      () => finish(() => reject(new Error("Request timeout - scraping took too long. Please try again."))),
+      deadline - Date.now()
+    );
+
+    source.addEventListener("job", (event) => {
+      const job = JSON.parse(event.data);
+      if (job.id !== job_id) return;
+      onProgress?.(job);
+      if (job.state === "succeeded") {
+        finish(() => resolve({ status: "success", data: job.result }));
+      } else if (job.state === "failed") {
+        finish(() => reject(new Error(job.error || "Scraping failed")));
+      }
+    });
+
+    // EventSource reconnects by itself after a drop; give up only if the browser closed it for good
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        finish(() => reject(new Error("Lost the connection to the server while scraping.")));
+      }
+    };
+
+    // The job may have finished before the stream (re)connected
+    source.onopen = () =>
+      getScrapeJob(job_id).then(({ job }) => {
+        if (job.state === "succeeded") finish(() => resolve({ status: "success", data: job.result }));
+        else if (job.state === "failed") finish(() => reject(new Error(job.error || "Scraping failed")));
+      }, () => {});
+  });
+
+// ✅ Call POST /scrape to queue the Selenium scraper, then wait for the job to finish
+// onProgress(job) is called with each job update (job.phase holds the current scrape phase)
+export const scrapeTrends = async (onProgress) => {
+  const queued = await handleRequest(quickApi.post("/scrape"));
+  return watchScrapeJob(queued.job_id, Date.now() + SCRAPE_JOB_TIMEOUT, onProgress);
+};
+
+// ✅ Subscribe to live trend / job events; returns a function that closes the stream
+export const subscribeToTrends = ({ onTrend, onUnchanged, onJob, onLagged } = {}) => {
+  const source = new EventSource(`${API_BASE}/trends/stream`);
+  if (onTrend) source.addEventListener("trend", (event) => onTrend(JSON.parse(event.data)));
+  if (onUnchanged) source.addEventListener("trend_unchanged", (event) => onUnchanged(JSON.parse(event.data)));
+  if (onJob) source.addEventListener("job", (event) => onJob(JSON.parse(event.data)));
+  if (onLagged) source.addEventListener("lagged", (event) => onLagged(JSON.parse(event.data)));
+  return () => source.close();
 };
 
 // ✅ Call GET /trends to get the latest trend (quick operation)
@@ -56,8 +107,10 @@ export const getLatestTrends = async () => {
 };
 
 // ✅ Call GET /trends/all with pagination (quick operation)
-export const getAllTrends = async (limit = 10, offset = 0) => {
-  return handleRequest(quickApi.get(`/trends/all?limit=${limit}&offset=${offset}`));
+// Pass the previous response's next_cursor as `cursor` for fast keyset paging
+export const getAllTrends = async (limit = 10, offset = 0, cursor = null) => {
+  const page = cursor ? `cursor=${encodeURIComponent(cursor)}` : `offset=${offset}`;
+  return handleRequest(quickApi.get(`/trends/all?limit=${limit}&${page}`));
 };
 
 // ✅ Call GET /trends/{trend_id} to get a specific trend by ID (quick operation)
@@ -1,97 +1,84 @@
 // src/pages/Home.jsx
-import React, { useState } from "react";
-import { scrapeTrends } from "../api/trends";
+import React, { useEffect, useState } from "react";
+import { getLatestTrends, scrapeTrends, subscribeToTrends } from "../api/trends";
 import { ScrapingProgress } from "../components/Loader";
 import TrendCard from "../components/TrendCard";
 
+// Progress messages for the scrape phases reported on the job stream
+const PHASE_MESSAGES = {
+  "driver/proxy": "🌐 Picking a proxy...",
+  "driver/driver_setup": "🚀 Setting up Chrome browser...",
+  session_check: "🔐 Checking the saved session...",
+  session_restore: "🔐 Restoring the saved session...",
+  navigate: "📱 Opening the login page...",
+  username: "🔐 Authenticating account...",
+  password: "🔐 Authenticating account...",
+  email_verification: "📧 Verifying the account email...",
+  login_confirm: "🔐 Confirming login...",
+  http_fetch: "📱 Fetching the trending page...",
+  http_parse: "🔍 Extracting trending topics...",
+};
+
+const phaseMessage = (phase) => {
+  if (phase?.startsWith("extract")) return "🔍 Extracting trending topics...";
+  return PHASE_MESSAGES[phase] || "⚡ Working...";
+};
+
 const Home = () => {
   const [latestTrend, setLatestTrend] = useState(null);
   const [scraping, setScraping] = useState(false);
   const [error, setError] = useState("");
   const [scrapingProgress, setScrapingProgress] = useState("");
   const [hasInitialLoad, setHasInitialLoad] = useState(false);
-  const [elapsedTime, setElapsedTime] = useState(0);
-  const [startTime, setStartTime] = useState(null);
-
-  // Timer for elapsed time during scraping
-  const updateElapsedTime = () => {
-    if (startTime) {
-      const now = Date.now();
-      setElapsedTime(Math.floor((now - startTime) / 1000));
-    }
-  };
 
-  // Enhanced progress simulation with realistic steps
-  const simulateProgress = () => {
-    const steps = [
-      { message: "🚀 Setting up Chrome browser...", duration: 3000 },
-      { message: "🌐 Connecting to Twitter/X...", duration: 4000 },
-      { message: "🔐 Authenticating account...", duration: 8000 },
-      { message: "📱 Navigating to trending page...", duration: 5000 },
-      { message: "🔍 Extracting trending topics...", duration: 12000 },
-      { message: "⚡ Processing data...", duration: 4000 },
-      { message: "💾 Saving to database...", duration: 3000 },
-      { message: "✨ Finalizing results...", duration: 2000 }
-    ];
-    
-    let stepIndex = 0;
-    
-    const scheduleNextStep = () => {
-      if (stepIndex < steps.length && scraping) {
-        const currentStep = steps[stepIndex];
-        setScrapingProgress(currentStep.message);
-        stepIndex++;
-        setTimeout(scheduleNextStep, currentStep.duration);
-      }
-    };
-    
-    scheduleNextStep();
-    
-    // Update elapsed time every second
-    const timeInterval = setInterval(updateElapsedTime, 1000);
-    return timeInterval;
-  };
+  // Load the latest trend once, then follow new snapshots on the event stream
+  useEffect(() => {
+    const loadLatest = () =>
+      getLatestTrends()
+        .then((response) => setLatestTrend(response.data))
+        .catch(() => {})
+        .finally(() => setHasInitialLoad(true));
+
+    loadLatest();
+    return subscribeToTrends({
+      onTrend: (trend) => {
+        setLatestTrend(trend);
+        setHasInitialLoad(true);
+      },
+      // A repeated scrape only moves last_seen_at on the stored row
+      onUnchanged: ({ id, last_seen_at }) =>
+        setLatestTrend((current) => (current?.id === id ? { ...current, last_seen_at } : current)),
+      // Events were dropped while this tab was slow: refetch instead of missing a snapshot
+      onLagged: loadLatest,
+    });
+  }, []);
 
-  // Trigger scraping from API
+  // Trigger scraping from API; the stream delivers the new trend as well
   const handleScrape = async () => {
     try {
       setScraping(true);
       setError("");
-      setStartTime(Date.now());
-      setElapsedTime(0);
       setScrapingProgress("🎯 Initializing scraper...");
-      
-      // Start progress simulation
-      const timeInterval = simulateProgress();
-      
-      const response = await scrapeTrends();
+
+      const response = await scrapeTrends((job) => {
+        if (job.state === "queued") setScrapingProgress("🎯 Waiting for a scraper...");
+        else if (job.phase) setScrapingProgress(phaseMessage(job.phase));
+      });
       setLatestTrend(response.data);
       setScrapingProgress("🎉 Scraping completed successfully!");
-      setHasInitialLoad(true);
-      
-      // Clear intervals
-      clearInterval(timeInterval);
-      
+
       // Show success message briefly
-      setTimeout(() => {
-        setScrapingProgress("");
-        setStartTime(null);
-        setElapsedTime(0);
-      }, 3000);
-      
+      setTimeout(() => setScrapingProgress(""), 3000);
+
     } catch (err) {
       console.error(err);
       setError("Scraping failed: " + err.message);
       setScrapingProgress("❌ Scraping encountered an error");
-      setHasInitialLoad(true);
-      
-      setTimeout(() => {
-        setScrapingProgress("");
-        setStartTime(null);
-        setElapsedTime(0);
-      }, 3000);
+
+      setTimeout(() => setScrapingProgress(""), 3000);
     } finally {
       setScraping(false);
+      setHasInitialLoad(true);
     }
   };
 